@@ -0,0 +1,77 @@
+"""
+Compare memory and analyzer latency of the NetworkX graph and the CSRGraph
+
+Usage:
+    python -m benchmarks.bench_csr_graph --patients 1000 10000
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+import tracemalloc
+
+from src.backend.graph_navigator import MedGraphNavigator
+from src.backend.medical_analyzer import MedicalAnalyzer
+from src.utils.data_generation import generate_demo_data
+from src.utils.memory_db import InMemoryDatabase
+
+
+def measure_load(db, compact):
+    """
+    Load the graph and return (navigator, retained bytes, seconds)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    nav = MedGraphNavigator(database=db)
+    with contextlib.redirect_stdout(io.StringIO()):
+        nav.load_synthea_data(compact=compact)
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return nav, retained, elapsed
+
+
+def time_call(func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes, condition):
+    results = []
+    for num_patients in sizes:
+        db = InMemoryDatabase(generate_demo_data(num_patients))
+        for label, compact in (('networkx', False), ('csr', True)):
+            nav, retained, load_seconds = measure_load(db, compact)
+            analyzer = MedicalAnalyzer(nav.graph)
+            results.append({
+                'patients': num_patients,
+                'graph': label,
+                'nodes': nav.graph.number_of_nodes(),
+                'retained_bytes': retained,
+                'load_seconds': load_seconds,
+                'treatment_patterns_seconds': time_call(analyzer.analyze_treatment_patterns, condition),
+                'risk_factors_seconds': time_call(analyzer.predict_risk_factors, condition)
+            })
+            print(f"{num_patients:>9} {label:>9} {retained / 1e6:>10.1f} MB "
+                  f"load {load_seconds:.3f}s "
+                  f"patterns {results[-1]['treatment_patterns_seconds']:.4f}s "
+                  f"risk {results[-1]['risk_factors_seconds']:.4f}s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--patients', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--condition', default='Hypertension')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    results = run(args.patients, args.condition)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,92 @@
+"""
+Cold import time of the backend modules, with an optional CI budget
+
+Each module is imported in a fresh interpreter with ``-X importtime`` and the
+median cumulative time is reported. With --check the run fails when a module
+exceeds its budget or pulls in a heavy optional dependency at import time.
+
+Usage:
+    python -m benchmarks.bench_import --runs 5 --check
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Median import budget in seconds per module
+BUDGETS = {
+    'src.backend.graph_navigator': 1.0,
+    'src.backend.medical_analyzer': 0.8,
+    'src.utils.gpu_utils': 0.5
+}
+
+# Dependencies that must only load when the feature using them runs
+DEFERRED_MODULES = ('langchain', 'arango', 'torch', 'cugraph', 'cudf', 'scipy')
+
+
+def import_profile(module):
+    """
+    (seconds, top-level modules loaded) for importing module in a fresh interpreter
+    """
+    code = f"import sys, {module}; print(' '.join(sorted({{m.split('.')[0] for m in sys.modules}})))"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, check=True)
+    seconds = None
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = [p.strip() for p in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            seconds = int(parts[1]) / 1e6
+    return seconds, set(result.stdout.split())
+
+
+def run(modules, runs):
+    results = []
+    for module in modules:
+        timings = []
+        loaded = set()
+        for _ in range(runs):
+            seconds, loaded = import_profile(module)
+            timings.append(seconds)
+        result = {
+            'module': module,
+            'median_seconds': statistics.median(timings),
+            'budget_seconds': BUDGETS.get(module),
+            'deferred_loaded': sorted(loaded.intersection(DEFERRED_MODULES))
+        }
+        results.append(result)
+        print(f"{module}: {result['median_seconds'] * 1000:.0f} ms "
+              f"(budget {result['budget_seconds']}s), eager optional imports: "
+              f"{result['deferred_loaded'] or 'none'}")
+    return results
+
+
+def failures(results):
+    problems = []
+    for result in results:
+        if result['budget_seconds'] is not None and result['median_seconds'] > result['budget_seconds']:
+            problems.append(f"{result['module']} imports in {result['median_seconds']:.2f}s, "
+                            f"budget {result['budget_seconds']}s")
+        if result['deferred_loaded']:
+            problems.append(f"{result['module']} imports {', '.join(result['deferred_loaded'])}")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--modules', nargs='+', default=list(BUDGETS))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--check', action='store_true', help='Exit non-zero on a budget regression')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    results = run(args.modules, args.runs)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    problems = failures(results)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if args.check and problems:
+        sys.exit(1)
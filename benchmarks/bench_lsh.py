@@ -0,0 +1,98 @@
+"""
+Recall@k and latency of MinHash/LSH patient similarity against the exact method
+
+Usage:
+    python -m benchmarks.bench_lsh --patients 10000 100000 1000000 --bands 32 64
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from src.backend.lsh_index import MinHashLSHIndex
+from src.backend.similarity import PatientSimilarityIndex
+from src.utils.data_generation import generate_demo_data
+
+
+def feature_sets(data):
+    """
+    Patient ids with their condition and medication description sets
+    """
+    patient_ids = [p['_key'] for p in data['patients']]
+    conditions = {p: set() for p in patient_ids}
+    medications = {p: set() for p in patient_ids}
+    for c in data['conditions']:
+        conditions[c['patient_id']].add(c['description'])
+    for m in data['medications']:
+        medications[m['patient_id']].add(m['description'])
+    return patient_ids, [conditions[p] for p in patient_ids], [medications[p] for p in patient_ids]
+
+
+def recall_at_k(exact, approximate, k):
+    """
+    Share of the k slots filled with a score at least the exact k-th best
+
+    Scores are compared rather than ids because generated data has many ties.
+    """
+    if not exact:
+        return 1.0
+    threshold = exact[min(k, len(exact)) - 1][1]
+    return sum(1 for _, score in approximate[:k] if score >= threshold - 1e-9) / min(k, len(exact))
+
+
+def run(sizes, bands_options, num_perm, k, num_queries, seed):
+    results = []
+    for num_patients in sizes:
+        random.seed(seed)
+        patient_ids, conditions, medications = feature_sets(generate_demo_data(num_patients))
+        exact_index = PatientSimilarityIndex.from_feature_sets(patient_ids, conditions, medications)
+        queries = random.sample(patient_ids, min(num_queries, len(patient_ids)))
+
+        start = time.perf_counter()
+        exact = exact_index.top_k(queries, k)
+        exact_seconds = (time.perf_counter() - start) / len(queries)
+
+        for bands in bands_options:
+            start = time.perf_counter()
+            lsh = MinHashLSHIndex.from_feature_sets(patient_ids, conditions, medications,
+                                                    num_perm=num_perm, bands=bands)
+            build_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            approximate = {q: lsh.query(q, k) for q in queries}
+            approx_seconds = (time.perf_counter() - start) / len(queries)
+
+            recall = float(np.mean([recall_at_k(exact[q], approximate[q], k) for q in queries]))
+            results.append({
+                'patients': num_patients,
+                'num_perm': num_perm,
+                'bands': bands,
+                'k': k,
+                'recall_at_k': recall,
+                'exact_query_seconds': exact_seconds,
+                'lsh_query_seconds': approx_seconds,
+                'lsh_build_seconds': build_seconds
+            })
+            print(f"{num_patients:>9} bands={bands:<3} recall@{k}={recall:.3f} "
+                  f"exact {exact_seconds * 1e3:.2f} ms/query "
+                  f"lsh {approx_seconds * 1e3:.2f} ms/query (build {build_seconds:.1f}s)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--patients', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--bands', type=int, nargs='+', default=[16, 32])
+    parser.add_argument('--num-perm', type=int, default=128)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    results = run(args.patients, args.bands, args.num_perm, args.k, args.queries, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
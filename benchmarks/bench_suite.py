@@ -0,0 +1,202 @@
+"""
+Offline benchmark suite for the loader, analyzer and analytics hot paths
+
+Every graph size runs in a fresh worker process on generated data in the
+in-memory database, so peak RSS is measured per size. Results are written as
+JSON; --compare reports (and with --check fails on) regressions against an
+earlier run.
+
+Usage:
+    python -m benchmarks.bench_suite --patients 1000 10000 100000 --output bench.json
+    python -m benchmarks.bench_suite --patients 1000 10000 --compare bench.json --check
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Relative slowdown reported as a regression, and a floor below which
+# timings are too noisy to compare
+DEFAULT_THRESHOLD = 0.25
+MIN_COMPARABLE_SECONDS = 0.001
+
+
+def peak_rss_bytes():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def time_case(func, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {'best_seconds': min(timings), 'median_seconds': statistics.median(timings),
+            'first_seconds': timings[0]}
+
+
+def analytics_cases(nav, patient_ids):
+    """
+    (name, params) for every run_graph_analytics type
+    """
+    pairs = [[patient_ids[i], patient_ids[-1 - i]] for i in range(min(50, len(patient_ids)))]
+    return [
+        ('pagerank', None),
+        ('centrality', {'k': 32, 'seed': 0}),
+        ('community_detection', {'seed': 0}),
+        ('shortest_path', {'source': patient_ids[0], 'target': nav.index.patient_conditions(patient_ids[0])[0]}),
+        ('shortest_paths', {'pairs': pairs}),
+        ('distance', {'source': patient_ids[0], 'target': patient_ids[-1], 'approximate': True})
+    ]
+
+
+def run_size(args):
+    """
+    All cases for one graph size (runs in its own worker process)
+    """
+    num_patients, condition, repeat, seed, compact = args
+    from src.backend.graph_navigator import MedGraphNavigator
+    from src.utils.data_generation import generate_dataset
+    from src.utils.memory_db import InMemoryDatabase
+
+    db = InMemoryDatabase(generate_dataset(num_patients, seed=seed))
+    patient_ids = [doc['_id'] for doc in db.collection('patients').all()]
+    cases = {}
+    navigators = []
+
+    def load():
+        nav = MedGraphNavigator(database=db)
+        nav.load_synthea_data(compact=compact)
+        # Keep only the latest graph so repeats do not inflate peak RSS
+        navigators[:] = [nav]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        cases['load_synthea_data'] = time_case(load, repeat)
+        nav = navigators[-1]
+        analyzer = nav.analyzer
+
+        cases['analyze_treatment_patterns'] = time_case(
+            lambda: analyzer.analyze_treatment_patterns(condition), repeat)
+        cases['find_similar_patients'] = time_case(
+            lambda: analyzer.find_similar_patients(patient_ids[0]), repeat)
+        cases['find_similar_patients_approximate'] = time_case(
+            lambda: analyzer.find_similar_patients(patient_ids[0], approximate=True), repeat)
+        cases['predict_risk_factors'] = time_case(
+            lambda: analyzer.predict_risk_factors(condition), repeat)
+        cohort = nav.cohort()
+        cases['cohort_filtered_counts'] = time_case(
+            lambda: cohort.feature_counts('condition', cohort.mask(min_age=61), top=10), repeat)
+        cases['cohort_lift_matrix'] = time_case(lambda: cohort.lift_matrix(), repeat)
+
+        for name, params in analytics_cases(nav, patient_ids):
+            result = {}
+            def analytics():
+                result['value'] = nav.run_graph_analytics(name, params)
+            # Clear memoized results so each repeat measures the computation
+            cases[f'analytics.{name}'] = time_case(analytics, repeat, setup=nav.analytics_cache.invalidate)
+            if isinstance(result['value'], dict) and 'error' in result['value']:
+                cases[f'analytics.{name}']['error'] = result['value']['error']
+
+    return {
+        'patients': num_patients,
+        'nodes': nav.graph.number_of_nodes(),
+        'edges': nav.graph.number_of_edges(),
+        'graph': 'csr' if compact else 'networkx',
+        'peak_rss_bytes': peak_rss_bytes(),
+        'cases': cases
+    }
+
+
+def run(sizes, condition='Hypertension', repeat=3, seed=0, compact=False):
+    results = []
+    for num_patients in sizes:
+        # A fresh process per size keeps peak RSS attributable to that size
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            result = pool.submit(run_size, (num_patients, condition, repeat, seed, compact)).result()
+        results.append(result)
+        print(f"{num_patients} patients: {result['nodes']} nodes, "
+              f"peak RSS {result['peak_rss_bytes'] / 1e6:.0f} MB")
+        for case, timing in result['cases'].items():
+            print(f"  {case:<40} {timing['best_seconds'] * 1000:>10.2f} ms"
+                  + (f"  error: {timing['error']}" if 'error' in timing else ''))
+    return results
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created': time.time(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'args': vars(args)
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Regressions of results against a baseline run, as printable strings
+
+    Cases are matched by graph size and name; best times are compared, and
+    peak RSS is held to the same relative threshold.
+    """
+    previous = {r['patients']: r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get(result['patients'])
+        if before is None:
+            continue
+        for case, timing in result['cases'].items():
+            old = before['cases'].get(case)
+            if old is None or old['best_seconds'] < MIN_COMPARABLE_SECONDS:
+                continue
+            ratio = timing['best_seconds'] / old['best_seconds']
+            print(f"{result['patients']:>9} {case:<40} {ratio:>6.2f}x")
+            if ratio > 1 + threshold:
+                regressions.append(f"{case} at {result['patients']} patients: "
+                                   f"{old['best_seconds']:.4f}s -> {timing['best_seconds']:.4f}s")
+        if result['peak_rss_bytes'] > (1 + threshold) * before['peak_rss_bytes']:
+            regressions.append(f"peak RSS at {result['patients']} patients: "
+                               f"{before['peak_rss_bytes']} -> {result['peak_rss_bytes']} bytes")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--patients', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--condition', default='Hypertension')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compact', action='store_true', help='Benchmark the CSRGraph core')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--compare', help='Baseline JSON from an earlier run')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--check', action='store_true', help='Exit non-zero on regressions')
+    args = parser.parse_args()
+
+    results = run(args.patients, args.condition, args.repeat, args.seed, args.compact)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': metadata(args), 'results': results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if args.check and regressions:
+            sys.exit(1)
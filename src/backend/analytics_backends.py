@@ -0,0 +1,302 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import networkx as nx
+import numpy as np
+
+from src.backend.csr_graph import CSRGraph, expand_frontier
+
+# Components per task sent to a Louvain worker process
+LOUVAIN_BATCH_SIZE = 2000
+
+
+class NetworkXBackend:
+    """
+    Exact NetworkX analytics (reference implementation, small graphs only)
+    """
+    name = 'networkx'
+
+    def __init__(self, graph):
+        self.graph = _undirected(graph)
+
+    def pagerank(self, alpha=0.85, tol=1e-06, max_iter=100):
+        return nx.pagerank(self.graph, alpha=alpha, tol=tol, max_iter=max_iter)
+
+    def centrality(self, k=None, epsilon=None, delta=0.1, seed=None):
+        if k is None and epsilon is not None:
+            k = pivots_for_error(self.graph.number_of_nodes(), epsilon, delta)
+        if k is not None and k >= self.graph.number_of_nodes():
+            k = None
+        return nx.betweenness_centrality(self.graph, k=k, seed=seed)
+
+    def community_detection(self, resolution=1, seed=None, processes=None):
+        return nx.community.louvain_communities(self.graph, resolution=resolution, seed=seed)
+
+
+class SciPyBackend:
+    """
+    Scalable CPU analytics over a sparse adjacency matrix
+
+    PageRank is a SciPy sparse power iteration, betweenness is Brandes'
+    algorithm from k sampled pivots with vectorized frontier expansion, and
+    Louvain runs per connected component across a process pool (components
+    never share a community, and the resolution is rescaled per component so
+    the moves match a whole-graph run). Pool workers are spawned, as
+    analytics may run inside the threaded server.
+    """
+    name = 'scipy'
+
+    def __init__(self, graph):
+        from scipy import sparse
+
+        if isinstance(graph, CSRGraph):
+            self.nodes = graph.keys
+            n = graph.number_of_nodes()
+            self.adjacency = sparse.csr_matrix(
+                (np.ones(len(graph.indices), dtype=np.float64),
+                 np.asarray(graph.indices), np.asarray(graph.indptr)), shape=(n, n))
+        else:
+            self.nodes = list(graph)
+            self.adjacency = nx.to_scipy_sparse_array(_undirected(graph), nodelist=self.nodes, weight=None,
+                                                      format='csr').astype(np.float64)
+            self.adjacency = sparse.csr_matrix(self.adjacency)
+        self.indptr = self.adjacency.indptr
+        self.indices = self.adjacency.indices
+        self.degree = np.diff(self.indptr)
+        self._components = None
+
+    def _as_dict(self, values):
+        nodes = self.nodes
+        return {nodes[i]: float(v) for i, v in enumerate(values)}
+
+    def pagerank(self, alpha=0.85, tol=1e-06, max_iter=100):
+        """
+        Power-iteration PageRank with uniform teleport and dangling redistribution
+        """
+        n = self.adjacency.shape[0]
+        if n == 0:
+            return {}
+        out_degree = np.asarray(self.adjacency.sum(axis=1)).ravel()
+        dangling = out_degree == 0
+        inverse = np.divide(1.0, out_degree, out=np.zeros(n), where=~dangling)
+        transition_t = self.adjacency.T.tocsr()
+
+        x = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            previous = x
+            x = alpha * (transition_t @ (previous * inverse))
+            x += (alpha * previous[dangling].sum() + 1 - alpha) / n
+            if np.abs(x - previous).sum() < n * tol:
+                return self._as_dict(x)
+        raise nx.PowerIterationFailedConvergence(max_iter)
+
+    def centrality(self, k=None, epsilon=None, delta=0.1, seed=None):
+        """
+        Betweenness centrality, exact or estimated from k sampled pivots
+
+        With epsilon, k is chosen so every normalized score is within epsilon
+        of the exact value with probability 1 - delta.
+        """
+        n = self.adjacency.shape[0]
+        if k is None and epsilon is not None:
+            k = pivots_for_error(n, epsilon, delta)
+        if k is None or k >= n:
+            pivots = np.arange(n)
+        else:
+            pivots = np.random.default_rng(seed).choice(n, size=k, replace=False)
+
+        betweenness = np.zeros(n)
+        for source in pivots:
+            betweenness += self._dependencies(int(source))
+
+        # Same normalization as nx.betweenness_centrality(normalized=True)
+        scale = 1.0 / ((n - 1) * (n - 2)) if n > 2 else 1.0
+        if len(pivots) < n:
+            scale *= n / len(pivots)
+        return self._as_dict(betweenness * scale)
+
+    def _dependencies(self, source):
+        n = self.adjacency.shape[0]
+        distance = np.full(n, -1, dtype=np.int64)
+        sigma = np.zeros(n)
+        distance[source] = 0
+        sigma[source] = 1.0
+        levels = [np.array([source])]
+
+        # Forward BFS, counting shortest paths level by level
+        while True:
+            frontier = levels[-1]
+            sources, neighbors = expand_frontier(self.indptr, self.indices, frontier)
+            depth = len(levels)
+            fresh = np.unique(neighbors[distance[neighbors] == -1])
+            if fresh.size == 0:
+                break
+            distance[fresh] = depth
+            tree = distance[neighbors] == depth
+            np.add.at(sigma, neighbors[tree], sigma[sources[tree]])
+            levels.append(fresh)
+
+        # Backward dependency accumulation
+        delta = np.zeros(n)
+        for depth in range(len(levels) - 2, -1, -1):
+            sources, neighbors = expand_frontier(self.indptr, self.indices, levels[depth])
+            tree = distance[neighbors] == depth + 1
+            sources, neighbors = sources[tree], neighbors[tree]
+            np.add.at(delta, sources, sigma[sources] / sigma[neighbors] * (1 + delta[neighbors]))
+        delta[source] = 0
+        return delta
+
+    def components(self):
+        if self._components is None:
+            from scipy.sparse.csgraph import connected_components
+
+            self._components = connected_components(self.adjacency, directed=False)
+        return self._components
+
+    def community_detection(self, resolution=1, seed=None, processes=None):
+        """
+        Louvain communities, computed per connected component in parallel
+        """
+        num_components, labels = self.components()
+        total_edges = self.adjacency.nnz / 2
+        order = np.argsort(labels, kind='stable')
+        bounds = np.searchsorted(labels[order], np.arange(num_components + 1))
+        # Position of every node inside its component
+        local = np.empty(len(labels), dtype=np.int64)
+        local[order] = np.arange(len(labels)) - bounds[labels[order]]
+
+        # Upper-triangle edges grouped by component
+        upper = self.adjacency.tocoo()
+        keep = upper.row < upper.col
+        edge_rows, edge_cols = upper.row[keep], upper.col[keep]
+        edge_order = np.argsort(labels[edge_rows], kind='stable')
+        edge_rows, edge_cols = edge_rows[edge_order], edge_cols[edge_order]
+        edge_bounds = np.searchsorted(labels[edge_rows], np.arange(num_components + 1))
+
+        communities = []
+        tasks = []
+        for c in range(num_components):
+            members = order[bounds[c]:bounds[c + 1]]
+            if len(members) <= 2:
+                communities.append(members)
+                continue
+            rows = local[edge_rows[edge_bounds[c]:edge_bounds[c + 1]]]
+            cols = local[edge_cols[edge_bounds[c]:edge_bounds[c + 1]]]
+            tasks.append((members, rows, cols))
+
+        batches = [tasks[i:i + LOUVAIN_BATCH_SIZE] for i in range(0, len(tasks), LOUVAIN_BATCH_SIZE)]
+        args = [(batch, resolution, total_edges, seed) for batch in batches]
+        if len(batches) > 1 and processes != 1:
+            with ProcessPoolExecutor(max_workers=processes,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                results = pool.map(_louvain_batch, args)
+                for result in results:
+                    communities.extend(result)
+        else:
+            for result in map(_louvain_batch, args):
+                communities.extend(result)
+
+        nodes = self.nodes
+        return [{nodes[i] for i in community} for community in communities]
+
+
+class CuGraphBackend:
+    """
+    GPU analytics through cuGraph; the device graph is built once per backend
+    """
+    name = 'cugraph'
+
+    def __init__(self, graph):
+        import cugraph
+
+        self.cugraph = cugraph
+        self.G_cu = cugraph.from_networkx(_undirected(graph))
+
+    @staticmethod
+    def _to_dict(frame, column):
+        frame = frame.to_pandas()
+        return dict(zip(frame['vertex'], frame[column].astype(float)))
+
+    def pagerank(self, alpha=0.85, tol=1e-06, max_iter=100):
+        return self._to_dict(self.cugraph.pagerank(self.G_cu, alpha=alpha, tol=tol, max_iter=max_iter),
+                             'pagerank')
+
+    def centrality(self, k=None, epsilon=None, delta=0.1, seed=None):
+        if k is None and epsilon is not None:
+            k = pivots_for_error(self.G_cu.number_of_vertices(), epsilon, delta)
+        return self._to_dict(self.cugraph.betweenness_centrality(self.G_cu, k=k, seed=seed),
+                             'betweenness_centrality')
+
+    def community_detection(self, resolution=1, seed=None, processes=None):
+        parts, _ = self.cugraph.louvain(self.G_cu, resolution=resolution)
+        parts = parts.to_pandas()
+        return [set(group['vertex']) for _, group in parts.groupby('partition')]
+
+
+BACKENDS = {
+    'cugraph': CuGraphBackend,
+    'scipy': SciPyBackend,
+    'networkx': NetworkXBackend
+}
+
+
+def select_backend(graph, preferred=None):
+    """
+    Build the first available analytics backend
+
+    Order is cuGraph, SciPy, NetworkX unless preferred (or the
+    MEDGRAPH_ANALYTICS_BACKEND environment variable) names one.
+    """
+    preferred = preferred or os.environ.get('MEDGRAPH_ANALYTICS_BACKEND')
+    names = [preferred] if preferred else list(BACKENDS)
+    for name in names:
+        try:
+            return BACKENDS[name](graph)
+        except ImportError:
+            continue
+    raise ImportError(f"No analytics backend available from {names}")
+
+
+def _undirected(graph):
+    """
+    NetworkX form of a graph with relation direction ignored
+
+    The analytics treat every relation as a link between its endpoints.
+    """
+    graph = graph.to_networkx() if isinstance(graph, CSRGraph) else graph
+    return graph.to_undirected(as_view=True) if graph.is_directed() else graph
+
+
+def pivots_for_error(num_nodes, epsilon, delta=0.1):
+    """
+    Pivots needed for normalized betweenness within epsilon w.p. 1 - delta
+
+    Hoeffding bound with a union bound over all nodes.
+    """
+    if num_nodes <= 2:
+        return num_nodes
+    return min(num_nodes, math.ceil(math.log(2 * num_nodes / delta) / (2 * epsilon ** 2)))
+
+
+def _louvain_batch(args):
+    """
+    Louvain over a batch of components (runs in worker processes)
+    """
+    tasks, resolution, total_edges, seed = args
+    communities = []
+    for members, rows, cols in tasks:
+        # Rescale so modularity gains keep the whole-graph ordering
+        local_resolution = resolution * len(rows) / total_edges
+        if local_resolution * 2 * len(rows) < 1:
+            # Every merge of adjacent communities has positive gain, so Louvain
+            # ends with the whole component as a single community
+            communities.append(members)
+            continue
+        graph = nx.Graph()
+        graph.add_nodes_from(range(len(members)))
+        graph.add_edges_from(zip(rows.tolist(), cols.tolist()))
+        for community in nx.community.louvain_communities(graph, resolution=local_resolution, seed=seed):
+            communities.append(members[sorted(community)])
+    return communities
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class AnalyticsCache:
+    """
+    Size-bounded LRU cache for graph analytics results
+
+    Entries are keyed by analysis type, parameters and the graph version, so a
+    result is never served for a graph that has since changed. The memory tier
+    is bounded by entry count and by the pickled size of the results; entries
+    evicted from memory spill to an optional on-disk tier.
+    """
+    def __init__(self, max_entries=32, max_bytes=512 * 1024 * 1024, disk_path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_path:
+            os.makedirs(disk_path, exist_ok=True)
+
+    @staticmethod
+    def make_key(analysis_type, params, graph_version):
+        return (analysis_type, json.dumps(params or {}, sort_keys=True, default=str), graph_version)
+
+    def _disk_file(self, key):
+        digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_path, f"{digest}.pkl")
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.disk_path and os.path.exists(self._disk_file(key)):
+            with open(self._disk_file(key), 'rb') as f:
+                payload = f.read()
+            value = pickle.loads(payload)
+            with self._lock:
+                self.disk_hits += 1
+            self._store(key, value, len(payload))
+            return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def put(self, key, value):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.disk_path:
+            tmp_path = self._disk_file(key) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, self._disk_file(key))
+        self._store(key, value, len(payload))
+
+    def _store(self, key, value, size):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            if size > self.max_bytes:
+                # Too large for memory; only the disk tier (if any) keeps it
+                return
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                evicted, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(evicted)
+                self.evictions += 1
+
+    def invalidate(self):
+        """
+        Drop every entry from both tiers
+        """
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+        if self.disk_path:
+            for name in os.listdir(self.disk_path):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.disk_path, name))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes
+            }
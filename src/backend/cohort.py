@@ -0,0 +1,234 @@
+import numpy as np
+from scipy import sparse
+
+from src.backend.graph_index import PATIENT_ATTRIBUTES
+
+
+class CohortEngine:
+    """
+    Columnar view of the patient population for cohort aggregation
+
+    Patient attributes are NumPy columns: numeric ones (age) as float64 with
+    NaN for missing values, the rest as int32 category codes (-1 missing)
+    with their values in ``categories``. Conditions and medications are
+    sparse binary patient x name matrices (a patient counts once per name).
+    Dated diagnoses are kept as (patient row, condition column, day)
+    arrays for risk ratios. Filters build boolean masks over all patients;
+    counts, group-bys, co-occurrence and risk ratios are sparse products or
+    array passes over the masked population rather than per-patient Python
+    loops.
+    """
+    def __init__(self, patient_ids, columns, categories, features, diagnoses=None):
+        self.patient_ids = patient_ids
+        self.patient_rows = {p: row for row, p in enumerate(patient_ids)}
+        self.columns = columns
+        self.categories = categories
+        # feature -> (patients x names CSR matrix, names, name -> column)
+        self.features = {name: (matrix, names, {n: i for i, n in enumerate(names)})
+                         for name, (matrix, names) in features.items()}
+        empty = np.zeros(0, dtype=np.int64)
+        self.diagnoses = diagnoses if diagnoses is not None else (empty, empty, empty)
+
+    @classmethod
+    def from_index(cls, index, attributes=PATIENT_ATTRIBUTES):
+        """
+        Build from a GraphIndex and its recorded patient attributes
+        """
+        patient_ids = list(index.nodes_of_type('patient'))
+        columns = {}
+        categories = {}
+        for name in attributes:
+            values = [index.patient_attributes.get(p, {}).get(name) for p in patient_ids]
+            columns[name], categories[name] = _column(values)
+        features = {
+            'condition': _membership_matrix(
+                [{index.description(c) for c in index.patient_conditions(p)} for p in patient_ids]),
+            'medication': _membership_matrix(
+                [{index.description(m) for m in index.patient_medications(p)} for p in patient_ids])
+        }
+        return cls(patient_ids, columns, {k: v for k, v in categories.items() if v is not None}, features,
+                   _diagnoses(index, patient_ids, features['condition'][1]))
+
+    def __len__(self):
+        return len(self.patient_ids)
+
+    def mask(self, min_age=None, max_age=None, condition=None, medication=None, **equals):
+        """
+        Boolean mask of the patients matching every given filter
+
+        Ages are inclusive bounds; condition/medication select patients who
+        ever had that name; other keywords match attribute values, e.g.
+        gender='F' or location=['Leeds, UK', 'York, UK'].
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if min_age is not None:
+            mask &= self.columns['age'] >= min_age
+        if max_age is not None:
+            mask &= self.columns['age'] <= max_age
+        for feature, name in (('condition', condition), ('medication', medication)):
+            if name is not None:
+                mask &= self._has(feature, name)
+        for column, value in equals.items():
+            wanted = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+            if column in self.categories:
+                lookup = {v: i for i, v in enumerate(self.categories[column])}
+                wanted = [lookup[v] for v in wanted if v in lookup]
+            mask &= np.isin(self.columns[column], wanted)
+        return mask
+
+    def _has(self, feature, name):
+        matrix, _, lookup = self.features[feature]
+        if name not in lookup:
+            return np.zeros(len(self), dtype=bool)
+        return np.asarray(matrix[:, lookup[name]].toarray()).ravel() > 0
+
+    def _weights(self, mask):
+        return np.ones(len(self), dtype=np.int64) if mask is None else np.asarray(mask, dtype=np.int64)
+
+    def feature_counts(self, feature='condition', mask=None, top=None):
+        """
+        name -> number of (masked) patients with it, most common first
+        """
+        matrix, names, _ = self.features[feature]
+        counts = matrix.T @ self._weights(mask)
+        order = np.argsort(-counts, kind='stable')
+        if top is not None:
+            order = order[:top]
+        return {names[i]: int(counts[i]) for i in order if counts[i] > 0}
+
+    def group_by(self, column, feature='condition', mask=None, bins=None):
+        """
+        group -> {name: patients} counts per attribute value in one product
+
+        Numeric columns need bins (edges, e.g. [0, 40, 60, 80, 120]); groups
+        are then (low, high) intervals with low <= value < high.
+        """
+        values = self.columns[column]
+        if bins is not None:
+            codes = np.digitize(values, bins) - 1
+            codes[np.isnan(values) | (codes < 0) | (codes >= len(bins) - 1)] = -1
+            groups = list(zip(bins[:-1], bins[1:]))
+        elif column in self.categories:
+            codes = values
+            groups = self.categories[column]
+        else:
+            raise ValueError(f"Column {column} is numeric; pass bins")
+
+        selected = codes >= 0
+        if mask is not None:
+            selected &= mask
+        rows = np.flatnonzero(selected)
+        indicator = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int64), (codes[rows], rows)), shape=(len(groups), len(self)))
+        matrix, names, _ = self.features[feature]
+        counts = (indicator @ matrix).toarray()
+        return {groups[g]: {names[i]: int(counts[g, i]) for i in np.flatnonzero(counts[g])}
+                for g in range(len(groups)) if counts[g].any()}
+
+    def co_occurrence(self, feature='condition', other=None, mask=None):
+        """
+        (row names, column names, counts) of patients having both names
+
+        The diagonal of a feature with itself holds the per-name counts.
+        """
+        matrix, names, _ = self.features[feature]
+        other_matrix, other_names, _ = self.features[other or feature]
+        if mask is not None:
+            rows = np.flatnonzero(mask)
+            matrix, other_matrix = matrix[rows], other_matrix[rows]
+        return names, other_names, (matrix.T @ other_matrix).toarray()
+
+    def risk_ratios(self, condition, mask=None, within_days=None):
+        """
+        factor -> risk ratio over the (masked) population, as predict_risk_factors
+
+        A case is a patient with a dated diagnosis of condition; a factor
+        counts once per case if it was recorded before the first diagnosis
+        (within_days before it, if given). The ratio is the factor's share
+        of cases over its share of the population.
+        """
+        matrix, names, lookup = self.features['condition']
+        population = self._weights(mask)
+        if condition not in lookup:
+            return {}
+        rows, columns, days = self.diagnoses
+        target = columns == lookup[condition]
+        onset = np.full(len(self), np.iinfo(np.int64).max)
+        np.minimum.at(onset, rows[target], days[target])
+        cases = (onset < np.iinfo(np.int64).max) & (population > 0)
+        num_cases = int(np.count_nonzero(cases))
+        if num_cases == 0:
+            return {}
+
+        before = cases[rows] & ~target & (days < onset[rows])
+        if within_days is not None:
+            before &= days >= onset[rows] - within_days
+        # One count per case and factor
+        pairs = np.unique(rows[before] * len(names) + columns[before])
+        case_counts = np.bincount(pairs % len(names), minlength=len(names))
+        population_counts = matrix.T @ population
+        total = population.sum()
+        return {names[i]: float((case_counts[i] / num_cases) / (population_counts[i] / total))
+                for i in np.flatnonzero(case_counts)}
+
+    def lift_matrix(self, feature='condition', mask=None):
+        """
+        (names, matrix) of risk ratios for every pair of names at once
+
+        Entry [i, j] is P(j | i) / P(j) for names ever recorded, whatever
+        their order (unlike risk_ratios); rows of names nobody has are zero.
+        """
+        names, _, counts = self.co_occurrence(feature, mask=mask)
+        total = len(self) if mask is None else int(np.count_nonzero(mask))
+        prevalence = np.diag(counts).astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lift = counts * total / np.outer(prevalence, prevalence)
+        return names, np.nan_to_num(lift, nan=0.0, posinf=0.0)
+
+
+def _column(values):
+    """
+    (array, categories) for one attribute; categories is None for numeric columns
+    """
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in present):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64), None
+    categories = sorted({str(v) for v in present})
+    lookup = {v: i for i, v in enumerate(categories)}
+    return np.array([-1 if v is None else lookup[str(v)] for v in values], dtype=np.int32), categories
+
+
+def _diagnoses(index, patient_ids, names):
+    """
+    (patient rows, condition columns, days) of every dated diagnosis
+    """
+    lookup = {n: i for i, n in enumerate(names)}
+    rows, columns, days = [], [], []
+    for row, patient_id in enumerate(patient_ids):
+        for encounter in index.patient_encounters.get(patient_id, ()):
+            day = index.encounter_days.get(encounter)
+            if day is None:
+                continue
+            for condition in index.encounter_conditions.get(encounter, ()):
+                column = lookup.get(index.description(condition))
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    days.append(day)
+    return (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64),
+            np.array(days, dtype=np.int64))
+
+
+def _membership_matrix(feature_sets):
+    """
+    (CSR matrix, names) with a 1 for every (row, name) membership
+    """
+    vocabulary = {}
+    indptr = [0]
+    indices = []
+    for features in feature_sets:
+        indices.extend(vocabulary.setdefault(f, len(vocabulary)) for f in features if f is not None)
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.int64), indices, indptr),
+                               shape=(len(feature_sets), len(vocabulary)))
+    return matrix, list(vocabulary)
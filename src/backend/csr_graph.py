@@ -0,0 +1,305 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from src.backend.temporal import NO_DAY, format_day, parse_day
+
+# Node and relationship vocabularies shared by the compact representation
+NODE_TYPES = ('patient', 'encounter', 'condition', 'medication', 'procedure')
+NODE_TYPE_CODES = {name: code for code, name in enumerate(NODE_TYPES)}
+NODE_TYPE_COLLECTIONS = {
+    'patient': 'patients',
+    'encounter': 'encounters',
+    'condition': 'conditions',
+    'medication': 'medications',
+    'procedure': 'procedures'
+}
+EDGE_TYPES = ('HAD_ENCOUNTER', 'DIAGNOSED_WITH', 'PRESCRIBED', 'PERFORMED')
+EDGE_TYPE_CODES = {name: code for code, name in enumerate(EDGE_TYPES)}
+# Direction of each relation as (source type, target type)
+RELATION_ENDPOINTS = {
+    'HAD_ENCOUNTER': ('patient', 'encounter'),
+    'DIAGNOSED_WITH': ('encounter', 'condition'),
+    'PRESCRIBED': ('encounter', 'medication'),
+    'PERFORMED': ('encounter', 'procedure')
+}
+
+UNKNOWN = -1
+
+
+def document_id(collection, key):
+    """
+    Node key of a document: its ArangoDB _id, unique across collections
+    """
+    return f"{collection}/{key}"
+
+
+def document_key(node):
+    """
+    (collection, _key) of a node key built by document_id
+    """
+    collection, _, key = node.partition('/')
+    return collection, key
+
+
+def expand_frontier(indptr, indices, frontier):
+    """
+    (source, neighbor) id arrays for every edge leaving the frontier nodes
+    """
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    sources = np.repeat(frontier, counts)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return sources, indices[offsets + np.arange(counts.sum())]
+
+
+class CSRGraph:
+    """
+    Compact, array-backed directed graph in compressed sparse row layout
+
+    Nodes are integer ids 0..n-1 mapped to their ArangoDB _id (document_id).
+    Node types and descriptions are stored as small integer codes and dates
+    as integer days (``node_days``, NO_DAY when unknown). Every edge is held
+    in both endpoint rows of ``indptr``/``indices`` so traversals can walk
+    it either way; the parallel ``edge_types`` and ``edge_outgoing`` arrays
+    keep its relation and whether the row node is its source. Full documents
+    are not kept in memory and are fetched through ``document_loader`` on demand.
+    """
+    def __init__(self, keys, node_types, description_codes, descriptions,
+                 indptr, indices, edge_types, document_loader=None,
+                 document_cache_size=1024, node_days=None, edge_outgoing=None):
+        self.keys = keys
+        self.node_types = node_types
+        self.description_codes = description_codes
+        self.descriptions = descriptions
+        self.indptr = indptr
+        self.indices = indices
+        self.edge_types = edge_types
+        self.edge_outgoing = edge_outgoing
+        self.node_days = (node_days if node_days is not None
+                          else np.full(len(node_types), NO_DAY, dtype=np.int32))
+        self.document_loader = document_loader
+        self.document_cache_size = document_cache_size
+        self._key_to_id = None
+        self._documents = OrderedDict()
+
+    @classmethod
+    def from_elements(cls, nodes, edges, document_loader=None):
+        """
+        Build from loader output: (key, attrs) nodes and (u, v, attrs) edges
+        """
+        key_to_id = {}
+        keys = []
+        node_types = []
+        description_codes = []
+        node_days = []
+        description_table = {}
+
+        for key, attrs in nodes:
+            data = attrs.get('data') or {}
+            description = data.get('description')
+            if key in key_to_id:
+                node_id = key_to_id[key]
+            else:
+                node_id = key_to_id[key] = len(keys)
+                keys.append(key)
+                node_types.append(UNKNOWN)
+                description_codes.append(UNKNOWN)
+                node_days.append(NO_DAY)
+            node_types[node_id] = NODE_TYPE_CODES.get(attrs.get('type'), UNKNOWN)
+            if description is not None:
+                description_codes[node_id] = description_table.setdefault(
+                    description, len(description_table))
+            day = parse_day(data.get('date'))
+            if day is not None:
+                node_days[node_id] = day
+
+        sources = []
+        targets = []
+        edge_types = []
+        for u, v, attrs in edges:
+            for key in (u, v):
+                if key not in key_to_id:
+                    # Edges may reference nodes that have no document of their own
+                    key_to_id[key] = len(keys)
+                    keys.append(key)
+                    node_types.append(UNKNOWN)
+                    description_codes.append(UNKNOWN)
+                    node_days.append(NO_DAY)
+            sources.append(key_to_id[u])
+            targets.append(key_to_id[v])
+            edge_types.append(EDGE_TYPE_CODES.get(attrs.get('type'), UNKNOWN))
+
+        graph = cls._from_arrays(
+            keys,
+            np.asarray(node_types, dtype=np.int8),
+            np.asarray(description_codes, dtype=np.int32),
+            [d for d, _ in sorted(description_table.items(), key=lambda item: item[1])],
+            np.asarray(sources, dtype=np.int64),
+            np.asarray(targets, dtype=np.int64),
+            np.asarray(edge_types, dtype=np.int8),
+            document_loader
+        )
+        graph.node_days = np.asarray(node_days, dtype=np.int32)
+        graph._key_to_id = key_to_id
+        return graph
+
+    @classmethod
+    def from_networkx(cls, graph, document_loader=None):
+        """
+        Build from a MedGraphNavigator NetworkX graph
+        """
+        return cls.from_elements(graph.nodes(data=True), graph.edges(data=True),
+                                 document_loader=document_loader)
+
+    @classmethod
+    def _from_arrays(cls, keys, node_types, description_codes, descriptions,
+                     sources, targets, edge_types, document_loader):
+        num_nodes = len(keys)
+        index_dtype = np.int32 if num_nodes < np.iinfo(np.int32).max else np.int64
+
+        # One edge per (source, target, relation), as in a typed multigraph
+        order = np.lexsort((edge_types, targets, sources))
+        sources, targets, edge_types = sources[order], targets[order], edge_types[order]
+        first = np.ones(len(sources), dtype=bool)
+        first[1:] = ((sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1]) |
+                     (edge_types[1:] != edge_types[:-1]))
+        sources, targets, edge_types = sources[first], targets[first], edge_types[first]
+
+        # Store each edge in both endpoint rows, flagged outgoing at its source
+        rows = np.concatenate([sources, targets])
+        cols = np.concatenate([targets, sources])
+        types = np.concatenate([edge_types, edge_types])
+        outgoing = np.concatenate([np.ones(len(sources), dtype=bool), np.zeros(len(targets), dtype=bool)])
+        order = np.argsort(rows, kind='stable')
+
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=num_nodes), out=indptr[1:])
+
+        return cls(keys, node_types, description_codes, descriptions, indptr,
+                   cols[order].astype(index_dtype), types[order],
+                   document_loader=document_loader, edge_outgoing=outgoing[order])
+
+    def number_of_nodes(self):
+        return len(self.keys)
+
+    def number_of_edges(self):
+        return len(self.indices) // 2
+
+    def nbytes(self):
+        """
+        Bytes held by the topology and attribute arrays
+        """
+        return sum(array.nbytes for array in (
+            self.node_types, self.description_codes, self.node_days, self.indptr,
+            self.indices, self.edge_types, self.edge_outgoing))
+
+    def node_id(self, key):
+        if self._key_to_id is None:
+            if hasattr(self.keys, 'lookup'):
+                # Memory-mapped key tables resolve keys without a full dict
+                return self.keys.lookup(key)
+            self._key_to_id = {k: i for i, k in enumerate(self.keys)}
+        return self._key_to_id[key]
+
+    def has_node(self, key):
+        try:
+            self.node_id(key)
+        except KeyError:
+            return False
+        return True
+
+    def node_type(self, key):
+        code = self.node_types[self.node_id(key)]
+        return NODE_TYPES[code] if code != UNKNOWN else None
+
+    def description(self, key):
+        code = self.description_codes[self.node_id(key)]
+        return self.descriptions[code] if code != UNKNOWN else None
+
+    def day(self, key):
+        """
+        Date of a node as days since 1970-01-01, or None
+        """
+        day = self.node_days[self.node_id(key)]
+        return int(day) if day != NO_DAY else None
+
+    def neighbor_ids(self, node_id, relations=None, direction='both'):
+        """
+        Neighbour ids of a node, optionally only across the given relations
+
+        direction is 'out' (the node is the source), 'in' or 'both'.
+        """
+        start, end = self.indptr[node_id], self.indptr[node_id + 1]
+        keep = np.ones(end - start, dtype=bool)
+        if relations is not None:
+            keep &= np.isin(self.edge_types[start:end], [EDGE_TYPE_CODES[r] for r in relations])
+        if direction != 'both':
+            keep &= np.asarray(self.edge_outgoing[start:end]) == (direction == 'out')
+        return self.indices[start:end][keep]
+
+    def neighbors(self, key, relations=None, direction='both'):
+        keys = self.keys
+        return (keys[i] for i in self.neighbor_ids(self.node_id(key), relations, direction))
+
+    def nodes_of_type(self, node_type):
+        code = NODE_TYPE_CODES[node_type]
+        keys = self.keys
+        return [keys[i] for i in np.flatnonzero(self.node_types == code)]
+
+    def nodes_with_description(self, node_type, description):
+        """
+        Keys of nodes of a type whose interned description matches
+        """
+        try:
+            code = self.descriptions.index(description)
+        except ValueError:
+            return []
+        mask = (self.node_types == NODE_TYPE_CODES[node_type]) & (self.description_codes == code)
+        keys = self.keys
+        return [keys[i] for i in np.flatnonzero(mask)]
+
+    def document(self, key):
+        """
+        Full ArangoDB document for a node, fetched lazily and cached
+        """
+        if key in self._documents:
+            self._documents.move_to_end(key)
+            return self._documents[key]
+        node_type = self.node_type(key)
+        if self.document_loader is None or node_type is None:
+            return None
+
+        doc = self.document_loader(*document_key(key))
+        self._documents[key] = doc
+        if len(self._documents) > self.document_cache_size:
+            self._documents.popitem(last=False)
+        return doc
+
+    def to_networkx(self):
+        """
+        Expand into an equivalent NetworkX DiGraph (without documents)
+        """
+        import networkx as nx
+
+        graph = nx.DiGraph()
+        for node_id, key in enumerate(self.keys):
+            attrs = {}
+            if self.node_types[node_id] != UNKNOWN:
+                attrs['type'] = NODE_TYPES[self.node_types[node_id]]
+            data = {}
+            if self.description_codes[node_id] != UNKNOWN:
+                data['description'] = self.descriptions[self.description_codes[node_id]]
+            if self.node_days[node_id] != NO_DAY:
+                data['date'] = format_day(int(self.node_days[node_id]))
+            if data:
+                attrs['data'] = data
+            graph.add_node(key, **attrs)
+        for u in range(len(self.keys)):
+            start, end = self.indptr[u], self.indptr[u + 1]
+            for v, edge_type, outgoing in zip(self.indices[start:end], self.edge_types[start:end],
+                                              self.edge_outgoing[start:end]):
+                if outgoing:
+                    attrs = {'type': EDGE_TYPES[edge_type]} if edge_type != UNKNOWN else {}
+                    graph.add_edge(self.keys[u], self.keys[v], **attrs)
+        return graph
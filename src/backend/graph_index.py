@@ -0,0 +1,342 @@
+from bisect import bisect_left
+from collections import defaultdict
+
+from src.backend.csr_graph import CSRGraph, EDGE_TYPES, NODE_TYPES, RELATION_ENDPOINTS, UNKNOWN
+from src.backend.temporal import NO_DAY, parse_day
+
+# Patient document fields kept for cohort queries
+PATIENT_ATTRIBUTES = ('age', 'gender', 'location')
+
+
+class GraphIndex:
+    """
+    Typed neighbourhood indexes over the medical graph
+
+    A directed store with one adjacency per relation (RELATION_ENDPOINTS):
+    ``outgoing[relation][source]`` and ``incoming[relation][target]`` hold
+    the node sets, so traversals follow exactly the relations they need
+    (condition -> encounter -> medication/patient) instead of scanning
+    every node and filtering neighbours by type. The common directions are
+    also exposed by name, e.g. ``patient_encounters`` (HAD_ENCOUNTER out)
+    and ``condition_encounters`` (DIAGNOSED_WITH in). Encounter dates are
+    parsed to integer days, and each patient has a timeline of encounters
+    sorted by day for binary-searched time windows.
+    """
+    def __init__(self):
+        # Bumped on every mutation so derived caches can detect staleness
+        self.version = 0
+        self.node_types = {}
+        self.descriptions = {}
+        # Ordered per-type membership (dict keys keep load order)
+        self.nodes_by_type = defaultdict(dict)
+        self.conditions_by_description = defaultdict(set)
+        # relation -> source -> targets, and relation -> target -> sources
+        self.outgoing = {relation: defaultdict(set) for relation in EDGE_TYPES}
+        self.incoming = {relation: defaultdict(set) for relation in EDGE_TYPES}
+        self.patient_encounters = self.outgoing['HAD_ENCOUNTER']
+        self.encounter_patients = self.incoming['HAD_ENCOUNTER']
+        self.encounter_conditions = self.outgoing['DIAGNOSED_WITH']
+        self.condition_encounters = self.incoming['DIAGNOSED_WITH']
+        self.encounter_medications = self.outgoing['PRESCRIBED']
+        self.medication_encounters = self.incoming['PRESCRIBED']
+        self.encounter_procedures = self.outgoing['PERFORMED']
+        self.procedure_encounters = self.incoming['PERFORMED']
+        self.encounter_days = {}
+        self.patient_attributes = {}
+        # patient -> (sorted days, encounters); dropped when either changes
+        self._timelines = {}
+        # description -> condition nodes most recent first, for one version
+        self._recent_conditions = {}
+        self._recent_version = None
+
+    @classmethod
+    def from_elements(cls, nodes, edges):
+        """
+        Build from (key, attrs) nodes and (u, v, attrs) edges
+        """
+        index = cls()
+        for key, attrs in nodes:
+            data = attrs.get('data') or {}
+            index.add_node(key, attrs.get('type'), data.get('description'), parse_day(data.get('date')),
+                           attributes=data)
+        for edge in edges:
+            index.add_edge(edge[0], edge[1], edge[2].get('type') if len(edge) > 2 else None)
+        index.build_timelines()
+        return index
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Build from an nx.DiGraph or a CSRGraph
+        """
+        if isinstance(graph, CSRGraph):
+            return cls.from_elements(_csr_nodes(graph), _csr_edges(graph))
+        return cls.from_elements(graph.nodes(data=True), graph.edges(data=True))
+
+    def add_node(self, key, node_type, description=None, day=None, attributes=None):
+        """
+        Add a node, or update the type, description and day of an existing one
+
+        day (days since 1970-01-01, see parse_day) is kept for encounters,
+        and the PATIENT_ATTRIBUTES found in attributes for patients.
+        """
+        previous_type = self.node_types.get(key)
+        if key in self.node_types and previous_type != node_type:
+            self.nodes_by_type[previous_type].pop(key, None)
+        self._unindex_description(key)
+
+        self.node_types[key] = node_type
+        self.nodes_by_type[node_type][key] = None
+        if description is not None:
+            self.descriptions[key] = description
+            if node_type == 'condition':
+                self.conditions_by_description[description].add(key)
+        if node_type == 'encounter' and day is not None:
+            self.encounter_days[key] = day
+        else:
+            self.encounter_days.pop(key, None)
+        if node_type == 'patient' and attributes:
+            self.patient_attributes[key] = {name: attributes[name] for name in PATIENT_ATTRIBUTES
+                                            if attributes.get(name) is not None}
+        elif node_type != 'patient':
+            self.patient_attributes.pop(key, None)
+        for patient_id in self.encounter_patients.get(key, ()):
+            self._timelines.pop(patient_id, None)
+        self.version += 1
+
+    def remove_node(self, key):
+        """
+        Remove a node and every indexed edge touching it
+        """
+        if key not in self.node_types:
+            return
+        for relation in EDGE_TYPES:
+            for target in list(self.outgoing[relation].get(key, ())):
+                self.remove_edge(key, target, relation)
+            for source in list(self.incoming[relation].get(key, ())):
+                self.remove_edge(source, key, relation)
+
+        self._unindex_description(key)
+        self.encounter_days.pop(key, None)
+        self.patient_attributes.pop(key, None)
+        self._timelines.pop(key, None)
+        self.nodes_by_type[self.node_types.pop(key)].pop(key, None)
+        self.version += 1
+
+    def _unindex_description(self, key):
+        description = self.descriptions.pop(key, None)
+        if description is not None and description in self.conditions_by_description:
+            self.conditions_by_description[description].discard(key)
+            if not self.conditions_by_description[description]:
+                del self.conditions_by_description[description]
+
+    def _orient(self, u, v, relation=None):
+        """
+        (relation, source, target) for an edge, or None if its endpoints do
+        not have the types of relation (or of any relation, when not given)
+        """
+        u_type, v_type = self.node_types.get(u), self.node_types.get(v)
+        for name in ((relation,) if relation is not None else EDGE_TYPES):
+            endpoints = RELATION_ENDPOINTS.get(name)
+            if endpoints == (u_type, v_type):
+                return name, u, v
+            if endpoints == (v_type, u_type):
+                return name, v, u
+        return None
+
+    def add_edge(self, u, v, relation=None):
+        """
+        Record an edge under its relation, stored source -> target
+
+        Undirected input is oriented by the endpoint types; without a
+        relation the one matching those types is used.
+        """
+        oriented = self._orient(u, v, relation)
+        if oriented is None:
+            return
+        relation, source, target = oriented
+        self.outgoing[relation][source].add(target)
+        self.incoming[relation][target].add(source)
+        if relation == 'HAD_ENCOUNTER':
+            self._timelines.pop(source, None)
+        self.version += 1
+
+    def remove_edge(self, u, v, relation=None):
+        oriented = self._orient(u, v, relation)
+        if oriented is None:
+            return
+        relation, source, target = oriented
+        if relation == 'HAD_ENCOUNTER':
+            self._timelines.pop(source, None)
+        for adjacency, key, other in ((self.outgoing[relation], source, target),
+                                      (self.incoming[relation], target, source)):
+            if key in adjacency:
+                adjacency[key].discard(other)
+                if not adjacency[key]:
+                    del adjacency[key]
+        self.version += 1
+
+    def neighbors(self, key, relations=None, direction='both'):
+        """
+        Neighbours of a node across the given relations (default all)
+
+        direction is 'out' (key is the source), 'in' (key is the target) or
+        'both'; only the selected adjacencies are visited.
+        """
+        for relation in (relations or EDGE_TYPES):
+            if direction in ('out', 'both'):
+                yield from self.outgoing[relation].get(key, ())
+            if direction in ('in', 'both'):
+                yield from self.incoming[relation].get(key, ())
+
+    def encounter_neighbors(self, key):
+        """
+        Encounters adjacent to a patient, condition, medication or procedure node
+        """
+        if self.node_types.get(key) == 'encounter':
+            return ()
+        return set(self.neighbors(key))
+
+    def patients_of(self, key):
+        """
+        Patients whose data includes a node (patient, encounter, condition,
+        medication or procedure)
+        """
+        node_type = self.node_types.get(key)
+        if node_type == 'patient':
+            return {key}
+        encounters = [key] if node_type == 'encounter' else self.encounter_neighbors(key)
+        return {p for e in encounters for p in self.encounter_patients.get(e, ())}
+
+    def description(self, key):
+        return self.descriptions.get(key)
+
+    def encounter_day(self, encounter_id):
+        return self.encounter_days.get(encounter_id)
+
+    def build_timelines(self):
+        """
+        Sort every patient's dated encounters by day
+        """
+        for patient_id in self.nodes_of_type('patient'):
+            self.patient_timeline(patient_id)
+
+    def patient_timeline(self, patient_id):
+        """
+        (days, encounters) of a patient's dated encounters in day order
+        """
+        timeline = self._timelines.get(patient_id)
+        if timeline is None:
+            dated = sorted((self.encounter_days[e], e) for e in self.patient_encounters.get(patient_id, ())
+                           if e in self.encounter_days)
+            timeline = self._timelines[patient_id] = ([d for d, _ in dated], [e for _, e in dated])
+        return timeline
+
+    def patient_encounters_between(self, patient_id, start=None, end=None):
+        """
+        A patient's encounters with start <= day < end, in day order
+        """
+        days, encounters = self.patient_timeline(patient_id)
+        low = 0 if start is None else bisect_left(days, start)
+        high = len(days) if end is None else bisect_left(days, end)
+        return encounters[low:high]
+
+    def condition_onsets(self, description):
+        """
+        Patient -> first day a condition was recorded for them
+        """
+        onsets = {}
+        for condition_id in self.conditions_with_description(description):
+            for encounter in self.condition_encounters.get(condition_id, ()):
+                day = self.encounter_days.get(encounter)
+                if day is None:
+                    continue
+                for patient_id in self.encounter_patients.get(encounter, ()):
+                    if onsets.get(patient_id, day) >= day:
+                        onsets[patient_id] = day
+        return onsets
+
+    def nodes_of_type(self, node_type):
+        return self.nodes_by_type.get(node_type, {}).keys()
+
+    def conditions_with_description(self, description):
+        return self.conditions_by_description.get(description, set())
+
+    def recent_conditions(self, description, limit=None):
+        """
+        Condition nodes with a description, most recently diagnosed first
+
+        A diagnosis is dated by its earliest encounter; undated ones come
+        last and ties go by key. The order is kept per description until
+        the index changes, so repeated calls cost O(limit).
+        """
+        if self._recent_version != self.version:
+            self._recent_conditions = {}
+            self._recent_version = self.version
+        ordered = self._recent_conditions.get(description)
+        if ordered is None:
+            dated = []
+            for condition_id in self.conditions_with_description(description):
+                days = [self.encounter_days[e] for e in self.condition_encounters.get(condition_id, ())
+                        if e in self.encounter_days]
+                dated.append((not days, -min(days) if days else 0, condition_id))
+            ordered = self._recent_conditions[description] = [key for _, _, key in sorted(dated)]
+        return ordered[:limit]
+
+    def condition_medications(self, condition_id):
+        """
+        Medications prescribed in the encounters where a condition was diagnosed
+        """
+        return [m for e in self.condition_encounters.get(condition_id, ())
+                for m in self.encounter_medications.get(e, ())]
+
+    def condition_patients(self, condition_id):
+        """
+        Patients whose encounters recorded a condition
+        """
+        return [p for e in self.condition_encounters.get(condition_id, ())
+                for p in self.encounter_patients.get(e, ())]
+
+    def patient_conditions(self, patient_id):
+        """
+        Condition nodes recorded across a patient's encounters
+        """
+        return [c for e in self.patient_encounters.get(patient_id, ())
+                for c in self.encounter_conditions.get(e, ())]
+
+    def patient_medications(self, patient_id):
+        """
+        Medication nodes prescribed across a patient's encounters
+        """
+        return [m for e in self.patient_encounters.get(patient_id, ())
+                for m in self.encounter_medications.get(e, ())]
+
+    def patient_procedures(self, patient_id):
+        """
+        Procedure nodes performed across a patient's encounters
+        """
+        return [p for e in self.patient_encounters.get(patient_id, ())
+                for p in self.encounter_procedures.get(e, ())]
+
+
+def _csr_nodes(graph):
+    for node_id, key in enumerate(graph.keys):
+        type_code = graph.node_types[node_id]
+        description_code = graph.description_codes[node_id]
+        attrs = {'type': NODE_TYPES[type_code] if type_code != UNKNOWN else None, 'data': {}}
+        if description_code != UNKNOWN:
+            attrs['data']['description'] = graph.descriptions[description_code]
+        if graph.node_days[node_id] != NO_DAY:
+            # Already a day number; parse_day passes integers through
+            attrs['data']['date'] = int(graph.node_days[node_id])
+        yield key, attrs
+
+
+def _csr_edges(graph):
+    keys = graph.keys
+    for u in range(graph.number_of_nodes()):
+        start, end = graph.indptr[u], graph.indptr[u + 1]
+        for v, edge_type, outgoing in zip(graph.indices[start:end], graph.edge_types[start:end],
+                                          graph.edge_outgoing[start:end]):
+            if outgoing:
+                yield keys[u], keys[v], {'type': EDGE_TYPES[edge_type] if edge_type != UNKNOWN else None}
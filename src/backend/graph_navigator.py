@@ -1,206 +1,652 @@
 import networkx as nx
-from arango import ArangoClient
 import json
-from langchain.agents import Tool, AgentExecutor
-from langchain.chains import LLMChain
-from langchain.agents import ZeroShotAgent
-from langchain.chat_models import ChatOpenAI
 import os
+import threading
+import time
+from src.backend.analytics_backends import select_backend
+from src.backend.analytics_cache import AnalyticsCache
+from src.backend.csr_graph import CSRGraph, document_id
+from src.backend.graph_index import GraphIndex
+from src.backend.intent_router import IntentRouter
+from src.backend.locks import ReadWriteLock, reading
+from src.backend.instrumentation import SamplingProfiler, langchain_callback_handler, metrics
+from src.backend.medical_analyzer import MedicalAnalyzer
+from src.backend.path_service import PathService
+from src.backend.response_cache import SemanticResponseCache, entity_terms
+from src.backend.sharding import SHARD_FILTER
+from src.backend import retrieval
+from src.backend.snapshot import SnapshotError, load_snapshot, save_snapshot
 
-# Initialize ArangoDB client
-client = ArangoClient(hosts='http://localhost:8529')
-db = client.db('medgraph', username='root', password='')
+def connect_database():
+    """
+    Open a connection to the MedGraph database (one HTTP session per call)
+    """
+    from arango import ArangoClient
+
+    return ArangoClient(hosts='http://localhost:8529').db('medgraph', username='root', password='')
+
+# Shared connection and navigator, created on first use rather than at import
+_default_db = None
+_default_navigator = None
+
+
+def get_database():
+    global _default_db
+    if _default_db is None:
+        _default_db = connect_database()
+    return _default_db
+
+
+def get_navigator():
+    global _default_navigator
+    if _default_navigator is None:
+        _default_navigator = MedGraphNavigator()
+    return _default_navigator
+
+
+def __getattr__(name):
+    # Module-level ``db`` and ``navigator`` resolve lazily
+    if name == 'db':
+        return get_database()
+    if name == 'navigator':
+        return get_navigator()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Per-collection loader spec: node type, projected fields and the edge each
+# document contributes as (source field, relationship type, source collection).
+# Nodes are keyed by ArangoDB _id (document_id), so keys never collide
+# across collections; edges point from the referenced document to this one.
+COLLECTION_SPECS = {
+    'patients': {
+        'type': 'patient',
+        'fields': ['_key', 'age', 'gender', 'location'],
+        'edge': None
+    },
+    'encounters': {
+        'type': 'encounter',
+        'fields': ['_key', 'patient_id', 'date'],
+        'edge': ('patient_id', 'HAD_ENCOUNTER', 'patients')
+    },
+    'conditions': {
+        'type': 'condition',
+        'fields': ['_key', 'patient_id', 'encounter_id', 'description', 'date'],
+        'edge': ('encounter_id', 'DIAGNOSED_WITH', 'encounters')
+    },
+    'medications': {
+        'type': 'medication',
+        'fields': ['_key', 'patient_id', 'encounter_id', 'description', 'date'],
+        'edge': ('encounter_id', 'PRESCRIBED', 'encounters')
+    },
+    'procedures': {
+        'type': 'procedure',
+        'fields': ['_key', 'patient_id', 'encounter_id', 'description', 'date'],
+        'edge': ('encounter_id', 'PERFORMED', 'encounters')
+    }
+}
+
+DEFAULT_BATCH_SIZE = 10000
+
+PROJECTION_QUERY = """
+    FOR doc IN @@collection
+    RETURN KEEP(doc, @fields)
+"""
+
+# Projection of one shard's documents, filtered in the database
+SHARD_PROJECTION_QUERY = f"""
+    FOR doc IN @@collection
+    {SHARD_FILTER.strip()}
+    RETURN KEEP(doc, @fields)
+"""
+
+# Query templates for execute_aql_query, keyed by intent
+AQL_TEMPLATES = {
+    "patient_history": """
+        FOR patient IN patients
+        FILTER patient._key == @patient_id
+        LET encounters = (
+            FOR e IN OUTBOUND patient._id patient_encounters
+            SORT e.date DESC
+            RETURN e
+        )
+        RETURN { patient, encounters }
+    """,
+    "condition_frequency": """
+        FOR c IN conditions
+        COLLECT condition = c.description WITH COUNT INTO freq
+        SORT freq DESC
+        LIMIT 10
+        RETURN { condition, frequency: freq }
+    """
+}
 
 # Initialize graph structure
 class MedGraphNavigator:
-    def __init__(self):
-        self.graph = nx.Graph()
-        self.db = db
+    def __init__(self, database=None, analytics_cache=None, llm=None, response_cache=None):
+        # Directed: every edge points from the referenced document to its owner
+        self.graph = nx.DiGraph()
+        self._database = database
+        # Agent LLM; ChatOpenAI is created on first agent use when not given
+        self.llm = llm
+        # Common questions skip the agent; conditions come from the loaded index
+        self.router = IntentRouter(conditions=lambda: self.analyzer.index.conditions_by_description.keys())
+        # Answers to near-duplicate questions, valid for one graph version
+        self.response_cache = (response_cache if response_cache is not None
+                               else SemanticResponseCache(entities=self._query_entities))
+        # Bumped whenever the graph changes; keys cached analytics results
+        self.graph_version = 0
+        self.analytics_cache = analytics_cache if analytics_cache is not None else AnalyticsCache()
+        # Ego subgraphs extracted per query entity, reused across questions
+        self.retrieval_cache = AnalyticsCache(max_entries=256, max_bytes=64 * 1024 * 1024)
+        # Size of the graph context and of each tool result given to the agent
+        self.token_budget = retrieval.DEFAULT_TOKEN_BUDGET
+        self._backend = None
+        self._backend_version = None
+        self._paths = None
+        self._paths_version = None
+        self.load_stats = {}
+        self.index = None
+        self.load_tick = None
+        self.syncer = None
+        self._analyzer = None
+        self._query_pool = None
+        # Held for writing while the graph changes (GraphSyncer), for reading by every query
+        self.lock = ReadWriteLock()
+        # Concurrent callers (e.g. the serving threads) share one agent
+        self._agent_lock = threading.Lock()
+
+    @property
+    def db(self):
+        """
+        Database handle; the default connection opens on first access
+        """
+        if self._database is None:
+            self._database = get_database()
+        return self._database
         
-    def load_synthea_data(self):
+    def load_synthea_data(self, batch_size=DEFAULT_BATCH_SIZE, compact=False, snapshot_path=None, shard=None):
         """
         Load Synthea dataset from ArangoDB into NetworkX with validation
+
+        Each collection is read once through a streaming AQL cursor that only
+        projects the fields the graph needs. Nodes and edges are collected in
+        bulk and added with add_nodes_from/add_edges_from. With compact=True
+        the graph is stored as a CSRGraph and documents are fetched lazily.
+
+        With snapshot_path, a snapshot whose collection revisions still match
+        ArangoDB is memory-mapped instead of reloading; otherwise the data is
+        loaded compactly and a fresh snapshot is written there.
+
+        shard=(index, count) keeps only the patients hashed to that shard
+        (see src/backend/sharding.py) with their encounters, conditions,
+        medications and procedures; the cursor filters them in ArangoDB, so
+        other shards' documents are never transferred.
         """
+        if snapshot_path is not None:
+            if self.open_graph_snapshot(snapshot_path):
+                return True
+            compact = True
+        
         try:
-            # Connect to ArangoDB collections
-            collections = {
-                'patients': self.db.collection('patients'),
-                'encounters': self.db.collection('encounters'),
-                'conditions': self.db.collection('conditions'),
-                'medications': self.db.collection('medications'),
-                'procedures': self.db.collection('procedures')
-            }
+            revisions = self.collection_revisions() if snapshot_path is not None else None
+            # WAL position before reading, so incremental sync misses nothing
+            self.load_tick = self._wal_tick()
             
             # Validate collections exist
-            for name, collection in collections.items():
+            for name in COLLECTION_SPECS:
+                collection = self.db.collection(name)
                 if not collection.properties()['status']:
                     raise ValueError(f"Collection {name} not found or not active")
             
-            # Load nodes with progress tracking
-            node_types = {
-                'patients': {'id_field': '_key', 'type': 'patient'},
-                'encounters': {'id_field': '_key', 'type': 'encounter'},
-                'conditions': {'id_field': '_key', 'type': 'condition'},
-                'medications': {'id_field': '_key', 'type': 'medication'},
-                'procedures': {'id_field': '_key', 'type': 'procedure'}
-            }
-            
-            for col_name, props in node_types.items():
-                print(f"Loading {col_name}...")
-                for doc in collections[col_name].all():
-                    self.graph.add_node(
-                        doc[props['id_field']], 
-                        type=props['type'],
-                        data=doc
-                    )
-                print(f"Loaded {self.graph.number_of_nodes()} total nodes")
+            nodes = []
+            edges = []
+            self.load_stats = {}
             
-            # Add relationships
-            print("Building relationships...")
+            # Single pass per collection: nodes and edges together
+            for col_name, spec in COLLECTION_SPECS.items():
+                start = time.perf_counter()
+                count = 0
+                edge_spec = spec['edge']
+                for doc in self._stream_collection(col_name, spec['fields'], batch_size, shard):
+                    node = document_id(col_name, doc['_key'])
+                    nodes.append((node, {'type': spec['type'], 'data': doc}))
+                    if edge_spec is not None and doc.get(edge_spec[0]):
+                        edges.append((
+                            document_id(edge_spec[2], doc[edge_spec[0]]),
+                            node,
+                            {'type': edge_spec[1], 'date': doc.get('date', '')}
+                        ))
+                    count += 1
+                
+                elapsed = time.perf_counter() - start
+                self.load_stats[col_name] = {
+                    'records': count,
+                    'seconds': elapsed,
+                    'records_per_second': count / elapsed if elapsed > 0 else float('inf')
+                }
+                metrics.observe('load.collection', elapsed, collection=col_name)
+                metrics.increment('rows_fetched', count, source='load', collection=col_name)
+                print(f"Loaded {count} {col_name} "
+                      f"({self.load_stats[col_name]['records_per_second']:.0f} records/s)")
             
-            # Patient-Encounter relationships
-            for encounter in collections['encounters'].all():
-                self.graph.add_edge(
-                    encounter['patient_id'],
-                    encounter['_key'],
-                    type='HAD_ENCOUNTER',
-                    date=encounter.get('date', '')
-                )
+            if compact:
+                self.graph = CSRGraph.from_elements(nodes, edges, document_loader=self.fetch_document)
+            else:
+                self.graph.add_nodes_from(nodes)
+                self.graph.add_edges_from(edges)
             
-            # Encounter-Condition relationships
-            for condition in collections['conditions'].all():
-                if 'encounter_id' in condition:
-                    self.graph.add_edge(
-                        condition['encounter_id'],
-                        condition['_key'],
-                        type='DIAGNOSED_WITH',
-                        date=condition.get('date', '')
-                    )
+            # Typed neighbourhood indexes used by the analyzers
+            self.index = GraphIndex.from_elements(nodes, edges)
+            self._analyzer = None
+            self._graph_replaced()
             
-            # Encounter-Medication relationships
-            for medication in collections['medications'].all():
-                if 'encounter_id' in medication:
-                    self.graph.add_edge(
-                        medication['encounter_id'],
-                        medication['_key'],
-                        type='PRESCRIBED',
-                        date=medication.get('date', '')
-                    )
+            if snapshot_path is not None:
+                save_snapshot(self.graph, snapshot_path, revisions=revisions)
+                print(f"Saved graph snapshot to {snapshot_path}")
             
-            print(f"Built {self.graph.number_of_edges()} relationships")
+            print(f"Loaded {self.graph.number_of_nodes()} total nodes, "
+                  f"built {self.graph.number_of_edges()} relationships")
             
             return True
             
         except Exception as e:
             print(f"Error loading data: {str(e)}")
             return False
+
+    def _stream_collection(self, name, fields, batch_size, shard=None):
+        """
+        Stream projected documents from a collection with a server-side cursor
+
+        shard=(index, count) keeps the documents of that shard's patients:
+        patients by _key, everything else by patient_id.
+        """
+        bind_vars = {'@collection': name, 'fields': fields}
+        if shard is None:
+            query = PROJECTION_QUERY
+        else:
+            query = SHARD_PROJECTION_QUERY
+            bind_vars.update(shard_field='_key' if name == 'patients' else 'patient_id',
+                             shard=shard[0], num_shards=shard[1])
+        return self.db.aql.execute(query, bind_vars=bind_vars, batch_size=batch_size, stream=True)
+
+    @property
+    def analyzer(self):
+        """
+        MedicalAnalyzer bound to the loaded graph and its indexes
+        """
+        if self._analyzer is None:
+            self._analyzer = MedicalAnalyzer(self.graph, index=self.index, lock=self.lock)
+        return self._analyzer
+
+    def _wal_tick(self):
+        try:
+            return self.db.wal.last_tick()['tick']
+        except Exception:
+            return None
+
+    def _graph_replaced(self):
+        self.graph_version += 1
+        self.analytics_cache.invalidate()
+        self.retrieval_cache.invalidate()
+        self.response_cache.invalidate()
+
+    def _query_entities(self, normalized_query):
+        """
+        Terms two queries must share to reuse a cached answer: ids, numbers
+        and condition names
+        """
+        return entity_terms(normalized_query) | self.router.condition_mentions(normalized_query)
+
+    def changed(self, patient_ids=()):
+        """
+        Notify derived structures that the graph changed for these patients
+        """
+        self._graph_replaced()
+        if self._analyzer is not None:
+            self._analyzer.refresh_patients(patient_ids)
+
+    def start_sync(self, interval=5.0):
+        """
+        Start incremental background sync from ArangoDB; returns the GraphSyncer
+        """
+        from src.backend.graph_sync import GraphSyncer
+        
+        if self.syncer is None:
+            self.syncer = GraphSyncer(self)
+        self.syncer.start(interval)
+        return self.syncer
+
+    def start_profiling(self, interval=0.005):
+        """
+        Start the opt-in sampling profiler over all threads; returns it
+
+        Call stop() on the profiler, then report() or collapsed() for results.
+        """
+        return SamplingProfiler(interval=interval).start()
+
+    def collection_revisions(self):
+        """
+        Current ArangoDB revision of every loaded collection
+        """
+        return {name: self.db.collection(name).revision() for name in COLLECTION_SPECS}
+
+    def save_graph_snapshot(self, path):
+        """
+        Write the loaded graph to a versioned binary snapshot directory
+        """
+        graph = self.graph if isinstance(self.graph, CSRGraph) else CSRGraph.from_networkx(self.graph)
+        return save_snapshot(graph, path, revisions=self.collection_revisions())
+
+    def open_graph_snapshot(self, path, validate=True):
+        """
+        Memory-map a graph snapshot; rejected if collection revisions changed
+
+        Indexes are rebuilt lazily on first analyzer use.
+        """
+        try:
+            expected = self.collection_revisions() if validate else None
+            self.graph = load_snapshot(path, document_loader=self.fetch_document,
+                                       expected_revisions=expected)
+        except SnapshotError as e:
+            print(f"Snapshot not used: {str(e)}")
+            return False
+        
+        self.index = None
+        self._analyzer = None
+        self._graph_replaced()
+        print(f"Opened graph snapshot with {self.graph.number_of_nodes()} nodes")
+        return True
+
+    def cohort(self):
+        """
+        Columnar CohortEngine over the loaded patients
+
+        Graphs opened from a snapshot carry no patient attributes; they are
+        read from ArangoDB with one projected pass the first time.
+        """
+        index = self.analyzer.index
+        if not index.patient_attributes and index.nodes_of_type('patient'):
+            spec = COLLECTION_SPECS['patients']
+            docs = list(self._stream_collection('patients', spec['fields'], DEFAULT_BATCH_SIZE))
+            with self.lock.write():
+                for doc in docs:
+                    node = document_id('patients', doc['_key'])
+                    if node in index.node_types:
+                        index.add_node(node, spec['type'], attributes=doc)
+        return self.analyzer.cohort
+
+    def resolve_node(self, key):
+        """
+        Node key (ArangoDB _id) a document key such as "P1" refers to
+
+        Keys already of the form collection/key pass through; a bare key
+        resolves to the one collection that holds it. Returns None when no
+        collection, or more than one, holds the key.
+        """
+        if not isinstance(key, str):
+            return None
+        if '/' in key:
+            return key if self.graph.has_node(key) else None
+        found = [document_id(name, key) for name in COLLECTION_SPECS
+                 if self.graph.has_node(document_id(name, key))]
+        return found[0] if len(found) == 1 else None
+
+    def fetch_document(self, collection, key):
+        """
+        Fetch a single full document from ArangoDB
+        """
+        return self.db.collection(collection).get(key)
                               
     def setup_agent_tools(self):
         """
         Initialize LangChain tools for the agent
         """
+        from langchain.agents import Tool
+
         tools = [
             Tool(
                 name="AQL_Query",
-                func=self.execute_aql_query,
+                func=self._traced_tool("AQL_Query", self.execute_aql_query),
                 description="Execute AQL queries on the medical graph"
             ),
             Tool(
                 name="Graph_Analytics",
-                func=self.run_graph_analytics,
+                func=self._traced_tool("Graph_Analytics", self.run_graph_analytics),
                 description="Run advanced graph analytics using GPU acceleration"
+            ),
+            Tool(
+                name="Graph_Context",
+                func=self._traced_tool("Graph_Context", self.retrieve_context),
+                description="Describe the graph neighbourhood of patients, encounters or conditions "
+                            "named in the input"
             )
         ]
         return tools
+
+    def _traced_tool(self, name, func):
+        def traced(*args, **kwargs):
+            with metrics.span('agent.tool', tool=name):
+                # The agent sees a bounded summary, never a full result repr
+                return retrieval.compact_result(func(*args, **kwargs), self.token_budget)
+        return traced
         
-    def execute_aql_query(self, query_intent):
+    def execute_aql_query(self, query_intent, bind_vars=None):
         """
         Execute AQL query based on natural language intent
+
+        bind_vars fill the template's parameters (e.g. patient_id for
+        patient_history).
         """
         try:
-            # Map common query intents to AQL templates
-            aql_templates = {
-                "patient_history": """
-                    FOR patient IN patients
-                    FILTER patient._key == @patient_id
-                    LET encounters = (
-                        FOR e IN OUTBOUND patient._id patient_encounters
-                        SORT e.date DESC
-                        RETURN e
-                    )
-                    RETURN { patient, encounters }
-                """,
-                "condition_frequency": """
-                    FOR c IN conditions
-                    COLLECT condition = c.description WITH COUNT INTO freq
-                    SORT freq DESC
-                    LIMIT 10
-                    RETURN { condition, frequency: freq }
-                """
-            }
-            
             # Execute query and return results
-            if query_intent in aql_templates:
-                cursor = self.db.aql.execute(aql_templates[query_intent])
-                return list(cursor)
+            if query_intent in AQL_TEMPLATES:
+                with metrics.span('aql', intent=query_intent):
+                    cursor = self.db.aql.execute(AQL_TEMPLATES[query_intent], bind_vars=bind_vars or {})
+                    rows = list(cursor)
+                metrics.increment('rows_fetched', len(rows), source='aql', intent=query_intent)
+                return rows
             else:
                 return {"error": "Unsupported query intent"}
                 
         except Exception as e:
             return {"error": str(e)}
+
+    @property
+    def query_pool(self):
+        """
+        AsyncQueryPool shared by this navigator's async queries
+        """
+        if self._query_pool is None:
+            from src.backend.query_pool import AsyncQueryPool
+
+            if self._database is None or self._database is _default_db:
+                self._query_pool = AsyncQueryPool(connect_database)
+            else:
+                # An injected handle (e.g. the in-memory stand-in) is shared
+                database = self.db
+                self._query_pool = AsyncQueryPool(lambda: database)
+        return self._query_pool
+
+    async def stream_aql_query(self, query_intent, bind_vars=None, timeout=None):
+        """
+        Async generator over the results of an intent's AQL template
+        """
+        if query_intent not in AQL_TEMPLATES:
+            raise ValueError(f"Unsupported query intent: {query_intent}")
+        async for doc in self.query_pool.stream(AQL_TEMPLATES[query_intent], bind_vars, timeout):
+            yield doc
+
+    async def aexecute_aql_query(self, query_intent, bind_vars=None, timeout=None):
+        """
+        Async execute_aql_query through the pooled, time-limited query layer
+        """
+        if query_intent not in AQL_TEMPLATES:
+            return {"error": "Unsupported query intent"}
+        try:
+            return [doc async for doc in self.stream_aql_query(query_intent, bind_vars, timeout)]
+        except Exception as e:
+            return {"error": str(e)}
             
+    @reading
     def run_graph_analytics(self, analysis_type, params=None):
         """
-        Run GPU-accelerated graph analytics using cuGraph
+        Run graph analytics on cuGraph when available, else on the CPU backend
+
+        params are passed to the backend method (e.g. alpha for pagerank,
+        k or epsilon for centrality, resolution for community_detection).
+        shortest_path, shortest_paths and distance are answered by the
+        PathService (source/target or pairs, optional node_types).
+        Results are memoized per analysis type, params and graph version.
+        """
+        key = AnalyticsCache.make_key(analysis_type, params, self.graph_version)
+        with metrics.span('analytics', type=analysis_type):
+            result = self.analytics_cache.get(key)
+            metrics.increment('analytics_requests', type=analysis_type, cached=result is not None)
+            if result is None:
+                result = self._compute_graph_analytics(analysis_type, params)
+                if not (isinstance(result, dict) and "error" in result):
+                    self.analytics_cache.put(key, result)
+        return result
+
+    def analytics_backend(self):
+        """
+        Analytics backend for the current graph (cuGraph, SciPy or NetworkX)
+
+        Built once per graph version, so the cuGraph device graph and the
+        sparse adjacency are not rebuilt on every call.
+        """
+        if self._backend is None or self._backend_version != self.graph_version:
+            self._backend = select_backend(self.graph)
+            self._backend_version = self.graph_version
+            print(f"Using {self._backend.name} analytics backend")
+        return self._backend
+
+    def path_service(self):
+        """
+        Shortest-path service for the current graph, built once per graph version
         """
+        if self._paths is None or self._paths_version != self.graph_version:
+            self._paths = PathService(self.graph)
+            self._paths_version = self.graph_version
+        return self._paths
+
+    def _node_params(self, params):
+        """
+        params with source/target/pairs document keys resolved to node keys
+        """
+        params = dict(params or {})
+        for name in ('source', 'target'):
+            if name in params:
+                params[name] = self.resolve_node(params[name]) or params[name]
+        if params.get('pairs') is not None:
+            params['pairs'] = [tuple(self.resolve_node(key) or key for key in pair) for pair in params['pairs']]
+        return params
+
+    def _compute_graph_analytics(self, analysis_type, params=None):
         try:
-            import cugraph
-            import cudf
-            
-            # Convert NetworkX graph to cuGraph
-            G_cu = cugraph.from_networkx(self.graph)
-            
-            analytics_functions = {
-                "pagerank": lambda: cugraph.pagerank(G_cu),
-                "community_detection": lambda: cugraph.louvain(G_cu),
-                "centrality": lambda: cugraph.betweenness_centrality(G_cu),
-                "shortest_path": lambda: cugraph.shortest_path(
-                    G_cu, 
-                    source=params.get('source'),
-                    target=params.get('target')
-                )
-            }
+            if analysis_type in ("shortest_path", "shortest_paths", "distance"):
+                params = self._node_params(params)
+                paths = self.path_service()
+                analytics_functions = {
+                    "shortest_path": paths.shortest_path,
+                    "shortest_paths": paths.shortest_paths,
+                    "distance": paths.distance
+                }
+            else:
+                backend = self.analytics_backend()
+                analytics_functions = {
+                    "pagerank": backend.pagerank,
+                    "community_detection": backend.community_detection,
+                    "centrality": backend.centrality
+                }
             
             if analysis_type in analytics_functions:
-                result = analytics_functions[analysis_type]()
-                # Convert result back to CPU for processing
-                return result.to_pandas()
+                return analytics_functions[analysis_type](**(params or {}))
             else:
                 return {"error": "Unsupported analysis type"}
                 
-        except ImportError:
-            print("GPU acceleration not available, falling back to CPU...")
-            # Implement CPU fallback using NetworkX
-            analytics_functions_cpu = {
-                "pagerank": lambda: nx.pagerank(self.graph),
-                "community_detection": lambda: nx.community.louvain_communities(self.graph),
-                "centrality": lambda: nx.betweenness_centrality(self.graph),
-                "shortest_path": lambda: nx.shortest_path(
-                    self.graph,
-                    source=params.get('source'),
-                    target=params.get('target')
-                )
-            }
-            
-            if analysis_type in analytics_functions_cpu:
-                return analytics_functions_cpu[analysis_type]()
+        except Exception as e:
+            return {"error": str(e)}
+
+    @reading
+    def visualize(self, kind, params=None, page=0, page_size=None, freq='month',
+                  max_points=None, max_communities=None, condition=None):
+        """
+        Visualization-ready summary for MedGraphViz, bounded in size
+
+        kind is an analysis type or 'encounters':
+        - pagerank / centrality: one page of top-ranked nodes ('distribution')
+        - community_detection: a community supernode graph ('graph')
+        - encounters: encounter counts (optionally for one condition) bucketed
+          by day, week or month and LTTB-downsampled ('timeSeries')
+        Analytics results come from run_graph_analytics, so they are cached.
+        """
+        from src.backend import visualization as viz
+
+        if kind in ('pagerank', 'centrality'):
+            scores = self.run_graph_analytics(kind, params)
+            if isinstance(scores, dict) and 'error' in scores:
+                return scores
+            graph = self.path_service().csr
+            summary = viz.ranked_page(scores, page, page_size or viz.DEFAULT_TOP_K, graph.node_type)
+            return {'vizType': 'distribution', 'analysis': kind, **summary}
+        if kind == 'community_detection':
+            communities = self.run_graph_analytics(kind, params)
+            if isinstance(communities, dict) and 'error' in communities:
+                return communities
+            summary = viz.community_supernodes(self.path_service().csr, communities,
+                                               max_communities or viz.DEFAULT_MAX_COMMUNITIES)
+            return {'vizType': 'graph', 'analysis': kind, **summary}
+        if kind == 'encounters':
+            index = self.analyzer.index
+            if condition is None:
+                days = list(index.encounter_days.values())
             else:
-                return {"error": "Unsupported analysis type"}
+                days = [index.encounter_days[e] for c in index.conditions_with_description(condition)
+                        for e in index.condition_encounters.get(c, ()) if e in index.encounter_days]
+            buckets, counts = viz.time_series(days, freq=freq, agg='count')
+            return {'vizType': 'timeSeries', 'analysis': kind, 'freq': freq, 'total': len(days),
+                    'points': viz.series_points(buckets, counts, max_points or viz.DEFAULT_MAX_POINTS)}
+        return {"error": "Unsupported visualization"}
+
+    @reading
+    def retrieve_context(self, query, hops=retrieval.DEFAULT_HOPS, node_types=None,
+                         max_nodes=retrieval.DEFAULT_MAX_NODES, token_budget=None):
+        """
+        Compact graph context for the entities a question mentions
+
+        Each entity (node key or condition name) contributes its bounded
+        k-hop ego subgraph, optionally restricted to node_types, read from
+        the GraphIndex that incremental sync keeps current (no per-version
+        rebuild); subgraphs are cached per entity and graph version. The union is listed hop by
+        hop, ranked by personalized PageRank from the entities, within
+        token_budget. Returns '' when the question names no known entity.
+        """
+        index = self.analyzer.index
+        entities = retrieval.query_entities(query, self.resolve_node, index.conditions_by_description.keys())
+        if not entities:
+            return ''
+        with metrics.span('retrieval', entities=len(entities)):
+            subgraphs = []
+            for entity in entities:
+                key = AnalyticsCache.make_key('ego', {'entity': entity, 'hops': hops, 'max_nodes': max_nodes,
+                                                      'node_types': node_types}, self.graph_version)
+                subgraph = self.retrieval_cache.get(key)
+                if subgraph is None:
+                    subgraph = retrieval.ego_subgraph(index, retrieval.entity_seeds(index, entity),
+                                                      hops, max_nodes, node_types)
+                    self.retrieval_cache.put(key, subgraph)
+                subgraphs.append(subgraph)
+            keys, distances, restart = retrieval.merge_subgraphs(subgraphs)
+            return retrieval.serialize_subgraph(index, keys, distances, restart, token_budget or self.token_budget)
 
     def setup_agent(self):
         """
         Initialize the LangChain agent with tools and prompts
         """
+        # LangChain is imported here so importing this module stays fast
+        from langchain.agents import AgentExecutor, ZeroShotAgent
+        from langchain.chains import LLMChain
+
         # Define the tools available to the agent
         tools = self.setup_agent_tools()
         
@@ -221,7 +667,11 @@ class MedGraphNavigator:
         )
         
         # Initialize the LLM
-        llm = ChatOpenAI(temperature=0)
+        if self.llm is None:
+            from langchain.chat_models import ChatOpenAI
+
+            self.llm = ChatOpenAI(temperature=0)
+        llm = self.llm
         
         # Create the agent
         llm_chain = LLMChain(llm=llm, prompt=prompt)
@@ -240,28 +690,81 @@ class MedGraphNavigator:
     def process_query(self, query):
         """
         Process natural language query and return appropriate response
+
+        Queries the IntentRouter recognises run their tool directly and return
+        its result; everything else goes to the LangChain agent together with
+        a token-bounded graph context for the entities it mentions
+        (retrieve_context). Answers are
+        served from response_cache when a near-identical question was asked
+        against the same graph version.
         """
+        response = self.response_cache.get(query, self.graph_version)
+        metrics.increment('response_cache', result='miss' if response is None else 'hit')
+        if response is None:
+            response = self._answer_query(query)
+            failed = (isinstance(response, str) and response.startswith("Error processing query")) or \
+                (isinstance(response, dict) and "error" in response)
+            if not failed:
+                self.response_cache.put(query, response, self.graph_version)
+        return response
+
+    def _answer_query(self, query):
         try:
+            routed = self.router.route(query)
+            if routed is not None:
+                with metrics.span('process_query.routed', intent=routed[0]):
+                    return self.run_intent(*routed)
+            
             # Initialize agent if not already done
             if not hasattr(self, 'agent_executor'):
-                self.agent_executor = self.setup_agent()
+                with self._agent_lock:
+                    if not hasattr(self, 'agent_executor'):
+                        self.agent_executor = self.setup_agent()
             
-            # Execute the query
-            response = self.agent_executor.run(query)
+            # Execute the query with its graph context, timing LLM calls and tool steps
+            with metrics.span('process_query'):
+                context = self.retrieve_context(query)
+                agent_input = f"{query}\n\n{context}" if context else query
+                response = self.agent_executor.run(agent_input, callbacks=[langchain_callback_handler()])
             return response
             
         except Exception as e:
             return f"Error processing query: {str(e)}"
 
-# Initialize the navigator
-navigator = MedGraphNavigator()
+    def run_intent(self, intent, params):
+        """
+        Run the tool behind a routed intent with its extracted parameters
+        """
+        if intent in AQL_TEMPLATES:
+            return self.execute_aql_query(intent, params or None)
+        if intent == 'visualize':
+            return self.visualize(**params)
+        if intent == 'cohort_condition_frequency':
+            cohort = self.cohort()
+            counts = cohort.feature_counts('condition', cohort.mask(**params), top=10)
+            return [{'condition': c, 'frequency': n} for c, n in counts.items()]
+        if intent == 'treatment_patterns':
+            return self.analyzer.analyze_treatment_patterns(params['condition'])
+        if intent == 'risk_factors':
+            return self.analyzer.predict_risk_factors(params['condition'])
+        if intent == 'similar_patients':
+            return self.analyzer.find_similar_patients(**params)
+        return self.run_graph_analytics(intent, params or None)
 
 # Example usage
 if __name__ == "__main__":
-    # Load the data
-    success = navigator.load_synthea_data()
+    if os.environ.get('MEDGRAPH_METRICS_PORT'):
+        metrics.serve(int(os.environ['MEDGRAPH_METRICS_PORT']))
+    profiler = get_navigator().start_profiling() if os.environ.get('MEDGRAPH_PROFILE') == '1' else None
+
+    # Load the data, reusing a graph snapshot when one is configured
+    navigator = get_navigator()
+    success = navigator.load_synthea_data(snapshot_path=os.environ.get('MEDGRAPH_SNAPSHOT_DIR'))
     if success:
         # Process a sample query
         query = "What are the most common conditions diagnosed in patients over 60?"
         result = navigator.process_query(query)
         print(result)
+    if profiler is not None:
+        for frame, share in profiler.stop().report():
+            print(f"{share:6.1%} {frame}")
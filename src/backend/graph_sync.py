@@ -0,0 +1,176 @@
+import threading
+import time
+
+import networkx as nx
+
+from src.backend.csr_graph import document_id
+from src.backend.graph_navigator import COLLECTION_SPECS
+from src.backend.temporal import parse_day
+
+# WAL operation types (see ArangoDB replication docs)
+DOCUMENT_UPSERT = 2300
+DOCUMENT_REMOVE = 2302
+
+
+class GraphSyncer:
+    """
+    Incrementally apply ArangoDB changes to a navigator's in-memory graph
+
+    Tails the write-ahead log from the last applied tick and applies inserted,
+    updated and removed documents of the loaded collections together with
+    their edges. The GraphIndex and the analyzer's derived structures are
+    updated in the same step, under the navigator's write lock. Runs on demand via sync() or on a background
+    schedule via start().
+    """
+    def __init__(self, navigator, start_tick=None, chunk_size=None):
+        if not isinstance(navigator.graph, nx.DiGraph):
+            raise ValueError("Incremental sync needs the NetworkX graph; "
+                             "load without compact or snapshot mode")
+        self.navigator = navigator
+        self.chunk_size = chunk_size
+        self.lock = threading.RLock()
+        if start_tick is None:
+            start_tick = navigator.load_tick
+        if start_tick is None:
+            start_tick = navigator.db.wal.last_tick()['tick']
+        self.last_tick = str(start_tick)
+        self.collection_ticks = {name: None for name in COLLECTION_SPECS}
+        self.applied = {name: {'inserted': 0, 'updated': 0, 'removed': 0}
+                        for name in COLLECTION_SPECS}
+        self.last_sync_time = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._collection_ids = None
+
+    def _collection_name(self, entry):
+        """
+        Collection name of a WAL entry (by name, or by globally unique id)
+        """
+        if 'cname' in entry:
+            return entry['cname']
+        if self._collection_ids is None:
+            self._collection_ids = {}
+            for name in COLLECTION_SPECS:
+                properties = self.navigator.db.collection(name).properties()
+                self._collection_ids[properties.get('global_id')] = name
+        return self._collection_ids.get(entry.get('cuid'))
+
+    def sync(self):
+        """
+        Apply all pending changes; returns the number of changes applied
+        """
+        total = 0
+        while True:
+            result = self.navigator.db.wal.tail(
+                lower=self.last_tick, chunk_size=self.chunk_size, deserialize=True)
+            entries = result['content']
+            # Readers hold navigator.lock, so they never see a half-applied batch
+            with self.lock, self.navigator.lock.write():
+                affected = set()
+                for entry in entries:
+                    name = self._collection_name(entry)
+                    if name in COLLECTION_SPECS and entry.get('type') in (DOCUMENT_UPSERT, DOCUMENT_REMOVE):
+                        affected |= self._apply(name, entry)
+                        self.collection_ticks[name] = entry['tick']
+                        total += 1
+                if entries:
+                    self.last_tick = result['last_included']
+                if affected:
+                    self.navigator.changed(affected)
+            if not result.get('check_more'):
+                break
+
+        self.last_sync_time = time.time()
+        return total
+
+    def _apply(self, name, entry):
+        """
+        Apply one document change; returns the affected patient ids
+        """
+        graph = self.navigator.graph
+        index = self.navigator.index
+        spec = COLLECTION_SPECS[name]
+        doc = entry['data']
+        key = document_id(name, doc['_key'])
+
+        # Patients touched before the change (e.g. a re-parented encounter)
+        affected = set(index.patients_of(key)) if key in index.node_types else set()
+
+        if entry['type'] == DOCUMENT_REMOVE:
+            if graph.has_node(key):
+                graph.remove_node(key)
+                index.remove_node(key)
+                self.applied[name]['removed'] += 1
+            return affected
+
+        data = {f: doc[f] for f in spec['fields'] if f in doc}
+        existed = graph.has_node(key) and 'type' in graph.nodes[key]
+        if existed and spec['edge'] is not None:
+            # Drop the edge owned by this document; it is re-added below
+            for source in list(graph.predecessors(key)):
+                if graph.edges[source, key].get('type') == spec['edge'][1]:
+                    graph.remove_edge(source, key)
+                    index.remove_edge(source, key, spec['edge'][1])
+        graph.add_node(key, type=spec['type'], data=data)
+        index.add_node(key, spec['type'], data.get('description'), parse_day(data.get('date')),
+                       attributes=data)
+
+        if spec['edge'] is not None and data.get(spec['edge'][0]):
+            source = document_id(spec['edge'][2], data[spec['edge'][0]])
+            graph.add_edge(source, key, type=spec['edge'][1], date=data.get('date', ''))
+            index.add_edge(source, key, spec['edge'][1])
+        # Documents of this node's own edges may have arrived first
+        for source, target, edge_type in graph.in_edges(key, data='type'):
+            index.add_edge(source, target, edge_type)
+        for source, target, edge_type in graph.out_edges(key, data='type'):
+            index.add_edge(source, target, edge_type)
+
+        self.applied[name]['updated' if existed else 'inserted'] += 1
+        return affected | index.patients_of(key)
+
+    def lag(self):
+        """
+        Replication lag: WAL ticks not yet applied and seconds since last sync
+        """
+        server_tick = int(self.navigator.db.wal.last_tick()['tick'])
+        return {
+            'ticks_behind': max(server_tick - int(self.last_tick), 0),
+            'seconds_since_sync': (time.time() - self.last_sync_time
+                                   if self.last_sync_time is not None else None)
+        }
+
+    def stats(self):
+        return {
+            'last_tick': self.last_tick,
+            'collection_ticks': dict(self.collection_ticks),
+            'applied': {name: dict(counts) for name, counts in self.applied.items()},
+            'lag': self.lag(),
+            'last_error': self.last_error
+        }
+
+    def start(self, interval=5.0):
+        """
+        Sync every interval seconds on a daemon thread
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self, interval):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Graph sync failed: {str(e)}")
+            self._stop.wait(interval)
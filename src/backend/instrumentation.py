@@ -0,0 +1,305 @@
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Upper bounds (seconds) of the span duration histogram buckets
+SPAN_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+logger = logging.getLogger('medgraph.metrics')
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('metrics', 'key', 'start')
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics._record(self.key, time.perf_counter() - self.start, exc_type is not None)
+        return False
+
+
+class Metrics:
+    """
+    In-process span timings and counters with a Prometheus text exporter
+
+    A span costs two perf_counter calls and a locked dict update, so it is
+    meant to stay on in production; disabled metrics hand out a shared no-op
+    span. With log_spans, every span is also emitted as one JSON line on the
+    ``medgraph.metrics`` logger (the structured log sink).
+    """
+    def __init__(self, enabled=True, log_spans=False):
+        self.enabled = enabled
+        self.log_spans = log_spans
+        self._lock = threading.Lock()
+        # (name, labels) -> [count, sum, errors, per-bucket counts]
+        self._spans = {}
+        self._counters = {}
+
+    def span(self, name, **labels):
+        """
+        Context manager timing the enclosed block
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, (name, tuple(sorted(labels.items()))))
+
+    def timed(self, name):
+        """
+        Decorator wrapping every call of a function in a span
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def increment(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, failed=False, **labels):
+        """
+        Record a duration measured elsewhere (e.g. across async yields)
+        """
+        if self.enabled:
+            self._record((name, tuple(sorted(labels.items()))), seconds, failed)
+
+    def _record(self, key, seconds, failed):
+        with self._lock:
+            entry = self._spans.get(key)
+            if entry is None:
+                entry = self._spans[key] = [0, 0.0, 0, [0] * len(SPAN_BUCKETS)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += failed
+            for i, bound in enumerate(SPAN_BUCKETS):
+                if seconds <= bound:
+                    entry[3][i] += 1
+                    break
+        if self.log_spans:
+            logger.info(json.dumps({'span': key[0], **dict(key[1]),
+                                    'seconds': round(seconds, 6), 'error': failed}))
+
+    def snapshot(self):
+        """
+        Plain-dict view of all spans and counters
+        """
+        with self._lock:
+            spans = [{'name': name, 'labels': dict(labels), 'count': e[0],
+                      'seconds': e[1], 'errors': e[2]}
+                     for (name, labels), e in self._spans.items()]
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in self._counters.items()]
+        return {'spans': spans, 'counters': counters}
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def prometheus_text(self):
+        """
+        All metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            spans = sorted((key, [e[0], e[1], e[2], list(e[3])]) for key, e in self._spans.items())
+            counters = sorted(self._counters.items())
+
+        # Each metric family is written as one group after its TYPE line
+        lines = ['# TYPE medgraph_span_seconds histogram']
+        for (name, labels), (count, total, _, buckets) in spans:
+            span_labels = (('span', name),) + labels
+            cumulative = 0
+            for bound, n in zip(SPAN_BUCKETS, buckets):
+                cumulative += n
+                lines.append(f'medgraph_span_seconds_bucket{_labels(span_labels + (("le", bound),))} {cumulative}')
+            lines.append(f'medgraph_span_seconds_bucket{_labels(span_labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'medgraph_span_seconds_sum{_labels(span_labels)} {total}')
+            lines.append(f'medgraph_span_seconds_count{_labels(span_labels)} {count}')
+        lines.append('# TYPE medgraph_span_errors_total counter')
+        for (name, labels), (_, _, errors, _) in spans:
+            lines.append(f'medgraph_span_errors_total{_labels((("span", name),) + labels)} {errors}')
+        previous = None
+        for (name, labels), value in counters:
+            if name != previous:
+                lines.append(f'# TYPE medgraph_{name}_total counter')
+                previous = name
+            lines.append(f'medgraph_{name}_total{_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port=9100, host='0.0.0.0'):
+        """
+        Serve /metrics for Prometheus scraping from a daemon thread
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (k + '="' + str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for k, v in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+class SamplingProfiler:
+    """
+    Opt-in statistical profiler sampling thread stacks at a fixed interval
+
+    Much cheaper than cProfile for long runs: the sampled threads are not
+    traced, a background thread periodically records their current stacks.
+    report() gives the hottest frames; collapsed() gives flame-graph input.
+    """
+    def __init__(self, interval=0.005, thread_ids=None, max_depth=64):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='medgraph-profiler')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def report(self, top=20):
+        """
+        (frame, share of samples) for the frames most often on the stack
+        """
+        inclusive = Counter()
+        total = sum(self.stacks.values())
+        for stack, count in self.stacks.items():
+            for frame in set(stack):
+                inclusive[frame] += count
+        return [(frame, count / total) for frame, count in inclusive.most_common(top)] if total else []
+
+    def collapsed(self):
+        """
+        Stacks in collapsed format ("a;b;c count"), e.g. for flamegraph.pl
+        """
+        return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common())
+
+
+# Process-wide registry; MEDGRAPH_METRICS=0 turns instrumentation off and
+# MEDGRAPH_METRICS_LOG=1 also logs every span
+metrics = Metrics(enabled=os.environ.get('MEDGRAPH_METRICS', '1') != '0',
+                  log_spans=os.environ.get('MEDGRAPH_METRICS_LOG') == '1')
+
+
+def langchain_callback_handler(registry=None):
+    """
+    LangChain callback handler timing LLM calls and agent tool steps
+    """
+    from langchain.callbacks.base import BaseCallbackHandler
+
+    registry = registry or metrics
+
+    class MetricsCallbackHandler(BaseCallbackHandler):
+        def __init__(self):
+            self._started = {}
+
+        def _start(self, run_id):
+            self._started[run_id] = time.perf_counter()
+
+        def _end(self, run_id, name, failed=False, **labels):
+            start = self._started.pop(run_id, None)
+            if start is not None:
+                registry.observe(name, time.perf_counter() - start, failed, **labels)
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._start(run_id)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            self._end(run_id, 'agent.llm')
+            usage = (getattr(response, 'llm_output', None) or {}).get('token_usage') or {}
+            if usage.get('total_tokens'):
+                registry.increment('llm_tokens', usage['total_tokens'])
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._end(run_id, 'agent.llm', failed=True)
+
+        def on_agent_action(self, action, *, run_id, **kwargs):
+            registry.increment('agent_steps', tool=action.tool)
+
+    return MetricsCallbackHandler()
@@ -0,0 +1,170 @@
+import re
+
+# Phrases that add constraints no fast-path tool understands (age bands,
+# dates, sex, comparisons); such queries are left to the agent
+UNSUPPORTED_QUALIFIERS = re.compile(
+    r"\b(over|under|older|younger|above|below|between\s+\d+|aged?|since|before|after|during|"
+    r"in \d{4}|male|female|men|women|compared?|versus|vs\.?|except|without|excluding|why|explain)\b",
+    re.IGNORECASE)
+
+PATIENT_ID = re.compile(r"\bpatient\s+(?:id\s+)?([A-Za-z]*\d+)\b|\b(P\d+)\b", re.IGNORECASE)
+NODE_ID = r"([A-Za-z]+\d+(?:_\d+)?)"
+TOP_K = re.compile(r"\b(?:top|first)\s+(\d+)\b|\b(\d+)\s+(?:most\s+)?(?:similar|patients)\b", re.IGNORECASE)
+
+# Cohort filters the columnar engine applies to condition frequencies, as
+# (pattern, params from match); matched text is removed before the
+# unsupported-qualifier check
+COHORT_FILTERS = [
+    (re.compile(r"\b(?:aged?\s+|between\s+)(\d+)\s*(?:-|to|and)\s*(\d+)\b", re.IGNORECASE),
+     lambda m: {'min_age': int(m.group(1)), 'max_age': int(m.group(2))}),
+    (re.compile(r"\b(?:over|older\s+than|above)\s+(\d+)\b", re.IGNORECASE),
+     lambda m: {'min_age': int(m.group(1)) + 1}),
+    (re.compile(r"\b(?:under|younger\s+than|below)\s+(\d+)\b", re.IGNORECASE),
+     lambda m: {'max_age': int(m.group(1)) - 1}),
+    (re.compile(r"\b(?:female|women)\b", re.IGNORECASE), lambda m: {'gender': 'F'}),
+    (re.compile(r"\b(?:male|men)\b", re.IGNORECASE), lambda m: {'gender': 'M'})
+]
+
+# Intent -> trigger patterns, tried in order. An intent whose parameters
+# cannot all be extracted does not match.
+INTENT_PATTERNS = {
+    'patient_history': [
+        r"\b(medical\s+)?(history|record|records|encounters|visits|timeline)\b.*\bpatient\b",
+        r"\bpatient\b.*\b(history|record|records|encounters|visits|timeline)\b"
+    ],
+    'condition_frequency': [
+        r"\b(most\s+(common|frequent|prevalent)|top|frequency\s+of|frequencies\s+of|how\s+common\s+are)\b"
+        r".*\b(conditions|diagnoses|diseases)\b",
+        r"\bcondition\s+frequenc(y|ies)\b"
+    ],
+    'treatment_patterns': [
+        r"\btreatment\s+patterns?\b",
+        r"\bhow\s+(is|are)\b.*\btreated\b",
+        r"\b(medications?|drugs?|treatments?)\b.*\b(for|prescribed\s+for|used\s+for)\b"
+    ],
+    'risk_factors': [
+        r"\brisk\s+factors?\b",
+        r"\b(predictors?|associated\s+conditions)\b.*\b(of|for)\b"
+    ],
+    'similar_patients': [
+        r"\b(similar|comparable|like)\b.*\bpatients?\b",
+        r"\bpatients?\b.*\b(similar|comparable)\s+to\b"
+    ],
+    'shortest_path': [
+        r"\b(shortest\s+)?path\s+(from|between)\b"
+    ],
+    'pagerank': [r"\bpage\s?rank\b", r"\bmost\s+(important|influential|central)\s+nodes\b"],
+    'community_detection': [r"\bcommunit(y|ies)\b", r"\bclusters?\b"],
+    'centrality': [r"\bbetweenness\b", r"\bcentrality\b"]
+}
+
+_COMPILED = {intent: [re.compile(p, re.IGNORECASE) for p in patterns]
+             for intent, patterns in INTENT_PATTERNS.items()}
+
+
+class IntentRouter:
+    """
+    Rule-based router mapping common questions straight onto a tool
+
+    route() returns (intent, params) when exactly one intent matches and all
+    of its parameters can be extracted: patient keys by pattern, condition
+    names against the graph's condition vocabulary (longest match wins), and
+    node pairs for paths. Condition frequency questions restricted by age or
+    sex become cohort_condition_frequency with the filters as params.
+    Anything ambiguous, underspecified or carrying constraints the tools
+    cannot apply returns None and goes to the agent.
+    ``conditions`` is a callable returning the known condition descriptions.
+    """
+    def __init__(self, conditions=None):
+        self.conditions = conditions or (lambda: ())
+        self._vocabulary = None
+        self._vocabulary_source = None
+
+    def _condition_pattern(self):
+        names = list(self.conditions())
+        if self._vocabulary is None or self._vocabulary_source != names:
+            # Longest names first so "Type 2 Diabetes" wins over "Diabetes"
+            ordered = sorted(names, key=len, reverse=True)
+            self._vocabulary = (re.compile(r"\b(" + "|".join(re.escape(n) for n in ordered) + r")\b",
+                                           re.IGNORECASE), {n.lower(): n for n in ordered}) if ordered else None
+            self._vocabulary_source = names
+        return self._vocabulary
+
+    def _condition(self, query):
+        vocabulary = self._condition_pattern()
+        if vocabulary is None:
+            return None
+        pattern, canonical = vocabulary
+        found = {canonical[m.lower()] for m in pattern.findall(query)}
+        return found.pop() if len(found) == 1 else None
+
+    def condition_mentions(self, query):
+        """
+        Known condition names mentioned in a query, lowercased
+        """
+        vocabulary = self._condition_pattern()
+        if vocabulary is None:
+            return frozenset()
+        return frozenset(m.lower() for m in vocabulary[0].findall(query))
+
+    def _params(self, intent, query):
+        """
+        Parameters for an intent, or None when a required one is missing
+        """
+        if intent == 'patient_history':
+            patient_id = _patient_id(query)
+            return {'patient_id': patient_id} if patient_id else None
+        if intent == 'condition_frequency':
+            return {}
+        if intent in ('treatment_patterns', 'risk_factors'):
+            condition = self._condition(query)
+            return {'condition': condition} if condition else None
+        if intent == 'similar_patients':
+            patient_id = _patient_id(query)
+            if not patient_id:
+                return None
+            match = TOP_K.search(query)
+            params = {'patient_id': patient_id}
+            if match:
+                params['num_similar'] = int(match.group(1) or match.group(2))
+            return params
+        if intent == 'shortest_path':
+            match = re.search(r"\b(?:from|between)\s+(?:patient\s+|node\s+)?" + NODE_ID +
+                              r"\s+(?:to|and)\s+(?:patient\s+|node\s+)?" + NODE_ID, query, re.IGNORECASE)
+            return {'source': match.group(1), 'target': match.group(2)} if match else None
+        return {}
+
+    def route(self, query):
+        """
+        (intent, params) for a recognised query, else None
+        """
+        filters = {}
+        for pattern, params in COHORT_FILTERS:
+            match = pattern.search(query)
+            if match:
+                filters.update(params(match))
+                query = query[:match.start()] + ' ' + query[match.end():]
+        if UNSUPPORTED_QUALIFIERS.search(query):
+            return None
+        matched = [intent for intent, patterns in _COMPILED.items()
+                   if any(p.search(query) for p in patterns)]
+        if filters:
+            # Only condition frequencies can be filtered to a cohort
+            return ('cohort_condition_frequency', filters) if matched == ['condition_frequency'] else None
+        if len(matched) > 1:
+            # More specific intents win over the generic frequency question
+            matched = [intent for intent in matched if intent != 'condition_frequency'] or matched
+        candidates = []
+        for intent in matched:
+            params = self._params(intent, query)
+            if params is not None:
+                candidates.append((intent, params))
+        return candidates[0] if len(candidates) == 1 else None
+
+
+def _patient_id(query):
+    match = PATIENT_ID.search(query)
+    if not match:
+        return None
+    key = match.group(1) or match.group(2)
+    return key.upper() if key[0].isalpha() else f"P{key}"
@@ -0,0 +1,150 @@
+import hashlib
+from collections import defaultdict
+
+import numpy as np
+
+# Universal hashing modulo the Mersenne prime 2^31 - 1 keeps a * x + b in uint64
+_PRIME = (1 << 31) - 1
+
+
+class MinHashLSHIndex:
+    """
+    Approximate nearest-neighbour index over patient condition/medication sets
+
+    Each patient's combined feature set is summarised by a MinHash signature of
+    num_perm values, split into bands of num_perm // bands rows. Patients that
+    share any band bucket become candidates, which are then re-ranked with the
+    exact mean-of-Jaccards score used by MedicalAnalyzer. More bands (fewer rows
+    per band) raise recall and candidate counts; max_candidates caps the re-rank.
+    """
+    def __init__(self, num_perm=128, bands=32, max_candidates=5000, seed=42):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.max_candidates = max_candidates
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+        self._token_hashes = {}
+
+        self.features = {}
+        self.signatures = {}
+        self.buckets = [defaultdict(set) for _ in range(bands)]
+
+    @classmethod
+    def from_feature_sets(cls, patient_ids, condition_sets, medication_sets, **params):
+        """
+        Build from parallel lists of patient ids and feature sets
+        """
+        lsh = cls(**params)
+        for patient_id, conditions, medications in zip(patient_ids, condition_sets, medication_sets):
+            lsh.update(patient_id, conditions, medications)
+        return lsh
+
+    @classmethod
+    def from_index(cls, index, **params):
+        """
+        Build from a GraphIndex
+        """
+        patient_ids = list(index.nodes_of_type('patient'))
+        return cls.from_feature_sets(
+            patient_ids,
+            [{index.description(c) for c in index.patient_conditions(p)} for p in patient_ids],
+            [{index.description(m) for m in index.patient_medications(p)} for p in patient_ids],
+            **params)
+
+    def __len__(self):
+        return len(self.features)
+
+    def _hash_token(self, token):
+        value = self._token_hashes.get(token)
+        if value is None:
+            digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+            value = self._token_hashes[token] = int.from_bytes(digest, 'little') % _PRIME
+        return value
+
+    def signature(self, conditions, medications):
+        """
+        MinHash signature of a patient's combined condition/medication set
+        """
+        tokens = [f"c:{c}" for c in conditions] + [f"m:{m}" for m in medications]
+        if not tokens:
+            return None
+        hashes = np.array([self._hash_token(t) for t in tokens], dtype=np.uint64)
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def _band_keys(self, signature):
+        rows = self.rows_per_band
+        return [signature[i * rows:(i + 1) * rows].tobytes() for i in range(self.bands)]
+
+    def _unbucket(self, patient_id):
+        signature = self.signatures.pop(patient_id, None)
+        if signature is None:
+            return
+        for band, key in enumerate(self._band_keys(signature)):
+            bucket = self.buckets[band][key]
+            bucket.discard(patient_id)
+            if not bucket:
+                del self.buckets[band][key]
+
+    def update(self, patient_id, conditions, medications):
+        """
+        Insert or replace a patient's feature sets
+        """
+        self._unbucket(patient_id)
+        self.features[patient_id] = (set(conditions), set(medications))
+        signature = self.signature(conditions, medications)
+        if signature is None:
+            return
+        self.signatures[patient_id] = signature
+        for band, key in enumerate(self._band_keys(signature)):
+            self.buckets[band][key].add(patient_id)
+
+    def add_encounter(self, patient_id, conditions=(), medications=()):
+        """
+        Merge the conditions and medications of a new encounter into a patient
+        """
+        current_conditions, current_medications = self.features.get(patient_id, (set(), set()))
+        self.update(patient_id, current_conditions | set(conditions),
+                    current_medications | set(medications))
+
+    def remove(self, patient_id):
+        self._unbucket(patient_id)
+        self.features.pop(patient_id, None)
+
+    def candidates(self, patient_id):
+        """
+        Patients sharing at least one band bucket with the query patient
+        """
+        signature = self.signatures.get(patient_id)
+        if signature is None:
+            return set()
+        found = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            found.update(self.buckets[band].get(key, ()))
+            if len(found) > self.max_candidates:
+                break
+        found.discard(patient_id)
+        return found
+
+    def query(self, patient_id, num_similar=5):
+        """
+        Approximate top num_similar (patient, score) pairs, re-ranked exactly
+        """
+        conditions, medications = self.features[patient_id]
+        scores = []
+        for other in self.candidates(patient_id):
+            other_conditions, other_medications = self.features[other]
+            score = (_jaccard(conditions, other_conditions) +
+                     _jaccard(medications, other_medications)) / 2
+            scores.append((other, score))
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        return scores[:num_similar]
+
+
+def _jaccard(a, b):
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
@@ -1,110 +1,323 @@
-import networkx as nx
+from src.backend.csr_graph import CSRGraph, document_id
+from src.backend.graph_index import GraphIndex
+from src.backend.instrumentation import metrics
+from src.backend.locks import ReadWriteLock, reading
+from src.backend.lsh_index import MinHashLSHIndex
+from src.backend.temporal import format_day, window_bounds
+
+
+def patient_node(patient_id):
+    """
+    Node key of a patient given its _id ("patients/P1") or bare _key ("P1")
+    """
+    return patient_id if '/' in patient_id else document_id('patients', patient_id)
+
+
+class _NetworkXView:
+    """
+    Read accessors over a NetworkX graph matching the CSRGraph API
+
+    Neighbourhoods come from the GraphIndex's per-relation adjacency.
+    """
+    def __init__(self, graph, index):
+        self.graph = graph
+        self.index = index
+
+    def node_type(self, node):
+        return self.graph.nodes[node].get('type')
+
+    def description(self, node):
+        return self.graph.nodes[node].get('data', {}).get('description')
+
+    def neighbors(self, node, relations=None, direction='both'):
+        return self.index.neighbors(node, relations, direction)
+
+    def nodes_of_type(self, node_type):
+        return [n for n, attr in self.graph.nodes(data=True) if attr.get('type') == node_type]
+
+    def nodes_with_description(self, node_type, description):
+        return [n for n, attr in self.graph.nodes(data=True)
+                if attr.get('type') == node_type and
+                attr.get('data', {}).get('description') == description]
+
+    def document(self, node):
+        return self.graph.nodes[node].get('data')
+
 
 class MedicalAnalyzer:
-    def __init__(self, graph):
+    def __init__(self, graph, index=None, lsh_params=None, lock=None):
+        """
+        Accepts either the navigator's NetworkX graph or a CSRGraph, plus the
+        GraphIndex built at load time (built here if not supplied).
+        lsh_params configures the approximate similarity index. lock is the
+        ReadWriteLock held for writing while the graph changes; every query
+        holds it for reading.
+        """
         self.graph = graph
-        
-    def analyze_treatment_patterns(self, condition):
+        self.lock = lock if lock is not None else ReadWriteLock()
+        self.index = index if index is not None else GraphIndex.from_graph(graph)
+        self.view = graph if isinstance(graph, CSRGraph) else _NetworkXView(graph, self.index)
+        self.lsh_params = lsh_params or {}
+        self._similarity = None
+        self._similarity_version = None
+        self._cohort = None
+        self._cohort_version = None
+        self._lsh = None
+
+    @property
+    @reading
+    def similarity(self):
+        """
+        Patient feature matrices, built on first use and after index changes
+        """
+        if self._similarity is None or self._similarity_version != self.index.version:
+            # SciPy loads only once similarity is first needed
+            from src.backend.similarity import PatientSimilarityIndex
+
+            self._similarity = PatientSimilarityIndex.from_index(self.index)
+            self._similarity_version = self.index.version
+        return self._similarity
+
+    @property
+    @reading
+    def cohort(self):
+        """
+        Columnar CohortEngine over all patients, rebuilt after index changes
+        """
+        if self._cohort is None or self._cohort_version != self.index.version:
+            from src.backend.cohort import CohortEngine
+
+            self._cohort = CohortEngine.from_index(self.index)
+            self._cohort_version = self.index.version
+        return self._cohort
+
+    @property
+    @reading
+    def lsh(self):
+        """
+        MinHash/LSH index for approximate similarity, built on first use
+        """
+        if self._lsh is None:
+            self._lsh = MinHashLSHIndex.from_index(self.index, **self.lsh_params)
+        return self._lsh
+
+    @reading
+    def refresh_patients(self, patient_ids):
+        """
+        Bring derived per-patient structures up to date after graph changes
+
+        The exact similarity matrices rebuild lazily from the index version;
+        the LSH index, if built, is updated in place for the given patients.
+        """
+        if self._lsh is None:
+            return
+        patients = self.index.nodes_of_type('patient')
+        for patient_id in patient_ids:
+            if patient_id in patients:
+                self._lsh.update(
+                    patient_id,
+                    {self.index.description(c) for c in self.index.patient_conditions(patient_id)},
+                    {self.index.description(m) for m in self.index.patient_medications(patient_id)})
+            else:
+                self._lsh.remove(patient_id)
+
+    @reading
+    def get_document(self, node):
+        """
+        Full record for a node; compact graphs fetch it from ArangoDB on demand
+        """
+        return self.view.document(node)
+
+    @metrics.timed('analyzer.analyze_treatment_patterns')
+    @reading
+    def analyze_treatment_patterns(self, condition, start=None, end=None):
         """
         Analyze common treatment patterns for a specific condition
+
+        start/end (ISO dates or day numbers) restrict the diagnoses counted
+        to encounters with start <= date < end. Patterns are returned most
+        common first.
         """
         treatment_patterns = {}
+        start, end = window_bounds(start, end)
+        windowed = start is not None or end is not None
         
-        # Find all encounters with this condition
-        condition_encounters = [n for n, attr in self.graph.nodes(data=True)
-                             if attr.get('type') == 'condition' and 
-                             attr.get('data', {}).get('description') == condition]
-        
-        for c_id in condition_encounters:
-            # Get associated medications through encounters
-            medications = []
-            for path in nx.all_simple_paths(self.graph, c_id, weight='date', cutoff=2):
-                end_node = path[-1]
-                if self.graph.nodes[end_node].get('type') == 'medication':
-                    medications.append(self.graph.nodes[end_node]['data']['description'])
+        # Condition nodes -> encounter -> medications, straight from the index
+        touched = 0
+        for c_id in self.index.conditions_with_description(condition):
+            if windowed and not any(self._in_window(e, start, end)
+                                    for e in self.index.condition_encounters.get(c_id, ())):
+                continue
+            medications = [self.index.description(m)
+                           for m in self.index.condition_medications(c_id)]
+            touched += 1 + len(medications)
             
             # Record the treatment pattern
             pattern = tuple(sorted(medications))
             treatment_patterns[pattern] = treatment_patterns.get(pattern, 0) + 1
         
-        return treatment_patterns
+        metrics.increment('nodes_touched', touched, method='analyze_treatment_patterns')
+        return dict(sorted(treatment_patterns.items(), key=lambda item: (-item[1], item[0])))
+
+    @metrics.timed('analyzer.analyze_treatment_patterns_batch')
+    @reading
+    def analyze_treatment_patterns_batch(self, conditions=None, min_support=None, max_itemset_size=None,
+                                         workers=None, partition_size=None):
+        """
+        Treatment patterns for every condition (or the given ones) in one sweep
+
+        Returns a columnar PatternTable; min_support adds the frequent
+        medication itemsets (FP-growth) above that share of each condition's
+        diagnoses. Encoding and counting are split by patient range across
+        a process pool of workers (1 runs inline).
+        """
+        from src.backend.pattern_mining import DEFAULT_PARTITION_SIZE, mine_treatment_patterns
+
+        return mine_treatment_patterns(self.index, conditions, min_support, max_itemset_size,
+                                       workers, partition_size or DEFAULT_PARTITION_SIZE)
+
+    def _in_window(self, encounter, start, end):
+        day = self.index.encounter_day(encounter)
+        return day is not None and (start is None or day >= start) and (end is None or day < end)
+
+    @reading
+    def conditions_in_window(self, patient_id, start=None, end=None):
+        """
+        (date, condition) recorded for a patient with start <= date < end, in date order
+        """
+        start, end = window_bounds(start, end)
+        index = self.index
+        return [(format_day(index.encounter_day(e)), index.description(c))
+                for e in index.patient_encounters_between(patient_node(patient_id), start, end)
+                for c in sorted(index.encounter_conditions.get(e, ()))]
+
+    @reading
+    def conditions_before(self, patient_id, condition, within_days=None):
+        """
+        Conditions recorded before a patient's first diagnosis of condition
+
+        within_days limits them to that many days before it, e.g. 365 for
+        "conditions in the 12 months before". Empty if the patient never had
+        the condition on a dated encounter.
+        """
+        patient_id = patient_node(patient_id)
+        onset = self.index.condition_onsets(condition).get(patient_id)
+        if onset is None:
+            return []
+        return sorted(self._prior_conditions(patient_id, onset, within_days) - {condition})
+
+    def _prior_conditions(self, patient_id, onset, within_days):
+        # Binary search on the timeline: only encounters strictly before onset
+        start = None if within_days is None else onset - within_days
+        index = self.index
+        return {index.description(c)
+                for e in index.patient_encounters_between(patient_id, start, onset)
+                for c in index.encounter_conditions.get(e, ())}
         
-    def find_similar_patients(self, patient_id, num_similar=5):
+    @metrics.timed('analyzer.find_similar_patients')
+    @reading
+    def find_similar_patients(self, patient_id, num_similar=5, approximate=False):
         """
         Find similar patients based on condition and treatment patterns
+
+        Similarity is the mean of the condition and medication Jaccard scores,
+        taken over the conditions and medications on each patient's encounters.
+        With approximate=True candidates come from the MinHash/LSH index and
+        are re-ranked exactly. patient_id is the patient's _id or _key;
+        similar patients are returned by _id.
         """
-        # Get patient's conditions and medications
-        patient_conditions = set()
-        patient_medications = set()
-        
-        for neighbor in self.graph.neighbors(patient_id):
-            node_type = self.graph.nodes[neighbor]['type']
-            if node_type == 'condition':
-                patient_conditions.add(self.graph.nodes[neighbor]['data']['description'])
-            elif node_type == 'medication':
-                patient_medications.add(self.graph.nodes[neighbor]['data']['description'])
-        
-        # Calculate similarity scores for other patients
-        similarity_scores = {}
-        for node, attr in self.graph.nodes(data=True):
-            if attr.get('type') == 'patient' and node != patient_id:
-                other_conditions = set()
-                other_medications = set()
-                
-                for neighbor in self.graph.neighbors(node):
-                    node_type = self.graph.nodes[neighbor]['type']
-                    if node_type == 'condition':
-                        other_conditions.add(self.graph.nodes[neighbor]['data']['description'])
-                    elif node_type == 'medication':
-                        other_medications.add(self.graph.nodes[neighbor]['data']['description'])
-                
-                # Calculate Jaccard similarity
-                condition_similarity = len(patient_conditions & other_conditions) / len(patient_conditions | other_conditions)
-                medication_similarity = len(patient_medications & other_medications) / len(patient_medications | other_medications)
-                
-                # Combined similarity score
-                similarity_scores[node] = (condition_similarity + medication_similarity) / 2
-        
-        # Return top similar patients
-        similar_patients = sorted(similarity_scores.items(), key=lambda x: x[1], reverse=True)[:num_similar]
-        return similar_patients
+        patient_id = patient_node(patient_id)
+        if approximate:
+            return self.lsh.query(patient_id, num_similar)
+        return self.similarity.top_k([patient_id], num_similar)[patient_id]
+
+    @metrics.timed('analyzer.find_similar_patients_batch')
+    @reading
+    def find_similar_patients_batch(self, patient_ids, num_similar=5):
+        """
+        Find similar patients for many query patients in one call
+
+        Results are keyed by the ids as given (_id or _key).
+        """
+        patient_ids = list(patient_ids)
+        results = self.similarity.top_k([patient_node(p) for p in patient_ids], num_similar)
+        return {p: results[patient_node(p)] for p in patient_ids}
+
+    @reading
+    def patient_profile(self, patient_id):
+        """
+        (conditions, medications) names on a patient's encounters, sorted
+        """
+        patient_id = patient_node(patient_id)
+        return (sorted({self.index.description(c) for c in self.index.patient_conditions(patient_id)}),
+                sorted({self.index.description(m) for m in self.index.patient_medications(patient_id)}))
+
+    @metrics.timed('analyzer.similar_to_profile')
+    @reading
+    def similar_to_profile(self, conditions, medications, num_similar=5, exclude=()):
+        """
+        Patients most similar to a profile given by condition and medication
+        names, scored like find_similar_patients; used across shards
+        """
+        return self.similarity.profile_top_k(conditions, medications, num_similar,
+                                             [patient_node(p) for p in exclude])
         
-    def predict_risk_factors(self, condition):
+    @metrics.timed('analyzer.predict_risk_factors')
+    @reading
+    def predict_risk_factors(self, condition, within_days=None):
         """
         Identify potential risk factors for a specific condition
+
+        Only conditions recorded before each patient's first diagnosis count
+        (within_days before it, if given); same-day and later conditions are
+        not risk factors. Patients without a dated diagnosis are skipped.
+        """
+        return risk_ratios(self.risk_factor_counts(condition, within_days))
+
+    @reading
+    def risk_factor_counts(self, condition, within_days=None):
+        """
+        Additive counts behind predict_risk_factors
+
+        Returns {'cases', 'factors', 'population', 'patients'}: patients with
+        the condition, cases per prior condition, patients per condition and
+        all patients. Counts from disjoint patient sets (shards) can be
+        summed and passed to risk_ratios.
         """
         risk_factors = {}
         
-        # Find all patients with the condition
-        condition_patients = set()
-        for node, attr in self.graph.nodes(data=True):
-            if attr.get('type') == 'condition' and attr.get('data', {}).get('description') == condition:
-                # Get the patient through the encounter
-                for path in nx.all_simple_paths(self.graph, node, cutoff=2):
-                    end_node = path[-1]
-                    if self.graph.nodes[end_node].get('type') == 'patient':
-                        condition_patients.add(end_node)
+        # First diagnosis day per patient (condition -> encounter -> patient)
+        onsets = self.index.condition_onsets(condition)
+        condition_patients = set(onsets)
         
-        # Analyze prior conditions for these patients
-        for patient_id in condition_patients:
-            prior_conditions = []
-            for neighbor in self.graph.neighbors(patient_id):
-                if self.graph.nodes[neighbor]['type'] == 'condition':
-                    condition_data = self.graph.nodes[neighbor]['data']
-                    if condition_data['description'] != condition:
-                        prior_conditions.append(condition_data['description'])
+        # Conditions on each patient's timeline before the onset
+        touched = len(condition_patients)
+        for patient_id, onset in onsets.items():
+            prior_conditions = self._prior_conditions(patient_id, onset, within_days)
+            prior_conditions.discard(condition)
+            touched += len(prior_conditions)
             
-            # Count frequency of prior conditions
+            # Count the patients with each prior condition
             for prior in prior_conditions:
                 risk_factors[prior] = risk_factors.get(prior, 0) + 1
         
-        # Calculate risk ratios
-        total_patients = len([n for n, attr in self.graph.nodes(data=True) 
-                            if attr.get('type') == 'patient'])
-        
-        risk_ratios = {}
-        for factor, count in risk_factors.items():
-            risk_ratio = (count / len(condition_patients)) / (count / total_patients)
-            risk_ratios[factor] = risk_ratio
-        
-        return risk_ratios
+        metrics.increment('nodes_touched', touched, method='predict_risk_factors')
+        cohort = self.cohort
+        return {
+            'cases': len(condition_patients),
+            'factors': risk_factors,
+            'population': cohort.feature_counts('condition'),
+            'patients': len(cohort)
+        }
+
+
+def risk_ratios(counts):
+    """
+    factor -> risk ratio from risk_factor_counts
+
+    Risk ratio: share of cases with the factor over its population share.
+    """
+    ratios = {}
+    for factor, count in counts['factors'].items():
+        ratios[factor] = (count / counts['cases']) / (counts['population'][factor] / counts['patients'])
+    return ratios
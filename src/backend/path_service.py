@@ -0,0 +1,233 @@
+import networkx as nx
+import numpy as np
+
+from src.backend.csr_graph import NODE_TYPE_CODES, CSRGraph, expand_frontier
+
+# Landmarks built by default when the landmark index is requested
+DEFAULT_LANDMARKS = 16
+
+
+class PathService:
+    """
+    Shortest-path queries over the CSR form of the medical graph
+
+    Relations are followed in either direction. Single pairs use
+    bidirectional BFS, expanding the smaller frontier first.
+    Batches are grouped by source so each source runs one BFS that stops as
+    soon as all of its targets are reached. Traversal can be restricted to
+    node types, e.g. ``node_types=['patient', 'encounter', 'condition']``
+    never walks through medications. An optional LandmarkIndex answers
+    approximate distances without a search.
+    """
+    def __init__(self, graph):
+        self.csr = graph if isinstance(graph, CSRGraph) else CSRGraph.from_networkx(graph)
+        self.indptr = np.asarray(self.csr.indptr)
+        self.indices = np.asarray(self.csr.indices)
+        self.landmarks = None
+
+    def _neighbors(self, node_id):
+        return self.indices[self.indptr[node_id]:self.indptr[node_id + 1]].tolist()
+
+    def _allowed(self, node_types):
+        """
+        Per-node boolean mask of traversable nodes (None allows every node)
+        """
+        if node_types is None:
+            return None
+        codes = [NODE_TYPE_CODES[t] for t in node_types]
+        return np.isin(np.asarray(self.csr.node_types), codes)
+
+    def _path(self, parents, node_id):
+        path = []
+        while node_id is not None:
+            path.append(node_id)
+            node_id = parents[node_id]
+        return path
+
+    def shortest_path(self, source=None, target=None, node_types=None):
+        """
+        Node keys on a shortest path from source to target
+
+        Raises NetworkXNoPath when the target is unreachable (or only
+        reachable through node types outside node_types).
+        """
+        if source is None or target is None:
+            raise ValueError("shortest_path requires 'source' and 'target' params")
+        s, t = self._endpoint(source), self._endpoint(target)
+        allowed = self._allowed(node_types)
+        if allowed is not None and not (allowed[s] and allowed[t]):
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}")
+
+        path = self._bidirectional(s, t, allowed)
+        if path is None:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}")
+        keys = self.csr.keys
+        return [keys[i] for i in path]
+
+    def _endpoint(self, key):
+        try:
+            return self.csr.node_id(key)
+        except KeyError:
+            raise nx.NodeNotFound(f"Node {key} not in graph")
+
+    def _bidirectional(self, s, t, allowed):
+        if s == t:
+            return [s]
+        forward, backward = {s: None}, {t: None}
+        forward_frontier, backward_frontier = [s], [t]
+        while forward_frontier and backward_frontier:
+            # Expand whichever side has less work
+            expand_forward = len(forward_frontier) <= len(backward_frontier)
+            frontier = forward_frontier if expand_forward else backward_frontier
+            visited, other = (forward, backward) if expand_forward else (backward, forward)
+
+            next_frontier = []
+            meetings = []
+            for u in frontier:
+                for v in self._neighbors(u):
+                    if v in visited or (allowed is not None and not allowed[v]):
+                        continue
+                    visited[v] = u
+                    if v in other:
+                        meetings.append(v)
+                    else:
+                        next_frontier.append(v)
+
+            if meetings:
+                # Finish the layer: meetings differ in their depth on the other side
+                paths = [self._path(forward, v)[::-1] + self._path(backward, v)[1:] for v in meetings]
+                return min(paths, key=len)
+            if expand_forward:
+                forward_frontier = next_frontier
+            else:
+                backward_frontier = next_frontier
+        return None
+
+    def shortest_paths(self, pairs=None, node_types=None):
+        """
+        Shortest paths for many (source, target) pairs
+
+        Returns one path per pair, in input order, with None for unreachable
+        pairs. Pairs sharing a source share a single BFS.
+        """
+        if pairs is None:
+            raise ValueError("shortest_paths requires a 'pairs' param")
+        allowed = self._allowed(node_types)
+        by_source = {}
+        for source, target in pairs:
+            by_source.setdefault(source, set()).add(target)
+
+        found = {}
+        keys = self.csr.keys
+        for source, targets in by_source.items():
+            s = self._endpoint(source)
+            target_ids = {self._endpoint(target): target for target in targets}
+            if allowed is not None and not allowed[s]:
+                parents = {}
+            else:
+                parents = self._bfs(s, set(target_ids), allowed)
+            for t, target in target_ids.items():
+                found[source, target] = ([keys[i] for i in self._path(parents, t)[::-1]]
+                                         if t in parents else None)
+        return [found[source, target] for source, target in pairs]
+
+    def _bfs(self, s, targets, allowed):
+        """
+        BFS parents from s, stopping once every target has been reached
+        """
+        parents = {s: None}
+        remaining = targets - {s}
+        frontier = [s]
+        while frontier and remaining:
+            next_frontier = []
+            for u in frontier:
+                for v in self._neighbors(u):
+                    if v in parents or (allowed is not None and not allowed[v]):
+                        continue
+                    parents[v] = u
+                    remaining.discard(v)
+                    next_frontier.append(v)
+            frontier = next_frontier
+        return parents
+
+    def distance(self, source=None, target=None, node_types=None, approximate=False):
+        """
+        Hop count between two nodes (inf when unreachable)
+
+        approximate answers from the landmark index (built on first use) as
+        the best landmark upper bound, falling back to an exact search when no
+        landmark reaches both nodes. Landmarks ignore node_types.
+        """
+        if approximate and node_types is None:
+            estimate = self.landmark_index().estimate(self._endpoint(source), self._endpoint(target))
+            if estimate is not None:
+                return estimate
+        try:
+            return len(self.shortest_path(source, target, node_types)) - 1
+        except nx.NetworkXNoPath:
+            return float('inf')
+
+    def landmark_index(self, num_landmarks=DEFAULT_LANDMARKS):
+        if self.landmarks is None:
+            self.landmarks = LandmarkIndex(self.indptr, self.indices, num_landmarks)
+        return self.landmarks
+
+
+class LandmarkIndex:
+    """
+    Exact BFS distances from a few landmark nodes
+
+    Landmarks are picked by degree, skipping nodes an earlier landmark already
+    reaches, so disconnected components get their own landmarks. For nodes s
+    and t, min over landmarks of d(s, l) + d(l, t) is an upper bound on their
+    distance and max |d(s, l) - d(t, l)| a lower bound.
+    """
+    def __init__(self, indptr, indices, num_landmarks=DEFAULT_LANDMARKS):
+        n = len(indptr) - 1
+        degree = np.diff(indptr)
+        covered = np.zeros(n, dtype=bool)
+        self.landmarks = []
+        rows = []
+        for node in np.argsort(-degree, kind='stable'):
+            if len(self.landmarks) >= num_landmarks:
+                break
+            if covered[node]:
+                continue
+            distances = _bfs_distances(indptr, indices, int(node))
+            covered |= distances >= 0
+            self.landmarks.append(int(node))
+            rows.append(distances)
+        self.distances = np.array(rows, dtype=np.int32).reshape(len(rows), n)
+
+    def bounds(self, s, t):
+        """
+        (lower, upper) distance bounds, or None if no landmark reaches s or t
+        """
+        ds, dt = self.distances[:, s], self.distances[:, t]
+        both = (ds >= 0) & (dt >= 0)
+        if both.any():
+            return int(np.abs(ds[both] - dt[both]).max()), int((ds[both] + dt[both]).min())
+        if ((ds >= 0) != (dt >= 0)).any():
+            # One landmark's component holds exactly one of the two nodes
+            return float('inf'), float('inf')
+        return None
+
+    def estimate(self, s, t):
+        bounds = self.bounds(s, t)
+        return None if bounds is None else bounds[1]
+
+
+def _bfs_distances(indptr, indices, source):
+    """
+    Hop distances from source to every node (-1 when unreachable)
+    """
+    distances = np.full(len(indptr) - 1, -1, dtype=np.int32)
+    distances[source] = 0
+    frontier = np.array([source])
+    depth = 0
+    while frontier.size:
+        depth += 1
+        _, neighbors = expand_frontier(indptr, indices, frontier)
+        frontier = np.unique(neighbors[distances[neighbors] == -1])
+        distances[frontier] = depth
+    return distances
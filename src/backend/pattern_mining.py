@@ -0,0 +1,284 @@
+import csv
+import itertools
+import math
+import multiprocessing
+import os
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Patients per partial-count task
+DEFAULT_PARTITION_SIZE = 50000
+# Conditions mined per frequent-itemset task
+MINING_BATCH_SIZE = 8
+
+TABLE_COLUMNS = ('condition', 'kind', 'medications', 'count', 'support')
+
+
+class PatternTable:
+    """
+    Columnar treatment patterns for many conditions
+
+    One row per (condition, medication pattern) with kind 'pattern' (the
+    exact medications of a diagnosis, as in analyze_treatment_patterns) or
+    'itemset' (a frequent medication combination mined with FP-growth).
+    count is the number of diagnoses, support its share of the condition's
+    diagnoses. Rows are ordered by condition, kind and descending count.
+    """
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['count'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def rows(self):
+        for i in range(len(self)):
+            yield {name: self.columns[name][i] for name in TABLE_COLUMNS}
+
+    def patterns(self, condition, kind='pattern'):
+        """
+        medications -> count for one condition, most common first
+        """
+        mask = (self.columns['condition'] == condition) & (self.columns['kind'] == kind)
+        return {self.columns['medications'][i]: int(self.columns['count'][i]) for i in np.flatnonzero(mask)}
+
+    def to_pandas(self):
+        import pandas as pd
+
+        return pd.DataFrame({name: self.columns[name] for name in TABLE_COLUMNS})
+
+    def write(self, path):
+        """
+        Persist as Parquet (.parquet, needs pyarrow) or CSV (medications joined with ';')
+        """
+        if path.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.table({
+                'condition': self.columns['condition'].tolist(),
+                'kind': self.columns['kind'].tolist(),
+                'medications': [list(m) for m in self.columns['medications']],
+                'count': self.columns['count'],
+                'support': self.columns['support']
+            })
+            pq.write_table(table, path)
+            return
+        if not path.endswith('.csv'):
+            raise ValueError("Pattern tables are written as .parquet or .csv")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(TABLE_COLUMNS)
+            for row in self.rows():
+                writer.writerow([row['condition'], row['kind'], ';'.join(row['medications']),
+                                 int(row['count']), float(row['support'])])
+
+
+def encode_diagnoses(index, conditions=None, start=0, stop=None):
+    """
+    One patient-major sweep over the encounters into parallel integer arrays
+
+    Returns (patient rows, condition codes, pattern codes, condition names,
+    patterns) with one entry per diagnosis of a wanted condition on a
+    patient's encounter; patterns are sorted medication tuples, computed
+    once per encounter. start/stop restrict the sweep to that range of
+    patient rows.
+    """
+    wanted = None if conditions is None else set(conditions)
+    descriptions = index.descriptions
+    encounter_conditions = index.encounter_conditions
+    encounter_medications = index.encounter_medications
+    condition_codes = {}
+    pattern_codes = {}
+    rows, condition_column, pattern_column = [], [], []
+    patients = itertools.islice(index.nodes_of_type('patient'), start, stop)
+    for row, patient_id in enumerate(patients, start):
+        for encounter in index.patient_encounters.get(patient_id, ()):
+            diagnoses = [descriptions.get(c) for c in encounter_conditions.get(encounter, ())]
+            if wanted is not None:
+                diagnoses = [d for d in diagnoses if d in wanted]
+            if not diagnoses:
+                continue
+            pattern = tuple(sorted(descriptions.get(m) for m in encounter_medications.get(encounter, ())))
+            pattern_code = pattern_codes.setdefault(pattern, len(pattern_codes))
+            for description in diagnoses:
+                rows.append(row)
+                condition_column.append(condition_codes.setdefault(description, len(condition_codes)))
+                pattern_column.append(pattern_code)
+    return (np.asarray(rows, dtype=np.int64), np.asarray(condition_column, dtype=np.int64),
+            np.asarray(pattern_column, dtype=np.int64), list(condition_codes), list(pattern_codes))
+
+
+# GraphIndex of this pool worker, set by _init_worker
+_worker_index = None
+
+
+def _init_worker(index):
+    global _worker_index
+    _worker_index = index
+
+
+def _partial_counts(index, conditions, start, stop):
+    """
+    {(condition, pattern): diagnoses} over one range of patient rows
+    """
+    _, condition_codes, pattern_codes, condition_names, patterns = encode_diagnoses(index, conditions, start, stop)
+    num_patterns = max(len(patterns), 1)
+    keys, counts = np.unique(condition_codes * num_patterns + pattern_codes, return_counts=True)
+    return {(condition_names[key // num_patterns], patterns[key % num_patterns]): count
+            for key, count in zip(keys.tolist(), counts.tolist())}
+
+
+def _worker_partial_counts(args):
+    """
+    _partial_counts on the worker's own index (runs in worker processes)
+    """
+    return _partial_counts(_worker_index, *args)
+
+
+def _mine_batch(args):
+    """
+    FP-growth over a batch of conditions (runs in worker processes)
+    """
+    tasks, max_size = args
+    return [(name, fp_growth(transactions, min_count, max_size)) for name, transactions, min_count in tasks]
+
+
+def mine_treatment_patterns(index, conditions=None, min_support=None, max_itemset_size=None,
+                            workers=None, partition_size=DEFAULT_PARTITION_SIZE):
+    """
+    Treatment patterns for all (or the given) conditions as a PatternTable
+
+    Each task encodes and counts the diagnoses of one range of
+    partition_size patients; tasks run on a process pool (workers, default
+    one per core; 1 runs inline) whose workers receive a pickled copy of
+    the index once, in their initializer, and the partial counts are
+    merged. Workers are spawned rather than forked, since the caller may
+    hold sync, server or lock threads. With min_support (a share of each
+    condition's diagnoses) frequent medication itemsets are mined per
+    condition with FP-growth, in batches on the same pool.
+    """
+    num_patients = len(index.nodes_of_type('patient'))
+    tasks = [(conditions, start, start + partition_size) for start in range(0, num_patients, partition_size)]
+
+    spawn = multiprocessing.get_context('spawn')
+    pool = (ProcessPoolExecutor(max_workers=workers, mp_context=spawn,
+                                initializer=_init_worker, initargs=(index,))
+            if workers != 1 and len(tasks) > 1 else None)
+    try:
+        merged = Counter()
+        for counts in (pool.map(_worker_partial_counts, tasks) if pool
+                       else (_partial_counts(index, *task) for task in tasks)):
+            merged.update(counts)
+
+        by_condition = defaultdict(list)
+        for (condition, pattern), count in merged.items():
+            by_condition[condition].append((pattern, count))
+        totals = {name: sum(count for _, count in rows) for name, rows in by_condition.items()}
+
+        itemsets = {}
+        if min_support is not None:
+            mining = [(name, [(p, n) for p, n in rows if p], max(1, math.ceil(min_support * totals[name])))
+                      for name, rows in by_condition.items()]
+            batches = [(mining[i:i + MINING_BATCH_SIZE], max_itemset_size)
+                       for i in range(0, len(mining), MINING_BATCH_SIZE)]
+            if pool is None and workers != 1 and len(batches) > 1:
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=spawn)
+            for result in (pool.map(_mine_batch, batches) if pool else map(_mine_batch, batches)):
+                itemsets.update(result)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    records = []
+    for name in sorted(by_condition):
+        total = totals[name]
+        for kind, rows in (('itemset', itemsets.get(name, {}).items()), ('pattern', by_condition[name])):
+            for medications, count in sorted(rows, key=lambda item: (-item[1], item[0])):
+                records.append((name, kind, medications, count, count / total))
+    return _table(records)
+
+
+def _table(records):
+    medications = np.empty(len(records), dtype=object)
+    medications[:] = [r[2] for r in records]
+    return PatternTable({
+        'condition': np.array([r[0] for r in records], dtype=object),
+        'kind': np.array([r[1] for r in records], dtype=object),
+        'medications': medications,
+        'count': np.array([r[3] for r in records], dtype=np.int64),
+        'support': np.array([r[4] for r in records], dtype=np.float64)
+    })
+
+
+class _FPNode:
+    __slots__ = ('item', 'count', 'parent', 'children')
+
+    def __init__(self, item, parent):
+        self.item = item
+        self.count = 0
+        self.parent = parent
+        self.children = {}
+
+
+def fp_growth(transactions, min_count, max_size=None):
+    """
+    Frequent itemsets of weighted transactions with FP-growth
+
+    transactions are (items, weight) pairs; returns sorted item tuple ->
+    total weight of the transactions containing it, for every itemset with
+    weight >= min_count (and at most max_size items).
+    """
+    counts = Counter()
+    for items, weight in transactions:
+        for item in set(items):
+            counts[item] += weight
+    frequent = {item: count for item, count in counts.items() if count >= min_count}
+    result = {}
+    if frequent:
+        _mine_tree(transactions, frequent, (), min_count, max_size, result)
+    return result
+
+
+def _mine_tree(transactions, counts, suffix, min_count, max_size, result):
+    # Build the FP-tree with items in descending frequency order
+    rank = {item: r for r, item in enumerate(sorted(counts, key=lambda i: (-counts[i], i)))}
+    root = _FPNode(None, None)
+    header = defaultdict(list)
+    for items, weight in transactions:
+        node = root
+        for item in sorted({i for i in items if i in rank}, key=rank.__getitem__):
+            child = node.children.get(item)
+            if child is None:
+                child = node.children[item] = _FPNode(item, node)
+                header[item].append(child)
+            child.count += weight
+            node = child
+
+    # Least frequent items first, each with its conditional pattern base
+    for item in sorted(counts, key=rank.__getitem__, reverse=True):
+        itemset = suffix + (item,)
+        result[tuple(sorted(itemset))] = counts[item]
+        if max_size is not None and len(itemset) >= max_size:
+            continue
+        base = []
+        for node in header[item]:
+            path = []
+            parent = node.parent
+            while parent.item is not None:
+                path.append(parent.item)
+                parent = parent.parent
+            if path:
+                base.append((path, node.count))
+        conditional = Counter()
+        for path, weight in base:
+            for i in path:
+                conditional[i] += weight
+        conditional = {i: c for i, c in conditional.items() if c >= min_count}
+        if conditional:
+            _mine_tree(base, conditional, itemset, min_count, max_size, result)
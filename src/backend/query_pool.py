@@ -0,0 +1,176 @@
+import asyncio
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.backend.instrumentation import metrics
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_QUERY_TIMEOUT = 30.0
+DEFAULT_CURSOR_BATCH = 1000
+
+
+class QueryTimeout(TimeoutError):
+    """
+    Raised when an AQL query exceeds its timeout
+    """
+
+
+class AsyncQueryPool:
+    """
+    Asyncio access to ArangoDB through a pool of database connections
+
+    python-arango is synchronous, so every round trip (query submission and
+    each cursor batch) runs on a worker thread while the event loop keeps
+    serving other sessions. Connections come from ``connect`` (a callable
+    returning a database handle) and are created lazily up to ``size``.
+    ``max_concurrency`` bounds the queries in flight; further queries wait
+    for a slot. Results stream as async generators one cursor batch at a
+    time, so a large result is never held in memory at once.
+    """
+    def __init__(self, connect, size=DEFAULT_POOL_SIZE, max_concurrency=None,
+                 timeout=DEFAULT_QUERY_TIMEOUT, batch_size=DEFAULT_CURSOR_BATCH):
+        self.connect = connect
+        self.size = size
+        self.max_concurrency = max_concurrency or size
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._idle = []
+        self._created = 0
+        self._executor = None
+        self._slots = None
+        self._available = None
+        self._loop = None
+        self.in_flight = 0
+        self.completed = 0
+        self.timeouts = 0
+
+    def _bind_loop(self):
+        # Synchronization primitives belong to the loop that first uses them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._available = asyncio.Condition()
+        if self._executor is None:
+            # Spare workers so calls abandoned on timeout do not starve the pool
+            self._executor = ThreadPoolExecutor(max_workers=2 * self.size,
+                                                thread_name_prefix='aql-pool')
+        return loop
+
+    async def _acquire(self):
+        async with self._available:
+            while not self._idle and self._created >= self.size:
+                await self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return await self._loop.run_in_executor(self._executor, self.connect)
+        except BaseException:
+            async with self._available:
+                self._created -= 1
+                self._available.notify()
+            raise
+
+    async def _release(self, connection, discard=False):
+        async with self._available:
+            if discard:
+                self._created -= 1
+            else:
+                self._idle.append(connection)
+            self._available.notify()
+
+    async def _call(self, deadline, func, *args):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError
+        return await asyncio.wait_for(
+            self._loop.run_in_executor(self._executor, func, *args), remaining)
+
+    async def stream(self, query, bind_vars=None, timeout=None, batch_size=None):
+        """
+        Async generator over the documents of an AQL query
+
+        timeout (seconds, default the pool's) bounds the whole query, from
+        waiting for a slot to the last batch; it is also sent to ArangoDB as
+        max_runtime so the server abandons the query too.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        batch_size = batch_size or self.batch_size
+        loop = self._bind_loop()
+        deadline = time.monotonic() + timeout
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise QueryTimeout(f"No query slot within {timeout}s")
+        cursor = None
+        connection = None
+        timed_out = False
+        failed = True
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            connection = await asyncio.wait_for(self._acquire(), max(deadline - time.monotonic(), 0))
+            cursor = await self._call(deadline, lambda: connection.aql.execute(
+                query, bind_vars=bind_vars or {}, batch_size=batch_size,
+                stream=True, max_runtime=timeout))
+            iterator = iter(cursor)
+            while True:
+                batch = await self._call(deadline, _take, iterator, batch_size)
+                metrics.increment('rows_fetched', len(batch), source='async_aql')
+                for doc in batch:
+                    yield doc
+                if len(batch) < batch_size:
+                    break
+            self.completed += 1
+            failed = False
+        except asyncio.TimeoutError:
+            timed_out = True
+            self.timeouts += 1
+            raise QueryTimeout(f"Query exceeded {timeout}s")
+        finally:
+            self.in_flight -= 1
+            metrics.observe('aql.async', time.perf_counter() - started, failed)
+            if cursor is not None and hasattr(cursor, 'close'):
+                # Free the server-side cursor when the consumer stops early
+                loop.run_in_executor(self._executor, _close_cursor, cursor)
+            if connection is not None:
+                # A timed-out call may still be running on its worker thread
+                await self._release(connection, discard=timed_out)
+            self._slots.release()
+
+    async def query(self, query, bind_vars=None, timeout=None, batch_size=None):
+        """
+        All documents of an AQL query as a list
+        """
+        return [doc async for doc in self.stream(query, bind_vars, timeout, batch_size)]
+
+    def stats(self):
+        return {
+            'connections': self._created,
+            'idle': len(self._idle),
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'timeouts': self.timeouts
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._idle.clear()
+        self._created = 0
+
+
+def _take(iterator, count):
+    return list(itertools.islice(iterator, count))
+
+
+def _close_cursor(cursor):
+    try:
+        cursor.close(ignore_missing=True)
+    except Exception:
+        pass
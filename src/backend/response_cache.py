@@ -0,0 +1,206 @@
+import pickle
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+EMBEDDING_DIM = 512
+DEFAULT_THRESHOLD = 0.9
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_ENTITY = re.compile(r"\b\w*\d\w*\b")
+# Contractions such as "didn't", normalized to "didn t"
+_NEGATED_CONTRACTION = re.compile(r"\b\w+n t\b")
+
+# Words that invert or narrow a question's meaning while barely moving its
+# embedding ("with"/"without Asthma" score 0.91): negations, sex and age
+# qualifiers and comparisons. Two queries must agree on them exactly.
+QUALIFIER_TERMS = frozenset(
+    "no not without never non none nor except excluding "
+    "male males female females man men woman women boy boys girl girls "
+    "over under above below older younger before after "
+    "more less fewer greater than most least".split())
+
+# Function words ignored by the local embedder
+STOPWORDS = frozenset(
+    "a an and are can could do does for give i in is list me of on please show tell "
+    "the their them there these this to was were what which who with would you".split())
+
+
+def normalize_query(query):
+    """
+    Case-, accent-, punctuation- and whitespace-insensitive form of a query
+    """
+    query = unicodedata.normalize('NFKC', query).lower()
+    return _WHITESPACE.sub(' ', _PUNCTUATION.sub(' ', query)).strip()
+
+
+def hashed_ngram_embedding(texts, dim=EMBEDDING_DIM):
+    """
+    Local embedder: hashed word and character trigram counts, L2-normalized
+
+    Stopwords are skipped so filler words do not dominate short questions.
+    Deterministic and dependency-free, so the cache works offline. It scores
+    rewordings that share most words and spellings as near-duplicates; pass
+    a model-backed embedder to SemanticResponseCache for looser paraphrases.
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.split():
+            if word in STOPWORDS:
+                continue
+            vectors[row, zlib.crc32(word.encode('utf-8')) % dim] += 2.0
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                vectors[row, zlib.crc32(padded[i:i + 3].encode('utf-8')) % dim] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def qualifier_terms(text):
+    """
+    QUALIFIER_TERMS in a normalized query; negated contractions count as "not"
+    """
+    terms = set(text.split()) & QUALIFIER_TERMS
+    if _NEGATED_CONTRACTION.search(text):
+        terms.add('not')
+    return frozenset(terms)
+
+
+def entity_terms(text):
+    """
+    Tokens containing digits (patient keys, counts, years) and qualifier
+    terms in a normalized query
+    """
+    return frozenset(_ENTITY.findall(text)) | qualifier_terms(text)
+
+
+class SemanticResponseCache:
+    """
+    process_query response cache matching near-duplicate questions
+
+    Queries are normalized and embedded with ``embed`` (a callable mapping a
+    list of strings to row vectors; hashed_ngram_embedding by default). A
+    lookup hits on an identical normalized query, or on the most similar
+    cached query with cosine similarity >= threshold whose entity terms
+    (``entities``; digit-bearing tokens and qualifiers by default) are
+    identical, so "P12" never answers for "P13". Queries differing in a
+    negation, sex, age or comparison word (QUALIFIER_TERMS) never match,
+    whatever ``entities`` returns. Entries expire after ttl seconds, belong to one
+    graph version and are evicted least-recently-used beyond max_bytes.
+    """
+    def __init__(self, embed=None, threshold=DEFAULT_THRESHOLD, ttl=3600.0,
+                 max_bytes=64 * 1024 * 1024, entities=None):
+        self.embed = embed or hashed_ngram_embedding
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entities = entities or entity_terms
+        # normalized query -> (vector, entities, response, created, size)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._graph_version = None
+        self._matrix = None
+        self._keys = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _check_version(self, graph_version):
+        if graph_version != self._graph_version:
+            self._clear()
+            self._graph_version = graph_version
+
+    def _clear(self):
+        self._entries.clear()
+        self._bytes = 0
+        self._matrix = None
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[4]
+        self._matrix = None
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry[3] > self.ttl]
+        for key in expired:
+            self._remove(key)
+
+    def get(self, query, graph_version=None):
+        """
+        Cached response for a query (or a near-duplicate of it), else None
+        """
+        normalized = normalize_query(query)
+        with self._lock:
+            self._check_version(graph_version)
+            self._expire(time.time())
+            if normalized in self._entries:
+                self._entries.move_to_end(normalized)
+                self.hits += 1
+                return self._entries[normalized][2]
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.vstack([self._entries[k][0] for k in self._keys])
+            keys, matrix = self._keys, self._matrix
+
+        vector = self.embed([normalized])[0]
+        scores = matrix @ vector
+        entities = self.entities(normalized)
+        qualifiers = qualifier_terms(normalized)
+        with self._lock:
+            for i in np.argsort(-scores):
+                if scores[i] < self.threshold:
+                    break
+                entry = self._entries.get(keys[i])
+                if entry is not None and entry[1] == entities and qualifier_terms(keys[i]) == qualifiers:
+                    self._entries.move_to_end(keys[i])
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return entry[2]
+            self.misses += 1
+        return None
+
+    def put(self, query, response, graph_version=None):
+        normalized = normalize_query(query)
+        vector = np.asarray(self.embed([normalized])[0], dtype=np.float32)
+        size = len(pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL)) + vector.nbytes + len(normalized)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._check_version(graph_version)
+            if normalized in self._entries:
+                self._remove(normalized)
+            self._entries[normalized] = (vector, self.entities(normalized), response, time.time(), size)
+            self._bytes += size
+            self._matrix = None
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes
+            }
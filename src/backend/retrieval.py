@@ -0,0 +1,258 @@
+import math
+import re
+
+import numpy as np
+
+from src.backend.csr_graph import EDGE_TYPES, document_id, document_key
+from src.backend.intent_router import PATIENT_ID
+from src.backend.temporal import format_day
+
+# Bounds on one entity's ego subgraph
+DEFAULT_HOPS = 2
+DEFAULT_MAX_NODES = 200
+# Neighbours followed per node and hop (most recent first), and seed nodes
+# taken for a condition name shared by many diagnoses
+DEFAULT_FANOUT = 25
+# Default size of the context handed to the agent
+DEFAULT_TOKEN_BUDGET = 1500
+# Rough tokenizer-free estimate for English and identifiers
+CHARS_PER_TOKEN = 4
+# Personalized PageRank used to rank subgraph nodes
+RESTART_PROBABILITY = 0.15
+RANK_ITERATIONS = 30
+
+_NODE_KEY = re.compile(r"\b(?:[a-z]+/)?[A-Za-z]+\d+(?:_\d+)?\b")
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def query_entities(query, resolve, conditions=()):
+    """
+    Graph entities mentioned in a question
+
+    Document keys (including "patient 12" forms) are mapped to node keys
+    with resolve (e.g. MedGraphNavigator.resolve_node), dropping unknown
+    ones; mentioned condition names become 'condition:<name>'.
+    conditions are the known condition descriptions.
+    """
+    entities = []
+    for match in PATIENT_ID.finditer(query):
+        key = match.group(1) or match.group(2)
+        entities.append(document_id('patients', key.upper() if key[0].isalpha() else f"P{key}"))
+    entities.extend(m if '/' in m else m.upper() for m in _NODE_KEY.findall(query))
+    found = list(dict.fromkeys(node for node in map(resolve, entities) if node is not None))
+
+    names = sorted(conditions, key=len, reverse=True)
+    if names:
+        pattern = re.compile(r"\b(" + "|".join(re.escape(n) for n in names) + r")\b", re.IGNORECASE)
+        canonical = {n.lower(): n for n in names}
+        found.extend(dict.fromkeys(f"condition:{canonical[m.lower()]}" for m in pattern.findall(query)))
+    return found
+
+
+def node_day(index, key):
+    """
+    Day of a node: an encounter's own day; a condition, medication or
+    procedure takes its earliest encounter's; patients have none
+    """
+    node_type = index.node_types.get(key)
+    if node_type == 'encounter':
+        return index.encounter_days.get(key)
+    if node_type in (None, 'patient'):
+        return None
+    days = [index.encounter_days[e] for e in index.encounter_neighbors(key) if e in index.encounter_days]
+    return min(days) if days else None
+
+
+def _recent_first(index, keys):
+    # Most recent first, undated last, ties by key so results are stable
+    dated = [(node_day(index, key), key) for key in keys]
+    return [key for day, key in sorted(dated, key=lambda item: (item[0] is None, -(item[0] or 0), item[1]))]
+
+
+def entity_seeds(index, entity, fanout=DEFAULT_FANOUT):
+    """
+    Node keys an entity stands for; the most recent diagnoses of a condition
+
+    Diagnoses come from the index's per-description recency order, so a
+    common condition costs O(fanout) per query, not O(diagnoses).
+    """
+    if entity.startswith('condition:'):
+        return index.recent_conditions(entity[10:], fanout)
+    return [entity]
+
+
+def ego_subgraph(index, seeds, hops=DEFAULT_HOPS, max_nodes=DEFAULT_MAX_NODES,
+                 node_types=None, fanout=DEFAULT_FANOUT):
+    """
+    Bounded k-hop neighbourhood of seed node keys in a GraphIndex
+
+    Relations are followed in both directions. Each hop follows at most
+    fanout neighbours per node, most recent first, and only into node_types
+    (seeds are always kept); expansion stops at max_nodes. Only the visited
+    adjacency sets are read, so the cost is bounded by the subgraph, not
+    the graph. Returns (node keys, hop distance of each).
+    """
+    keys = list(dict.fromkeys(seeds))[:max_nodes]
+    distances = [0] * len(keys)
+    seen = set(keys)
+    frontier = keys
+    for hop in range(1, hops + 1):
+        if not frontier or len(keys) >= max_nodes:
+            break
+        added = []
+        for node in frontier:
+            neighbors = [n for n in set(index.neighbors(node))
+                         if node_types is None or index.node_types.get(n) in node_types]
+            for neighbor in _recent_first(index, neighbors)[:fanout]:
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    added.append(neighbor)
+                    if len(keys) + len(added) >= max_nodes:
+                        break
+            if len(keys) + len(added) >= max_nodes:
+                break
+        keys.extend(added)
+        distances.extend([hop] * len(added))
+        frontier = added
+    return keys, np.array(distances, dtype=np.int64)
+
+
+def merge_subgraphs(subgraphs):
+    """
+    Union of (keys, hops) subgraphs as (keys, hops, restart weights)
+
+    Each node keeps its smallest hop; every subgraph's seeds share an equal
+    restart weight, so an entity with many seed nodes does not drown out
+    one with a single seed.
+    """
+    hops = {}
+    weights = {}
+    for keys, distances in subgraphs:
+        seeds = [key for key, hop in zip(keys, distances.tolist()) if hop == 0]
+        for key in seeds:
+            weights[key] = weights.get(key, 0.0) + 1.0 / len(seeds)
+        for key, hop in zip(keys, distances.tolist()):
+            if hops.get(key, hop + 1) > hop:
+                hops[key] = hop
+    merged = list(hops)
+    return (merged, np.fromiter(hops.values(), dtype=np.int64, count=len(hops)),
+            np.array([weights.get(key, 0.0) for key in merged]))
+
+
+def _local_edges(index, keys):
+    """
+    (source, target, relation) positions within keys for edges inside the
+    subgraph, listed once from each endpoint
+    """
+    position = {key: i for i, key in enumerate(keys)}
+    sources, targets, relations = [], [], []
+    for relation in EDGE_TYPES:
+        outgoing = index.outgoing[relation]
+        for key, s in position.items():
+            for target in outgoing.get(key, ()):
+                t = position.get(target)
+                if t is not None:
+                    sources += [s, t]
+                    targets += [t, s]
+                    relations += [relation, relation]
+    return np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64), relations
+
+
+def rank_nodes(index, keys, hops, restart=None):
+    """
+    Relevance of subgraph nodes: personalized PageRank restarting at the seeds
+
+    restart weights the seeds (default: every hop-0 node equally).
+    """
+    if not len(keys):
+        return np.zeros(0)
+    sources, targets, _ = _local_edges(index, keys)
+    degree = np.bincount(sources, minlength=len(keys)).astype(np.float64)
+    restart = (hops == 0).astype(np.float64) if restart is None else np.asarray(restart, dtype=np.float64)
+    restart = restart / (restart.sum() or 1.0)
+    scores = restart.copy()
+    for _ in range(RANK_ITERATIONS):
+        flow = np.bincount(targets, weights=scores[sources] / degree[sources], minlength=len(keys))
+        scores = RESTART_PROBABILITY * restart + (1 - RESTART_PROBABILITY) * flow
+    return scores
+
+
+def serialize_subgraph(index, keys, hops, restart=None, token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Compact text of a subgraph within token_budget
+
+    Nodes are listed hop by hop, the most relevant (rank_nodes) first within
+    a hop. One line per node: document key, type, description and date,
+    then its relations to nodes already listed, e.g.
+    "E7 encounter 2021-03-02 | HAD_ENCOUNTER P1". Lines that would exceed
+    the budget are dropped and counted at the end.
+    """
+    scores = rank_nodes(index, keys, hops, restart)
+    order = np.lexsort((-scores, hops))
+    sources, targets, types = _local_edges(index, keys)
+    relations = {}
+    for s, t, relation in zip(sources.tolist(), targets.tolist(), types):
+        relations.setdefault(s, []).append((t, relation))
+
+    names = [document_key(key)[1] for key in keys]
+    listed = set()
+    lines = []
+    used = estimate_tokens("Graph context:")
+    for position in order.tolist():
+        key = keys[position]
+        parts = [names[position]]
+        if index.node_types.get(key) is not None:
+            parts.append(index.node_types[key])
+        if index.description(key) is not None:
+            parts.append(f'"{index.description(key)}"')
+        day = node_day(index, key)
+        if day is not None:
+            parts.append(format_day(day))
+        line = ' '.join(parts)
+        links = [f"{relation} {names[t]}" for t, relation in relations.get(position, ()) if t in listed]
+        if links:
+            line += ' | ' + ', '.join(links)
+        cost = estimate_tokens(line) + 1
+        if used + cost > token_budget:
+            continue
+        used += cost
+        listed.add(position)
+        lines.append(line)
+    omitted = len(keys) - len(lines)
+    if omitted:
+        lines.append(f"... {omitted} more nodes")
+    return '\n'.join(["Graph context:"] + lines) if lines else ''
+
+
+def compact_result(result, token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Bounded text form of a tool result for the agent
+
+    Score dicts (pagerank, centrality) keep their highest values, lists
+    their first items; whatever does not fit is summarised as a count.
+    """
+    if isinstance(result, dict) and result and 'error' not in result and \
+            all(isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in result.values()):
+        items = [f"{k}: {v:.4g}" if isinstance(v, float) else f"{k}: {v}"
+                 for k, v in sorted(result.items(), key=lambda item: -item[1])]
+    elif isinstance(result, (list, tuple)):
+        items = [repr(item) for item in result]
+    else:
+        text = result if isinstance(result, str) else repr(result)
+        limit = token_budget * CHARS_PER_TOKEN
+        return text if len(text) <= limit else text[:limit] + f"... ({len(text) - limit} more characters)"
+
+    lines = []
+    used = 0
+    for item in items:
+        cost = estimate_tokens(item) + 1
+        if used + cost > token_budget:
+            break
+        used += cost
+        lines.append(item)
+    if len(lines) < len(items):
+        lines.append(f"... {len(items) - len(lines)} more of {len(items)}")
+    return '\n'.join(lines)
@@ -0,0 +1,385 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from src.backend.instrumentation import metrics
+
+DEFAULT_PORT = 8000
+DEFAULT_REQUEST_TIMEOUT = 30.0
+
+# Intents answered from the graph alone, and therefore by pool workers
+POOL_INTENTS = frozenset({
+    'treatment_patterns', 'risk_factors', 'similar_patients', 'pagerank',
+    'community_detection', 'centrality', 'shortest_path', 'shortest_paths', 'distance',
+    'visualize'
+})
+
+
+class ServerBusy(RuntimeError):
+    """
+    Raised when a request arrives while max_pending jobs are already queued
+    """
+
+
+class RequestTimeout(TimeoutError):
+    """
+    Raised when a job does not finish within its request timeout
+    """
+
+
+# Per-process navigator of a pool worker, opened on the shared snapshot
+_worker_navigator = None
+
+
+def _init_worker(snapshot_path):
+    global _worker_navigator
+    from src.backend.graph_navigator import MedGraphNavigator
+
+    navigator = MedGraphNavigator()
+    # The snapshot was validated by the parent; workers never touch ArangoDB
+    if not navigator.open_graph_snapshot(snapshot_path, validate=False):
+        raise RuntimeError(f"Worker could not open snapshot {snapshot_path}")
+    # Indexes are built before the worker takes its first job
+    navigator.analyzer
+    _worker_navigator = navigator
+
+
+def _run_job(intent, params):
+    return _worker_navigator.run_intent(intent, params)
+
+
+class WorkerPool:
+    """
+    Process pool running graph jobs against a shared read-only snapshot
+
+    Every worker opens the same memory-mapped snapshot, so graph pages are
+    shared and CPU-heavy analyzer and analytics work runs on all cores
+    instead of behind one GIL. Up to max_pending jobs (default four per worker) may be queued or
+    running; submit() raises ServerBusy beyond that, which is the server's
+    backpressure. run() waits at most timeout seconds: a job still queued
+    is cancelled, a running one is abandoned and its result dropped (worker
+    processes cannot be interrupted mid-job). Abandoned jobs keep their
+    slot and their worker until they finish; once recycle_after of them
+    (default: as many as there are workers) are still running, the
+    executor is replaced and its processes are terminated, and jobs queued
+    behind them fail with ServerBusy. Workers are spawned, so they never
+    inherit the parent's threads or open connections.
+    """
+    def __init__(self, snapshot_path, workers=None, max_pending=None, timeout=DEFAULT_REQUEST_TIMEOUT,
+                 recycle_after=None):
+        self.snapshot_path = snapshot_path
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = self.workers * 4 if max_pending is None else max_pending
+        self.recycle_after = self.workers if recycle_after is None else recycle_after
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._abandoned = set()
+        self._ids = itertools.count(1)
+        self._executor = self._start()
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.recycled = 0
+
+    def _start(self):
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker, initargs=(self.snapshot_path,))
+
+    def warm(self):
+        """
+        Start every worker before the first request; returns the pids that answered
+
+        Each submitted job starts a worker while none is idle, and workers
+        build their indexes in the initializer, so once these jobs return
+        the pool is ready.
+        """
+        futures = [self._executor.submit(os.getpid) for _ in range(self.workers)]
+        return sorted({f.result() for f in futures})
+
+    def submit(self, intent, params=None):
+        """
+        Queue a job; returns (job_id, future)
+        """
+        if intent not in POOL_INTENTS:
+            raise ValueError(f"Intent {intent} is not served by the worker pool")
+        with self._lock:
+            if len(self._jobs) >= self.max_pending:
+                self.rejected += 1
+                raise ServerBusy(f"{len(self._jobs)} jobs pending")
+            job_id = next(self._ids)
+            future = self._executor.submit(_run_job, intent, params or {})
+            self._jobs[job_id] = future
+        future.add_done_callback(lambda f: self._done(job_id, f))
+        return job_id, future
+
+    def _done(self, job_id, future):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._abandoned.discard(job_id)
+            if not future.cancelled():
+                self.completed += 1
+
+    def cancel(self, job_id):
+        """
+        Cancel a job; True if it had not started yet
+        """
+        with self._lock:
+            future = self._jobs.get(job_id)
+        if future is None:
+            return False
+        cancelled = future.cancel()
+        if cancelled:
+            self.cancelled += 1
+        return cancelled
+
+    def run(self, intent, params=None, timeout=None):
+        """
+        Result of a job, waiting at most timeout seconds (default the pool's)
+        """
+        job_id, future = self.submit(intent, params)
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            with self._lock:
+                self.timeouts += 1
+            if not self.cancel(job_id):
+                self._abandon(job_id)
+            raise RequestTimeout(f"{intent} exceeded {timeout}s")
+        except CancelledError:
+            raise RequestTimeout(f"{intent} was cancelled")
+        except BrokenProcessPool:
+            raise ServerBusy(f"{intent} was dropped when its workers were recycled")
+        finally:
+            metrics.observe('serving.job', time.perf_counter() - started, intent=intent)
+
+    def _abandon(self, job_id):
+        """
+        Record a timed-out job that is still running; recycle the workers
+        once recycle_after abandoned jobs occupy them
+        """
+        with self._lock:
+            if job_id not in self._jobs:
+                return
+            self._abandoned.add(job_id)
+            if len(self._abandoned) < self.recycle_after:
+                return
+            self._abandoned.clear()
+            self.recycled += 1
+            previous, self._executor = self._executor, self._start()
+        metrics.increment('worker_recycles')
+        # ProcessPoolExecutor cannot stop a running call, so its processes are
+        # terminated; outside the lock, as cancelling runs the _done callbacks
+        processes = list((previous._processes or {}).values())
+        previous.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def reload(self, snapshot_path=None):
+        """
+        Replace the workers with ones opened on a (new) snapshot
+
+        Jobs already submitted finish on the old workers, and abandoned
+        ones no longer count against the new workers.
+        """
+        with self._lock:
+            self.snapshot_path = snapshot_path or self.snapshot_path
+            previous, self._executor = self._executor, self._start()
+            self._abandoned.clear()
+        previous.shutdown(wait=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'pending': len(self._jobs),
+                'max_pending': self.max_pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'cancelled': self.cancelled,
+                'abandoned': len(self._abandoned),
+                'recycled': self.recycled
+            }
+
+    def close(self):
+        with self._lock:
+            executor = self._executor
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class QueryServer:
+    """
+    Answers questions for many concurrent callers
+
+    The HTTP front end (stdlib ThreadingHTTPServer) rejects work beyond the
+    pool's max_pending with 503 and answers 504 when a request exceeds its
+    timeout. The parent navigator routes questions and serves its response cache;
+    routed graph jobs go to the WorkerPool, AQL templates and agent queries
+    run in the parent on the request thread.
+    """
+    def __init__(self, navigator, pool):
+        self.navigator = navigator
+        self.pool = pool
+
+    def answer(self, query, timeout=None):
+        nav = self.navigator
+        routed = nav.router.route(query)
+        if routed is None or routed[0] not in POOL_INTENTS:
+            return nav.process_query(query)
+
+        response = nav.response_cache.get(query, nav.graph_version)
+        metrics.increment('response_cache', result='miss' if response is None else 'hit')
+        if response is None:
+            response = self.pool.run(*routed, timeout=timeout)
+            if not (isinstance(response, dict) and 'error' in response):
+                nav.response_cache.put(query, response, nav.graph_version)
+        return response
+
+    def analyze(self, intent, params=None, timeout=None):
+        if intent in POOL_INTENTS:
+            return self.pool.run(intent, params, timeout=timeout)
+        return self.navigator.run_intent(intent, params)
+
+    def serve(self, port=DEFAULT_PORT, host='0.0.0.0'):
+        """
+        Serve the HTTP API from a daemon thread; returns the server
+
+        POST /query {"query", "timeout"?}, POST /analyze {"intent",
+        "params"?, "timeout"?} and POST /visualize {"kind", ...visualize
+        options, "timeout"?} answer {"result": ...}; GET /health and
+        GET /stats report pool state. Visualizations are summarized in the
+        worker, so only the bounded summary crosses the process boundary.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status, payload, headers=()):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = self.path.rstrip('/')
+                if path == '/health':
+                    self._send(200, {'status': 'ok', 'graph_version': server.navigator.graph_version})
+                elif path == '/stats':
+                    self._send(200, {'pool': server.pool.stats(),
+                                     'response_cache': server.navigator.response_cache.stats()})
+                else:
+                    self._send(404, {'error': 'Not found'})
+
+            def do_POST(self):
+                path = self.path.rstrip('/')
+                if path not in ('/query', '/analyze', '/visualize'):
+                    self._send(404, {'error': 'Not found'})
+                    return
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                    timeout = request.get('timeout')
+                    with metrics.span('serving.request', path=path):
+                        if path == '/query':
+                            result = server.answer(request['query'], timeout)
+                        elif path == '/visualize':
+                            options = {k: v for k, v in request.items() if k != 'timeout'}
+                            if 'kind' not in options:
+                                raise KeyError('kind')
+                            result = server.analyze('visualize', options, timeout)
+                        else:
+                            result = server.analyze(request['intent'], request.get('params'), timeout)
+                except (KeyError, ValueError, TypeError) as e:
+                    self._send(400, {'error': f"Bad request: {str(e)}"})
+                except ServerBusy as e:
+                    self._send(503, {'error': str(e)}, headers=[('Retry-After', '1')])
+                except RequestTimeout as e:
+                    self._send(504, {'error': str(e)})
+                except Exception as e:
+                    self._send(500, {'error': str(e)})
+                else:
+                    self._send(200, {'result': to_json(result)})
+
+            def log_message(self, *args):
+                pass
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, daemon=True, name='medgraph-serving').start()
+        return httpd
+
+
+def to_json(value):
+    """
+    JSON-compatible form of a tool result
+
+    Dicts with non-string keys (e.g. treatment patterns keyed by tuples)
+    become lists of [key, value] pairs.
+    """
+    if isinstance(value, dict):
+        if all(isinstance(k, str) for k in value):
+            return {k: to_json(v) for k, v in value.items()}
+        return [[to_json(k), to_json(v)] for k, v in value.items()]
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [to_json(v) for v in value]
+    if hasattr(value, 'item'):
+        # NumPy scalars
+        return value.item()
+    return value
+
+
+def main():
+    """
+    Serve concurrent graph queries over HTTP from a worker pool
+
+    Usage:
+        python -m src.backend.serving --port 8000 --snapshot /var/lib/medgraph/snapshot
+    """
+    parser = argparse.ArgumentParser(
+        description="Serve concurrent graph queries over HTTP from a worker pool")
+    parser.add_argument('--port', type=int, default=int(os.environ.get('MEDGRAPH_PORT', DEFAULT_PORT)))
+    parser.add_argument('--snapshot', default=os.environ.get('MEDGRAPH_SNAPSHOT_DIR', '/tmp/medgraph-snapshot'))
+    parser.add_argument('--workers', type=int, default=None, help='Default: one per core')
+    parser.add_argument('--max-pending', type=int, default=None)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_REQUEST_TIMEOUT)
+    args = parser.parse_args()
+
+    from src.backend.graph_navigator import get_navigator
+
+    if os.environ.get('MEDGRAPH_METRICS_PORT'):
+        metrics.serve(int(os.environ['MEDGRAPH_METRICS_PORT']))
+    navigator = get_navigator()
+    # Opens the snapshot, or loads from ArangoDB and writes it for the workers
+    if not navigator.load_synthea_data(snapshot_path=args.snapshot):
+        raise SystemExit("Could not load the graph")
+    pool = WorkerPool(args.snapshot, workers=args.workers, max_pending=args.max_pending,
+                      timeout=args.timeout)
+    pool.warm()
+    print(f"Started {pool.workers} workers on {args.snapshot}")
+    httpd = QueryServer(navigator, pool).serve(args.port)
+    print(f"Serving on port {args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        httpd.shutdown()
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
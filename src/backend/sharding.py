@@ -0,0 +1,221 @@
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from src.backend.csr_graph import document_key
+from src.backend.instrumentation import metrics
+from src.backend.medical_analyzer import patient_node
+
+# Analyzer methods a shard answers
+SHARD_METHODS = frozenset({
+    'analyze_treatment_patterns', 'risk_factor_counts', 'patient_profile', 'similar_to_profile',
+    'shard_stats'
+})
+
+
+def _crc32c_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+# CRC-32C (Castagnoli) lookup table, the checksum AQL's CRC32() computes
+_CRC32C_TABLE = _crc32c_table()
+
+# AQL filter matching shard_of, so a shard's rows are selected server-side:
+# CRC32() returns unpadded hex, which is summed back into a number
+SHARD_FILTER = """
+    LET shard_hash = CRC32(TO_STRING(doc[@shard_field]))
+    LET shard_value = SUM(
+        FOR i IN 0..LENGTH(shard_hash) - 1
+        RETURN FIND_FIRST("0123456789ABCDEF", SUBSTRING(shard_hash, i, 1)) * POW(16, LENGTH(shard_hash) - 1 - i)
+    )
+    FILTER shard_value % @num_shards == @shard
+"""
+
+
+def crc32c(data):
+    """
+    CRC-32C of bytes, as returned (in hex) by AQL's CRC32()
+    """
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc = _CRC32C_TABLE[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+def shard_of(patient_id, num_shards):
+    """
+    Shard holding a patient: CRC-32C of its key, stable across processes and
+    hosts and computable in AQL (SHARD_FILTER)
+    """
+    return crc32c(str(patient_id).encode('utf-8')) % num_shards
+
+
+def _load_shard(database_factory, shard, num_shards, snapshot_path):
+    from src.backend.graph_navigator import MedGraphNavigator
+
+    navigator = MedGraphNavigator(database=database_factory())
+    if not navigator.load_synthea_data(shard=(shard, num_shards), snapshot_path=snapshot_path):
+        raise RuntimeError(f"Shard {shard}/{num_shards} could not load its graph")
+    return navigator
+
+
+def _call(navigator, method, args, kwargs):
+    if method not in SHARD_METHODS:
+        raise ValueError(f"Method {method} is not answered by shards")
+    if method == 'shard_stats':
+        return {
+            'patients': len(navigator.analyzer.index.nodes_of_type('patient')),
+            'nodes': navigator.graph.number_of_nodes(),
+            'edges': navigator.graph.number_of_edges(),
+            'pid': os.getpid()
+        }
+    return getattr(navigator.analyzer, method)(*args, **kwargs)
+
+
+class InlineShard:
+    """
+    Shard loaded and queried in the calling process
+    """
+    def __init__(self, database_factory, shard, num_shards, snapshot_path=None):
+        self.shard = shard
+        self.navigator = _load_shard(database_factory, shard, num_shards, snapshot_path)
+
+    def submit(self, method, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(_call(self.navigator, method, args, kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        pass
+
+
+# Navigator of the shard owned by this worker process
+_shard_navigator = None
+
+
+def _init_process_shard(database_factory, shard, num_shards, snapshot_path):
+    global _shard_navigator
+    _shard_navigator = _load_shard(database_factory, shard, num_shards, snapshot_path)
+
+
+def _run_on_shard(method, args, kwargs):
+    return _call(_shard_navigator, method, args, kwargs)
+
+
+class ProcessShard:
+    """
+    Shard loaded in its own spawned process, which keeps its graph between calls
+
+    database_factory must be picklable (e.g. connect_database or a
+    functools.partial); the process opens its own connection with it.
+    """
+    def __init__(self, database_factory, shard, num_shards, snapshot_path=None):
+        self.shard = shard
+        self._executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_process_shard, initargs=(database_factory, shard, num_shards, snapshot_path))
+
+    def submit(self, method, *args, **kwargs):
+        return self._executor.submit(_run_on_shard, method, args, kwargs)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ShardCoordinator:
+    """
+    Fans MedicalAnalyzer queries out to patient shards and merges the results
+
+    Patients are hash-partitioned (shard_of); a shard holds its patients and
+    everything reached from them (encounters, conditions, medications,
+    procedures), so it loads, indexes and analyzes independently. Shards run
+    in local processes (ProcessShard) or in-process (InlineShard); anything
+    with the same submit() method, e.g. a client for a remote node, works.
+    Pattern counts and risk factor counts are additive over disjoint patient
+    sets, so merged results equal the single-graph ones. Similarity fetches
+    the query patient's profile from its owning shard, asks every shard for
+    its local top-k and keeps the global top-k.
+    """
+    def __init__(self, shards):
+        self.shards = list(shards)
+
+    @classmethod
+    def local(cls, database_factory, num_shards, processes=True, snapshot_dir=None):
+        """
+        num_shards shards of one database, each in its own process (or inline)
+
+        With snapshot_dir every shard keeps a snapshot in its own subdirectory.
+        """
+        shard_class = ProcessShard if processes else InlineShard
+        return cls([shard_class(database_factory, i, num_shards,
+                                os.path.join(snapshot_dir, f"shard-{i}") if snapshot_dir else None)
+                    for i in range(num_shards)])
+
+    @property
+    def num_shards(self):
+        return len(self.shards)
+
+    def owner(self, patient_id):
+        return self.shards[shard_of(document_key(patient_node(patient_id))[1], self.num_shards)]
+
+    def _gather(self, method, *args, **kwargs):
+        with metrics.span('sharding.gather', method=method, shards=self.num_shards):
+            futures = [shard.submit(method, *args, **kwargs) for shard in self.shards]
+            return [future.result() for future in futures]
+
+    def stats(self):
+        """
+        Patients, nodes and edges held by each shard
+        """
+        return self._gather('shard_stats')
+
+    def analyze_treatment_patterns(self, condition, start=None, end=None):
+        """
+        Treatment pattern counts summed over shards, most common first
+        """
+        merged = {}
+        for patterns in self._gather('analyze_treatment_patterns', condition, start, end):
+            for pattern, count in patterns.items():
+                merged[pattern] = merged.get(pattern, 0) + count
+        return dict(sorted(merged.items(), key=lambda item: (-item[1], item[0])))
+
+    def predict_risk_factors(self, condition, within_days=None):
+        """
+        Risk ratios from shard counts summed over the whole population
+        """
+        from src.backend.medical_analyzer import risk_ratios
+
+        merged = {'cases': 0, 'factors': {}, 'population': {}, 'patients': 0}
+        for counts in self._gather('risk_factor_counts', condition, within_days):
+            merged['cases'] += counts['cases']
+            merged['patients'] += counts['patients']
+            for key in ('factors', 'population'):
+                for name, count in counts[key].items():
+                    merged[key][name] = merged[key].get(name, 0) + count
+        return risk_ratios(merged)
+
+    def find_similar_patients(self, patient_id, num_similar=5):
+        """
+        Global top num_similar (patient, score) pairs, highest score first
+
+        Ties are broken by patient key, since load order differs per shard.
+        """
+        conditions, medications = self.owner(patient_id).submit('patient_profile', patient_id).result()
+        candidates = []
+        for top in self._gather('similar_to_profile', conditions, medications, num_similar,
+                                exclude=(patient_node(patient_id),)):
+            candidates.extend(top)
+        return sorted(candidates, key=lambda item: (-item[1], item[0]))[:num_similar]
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
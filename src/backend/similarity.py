@@ -0,0 +1,138 @@
+import numpy as np
+from scipy import sparse
+
+# Query rows scored per block, bounding the dense score buffer to
+# QUERY_BLOCK_SIZE x num_patients floats
+QUERY_BLOCK_SIZE = 8
+
+
+class PatientSimilarityIndex:
+    """
+    Patient feature matrices for exact batch Jaccard similarity
+
+    Conditions and medications are encoded as sparse binary patient x code
+    matrices, built once. Jaccard scores for a block of query patients come
+    from one sparse product per feature (|A & B| = A . B, |A | B| =
+    |A| + |B| - |A & B|) and the top-k are selected with argpartition.
+    """
+    def __init__(self, patient_ids, condition_matrix, medication_matrix, vocabularies=None):
+        self.patient_ids = patient_ids
+        self.patient_rows = {p: row for row, p in enumerate(patient_ids)}
+        self.condition_matrix = condition_matrix
+        self.medication_matrix = medication_matrix
+        # (condition, medication) name -> column maps, for scoring outside profiles
+        self.vocabularies = vocabularies
+        self.condition_sizes = np.asarray(condition_matrix.sum(axis=1)).ravel()
+        self.medication_sizes = np.asarray(medication_matrix.sum(axis=1)).ravel()
+
+    @classmethod
+    def from_feature_sets(cls, patient_ids, condition_sets, medication_sets):
+        """
+        Build from parallel lists of patient ids and feature sets
+        """
+        condition_matrix, condition_vocabulary = _binary_matrix(condition_sets)
+        medication_matrix, medication_vocabulary = _binary_matrix(medication_sets)
+        return cls(list(patient_ids), condition_matrix, medication_matrix,
+                   (condition_vocabulary, medication_vocabulary))
+
+    @classmethod
+    def from_index(cls, index):
+        """
+        Build the feature matrices from a GraphIndex
+        """
+        patient_ids = list(index.nodes_of_type('patient'))
+        return cls.from_feature_sets(
+            patient_ids,
+            [{index.description(c) for c in index.patient_conditions(p)} for p in patient_ids],
+            [{index.description(m) for m in index.patient_medications(p)} for p in patient_ids])
+
+    def scores(self, rows):
+        """
+        Combined similarity of each query row against every patient
+        """
+        condition_scores = _jaccard(self.condition_matrix, self.condition_sizes, rows)
+        medication_scores = _jaccard(self.medication_matrix, self.medication_sizes, rows)
+        return (condition_scores + medication_scores) / 2
+
+    def top_k(self, patient_ids, num_similar=5):
+        """
+        Top num_similar (patient, score) pairs for each query patient
+        """
+        rows = np.array([self.patient_rows[p] for p in patient_ids], dtype=np.int64)
+        num_similar = min(num_similar, len(self.patient_ids) - 1)
+        results = {}
+        if num_similar <= 0:
+            return {p: [] for p in patient_ids}
+
+        for start in range(0, len(rows), QUERY_BLOCK_SIZE):
+            block = rows[start:start + QUERY_BLOCK_SIZE]
+            scores = self.scores(block)
+            # Never return the query patient itself
+            scores[np.arange(len(block)), block] = -np.inf
+
+            candidates = np.argpartition(-scores, num_similar - 1, axis=1)[:, :num_similar]
+            for i, row in enumerate(block):
+                top = candidates[i]
+                # Highest score first, ties in load order
+                top = top[np.lexsort((top, -scores[i, top]))]
+                results[self.patient_ids[row]] = [
+                    (self.patient_ids[j], float(scores[i, j])) for j in top]
+        return results
+
+    def profile_top_k(self, conditions, medications, num_similar=5, exclude=()):
+        """
+        Top num_similar (patient, score) pairs for a profile given by name
+
+        The profile need not be one of the indexed patients (e.g. a patient
+        held by another shard); names outside the vocabularies still count
+        towards its set sizes. Patients in exclude are never returned.
+        """
+        # Same float32 arithmetic as _jaccard, so scores match top_k exactly
+        feature_scores = []
+        for names, matrix, sizes, vocabulary in (
+                (set(conditions), self.condition_matrix, self.condition_sizes, self.vocabularies[0]),
+                (set(medications), self.medication_matrix, self.medication_sizes, self.vocabularies[1])):
+            query = np.zeros(matrix.shape[1], dtype=np.float32)
+            query[[vocabulary[n] for n in names if n in vocabulary]] = 1
+            intersection = np.asarray(matrix @ query)
+            union = np.float32(len(names)) + sizes - intersection
+            feature_scores.append(np.divide(intersection, union, out=np.zeros_like(intersection),
+                                            where=union > 0))
+        scores = (feature_scores[0] + feature_scores[1]) / 2
+        for patient_id in exclude:
+            if patient_id in self.patient_rows:
+                scores[self.patient_rows[patient_id]] = -np.inf
+
+        num_similar = min(num_similar, int(np.isfinite(scores).sum()))
+        if num_similar <= 0:
+            return []
+        top = np.argpartition(-scores, num_similar - 1)[:num_similar]
+        top = top[np.lexsort((top, -scores[top]))]
+        return [(self.patient_ids[j], float(scores[j])) for j in top]
+
+
+def _binary_matrix(feature_sets):
+    """
+    (sparse CSR matrix, feature -> column) with a 1 for every (row, feature) membership
+    """
+    vocabulary = {}
+    indptr = [0]
+    indices = []
+    for features in feature_sets:
+        indices.extend(vocabulary.setdefault(f, len(vocabulary)) for f in features)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    return sparse.csr_matrix((data, indices, indptr),
+                             shape=(len(feature_sets), max(len(vocabulary), 1))), vocabulary
+
+
+def _jaccard(matrix, sizes, rows):
+    """
+    Jaccard similarity of the given rows against all rows; 0 when both sets are empty
+    """
+    # Sparse x small dense query block gives a dense num_patients x block result
+    intersection = np.ascontiguousarray(np.asarray(matrix @ matrix[rows].T.toarray()).T)
+    union = sizes[rows][:, None] + sizes[None, :] - intersection
+    np.divide(intersection, union, out=intersection, where=union > 0)
+    intersection[union == 0] = 0
+    return intersection
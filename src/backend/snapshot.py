@@ -0,0 +1,160 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from src.backend.csr_graph import CSRGraph
+
+SNAPSHOT_FORMAT_VERSION = 3
+MANIFEST_NAME = 'manifest.json'
+
+# Arrays written as .npy files and reopened with np.load(mmap_mode='r')
+ARRAY_NAMES = (
+    'node_types', 'description_codes', 'node_days', 'indptr', 'indices', 'edge_types',
+    'edge_outgoing', 'key_offsets', 'key_data', 'key_order'
+)
+
+
+class StringTable:
+    """
+    Read-only sequence of strings stored as a UTF-8 blob plus offsets
+
+    Backed by memory-mapped arrays so opening a snapshot does not decode every
+    node key; strings are decoded on access. ``order`` lists positions in
+    sorted string order so lookups are a binary search rather than a dict
+    built over every key.
+    """
+    def __init__(self, offsets, data, order):
+        self.offsets = offsets
+        self.data = data
+        self.order = order
+
+    @classmethod
+    def from_strings(cls, strings):
+        strings = list(strings)
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        order = np.array(sorted(range(len(strings)), key=strings.__getitem__), dtype=np.int64)
+        return cls(offsets, data, order)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def lookup(self, key):
+        """
+        Position of a string, by binary search over the sorted order
+        """
+        low, high = 0, len(self.order)
+        while low < high:
+            mid = (low + high) // 2
+            if self[int(self.order[mid])] < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(self.order) and self[int(self.order[low])] == key:
+            return int(self.order[low])
+        raise KeyError(key)
+
+    def __iter__(self):
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            yield data[start:end].decode('utf-8')
+
+
+class SnapshotError(Exception):
+    """
+    Raised when a snapshot is missing, incompatible or out of date
+    """
+
+
+def save_snapshot(graph, path, revisions=None):
+    """
+    Write a versioned binary snapshot of a CSRGraph to a directory
+
+    revisions maps collection names to their ArangoDB revision at load time
+    and is used to invalidate the snapshot later.
+    """
+    os.makedirs(path, exist_ok=True)
+    keys = graph.keys if isinstance(graph.keys, StringTable) else StringTable.from_strings(graph.keys)
+    arrays = {
+        'node_types': graph.node_types,
+        'description_codes': graph.description_codes,
+        'node_days': graph.node_days,
+        'indptr': graph.indptr,
+        'indices': graph.indices,
+        'edge_types': graph.edge_types,
+        'edge_outgoing': graph.edge_outgoing,
+        'key_offsets': keys.offsets,
+        'key_data': keys.data,
+        'key_order': keys.order
+    }
+    for name, array in arrays.items():
+        # Write a new file and rename it over the old one, so processes that
+        # still map the previous snapshot keep reading intact pages
+        target = os.path.join(path, f"{name}.npy")
+        with open(target + '.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(target + '.tmp', target)
+
+    manifest = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'created': time.time(),
+        'num_nodes': graph.number_of_nodes(),
+        'num_edges': graph.number_of_edges(),
+        'descriptions': list(graph.descriptions),
+        'revisions': revisions or {}
+    }
+    # Manifest last, atomically, so a partial write is never mistaken for a snapshot
+    tmp_path = os.path.join(path, MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(path, MANIFEST_NAME))
+    return manifest
+
+
+def read_manifest(path):
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        raise SnapshotError(f"No snapshot at {path}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(
+            f"Snapshot format {manifest.get('format_version')} != {SNAPSHOT_FORMAT_VERSION}")
+    return manifest
+
+
+def load_snapshot(path, document_loader=None, expected_revisions=None):
+    """
+    Open a snapshot as a CSRGraph whose arrays are memory-mapped read-only
+
+    Pages are shared between processes that open the same snapshot. Raises
+    SnapshotError if expected_revisions differ from the recorded ones.
+    """
+    manifest = read_manifest(path)
+    if expected_revisions is not None and manifest['revisions'] != expected_revisions:
+        raise SnapshotError("Snapshot is stale: collection revisions changed")
+
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+              for name in ARRAY_NAMES}
+    return CSRGraph(
+        StringTable(arrays['key_offsets'], arrays['key_data'], arrays['key_order']),
+        arrays['node_types'],
+        arrays['description_codes'],
+        manifest['descriptions'],
+        arrays['indptr'],
+        arrays['indices'],
+        arrays['edge_types'],
+        document_loader=document_loader,
+        node_days=arrays['node_days'],
+        edge_outgoing=arrays['edge_outgoing']
+    )
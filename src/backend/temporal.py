@@ -0,0 +1,44 @@
+from datetime import date, datetime
+
+import numpy as np
+
+# Integer day stored for nodes without a (parseable) date
+NO_DAY = int(np.iinfo(np.int32).min)
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def parse_day(value):
+    """
+    Days since 1970-01-01 for an ISO date string, date or datetime, else None
+
+    Only the date part of timestamps is used ("2024-03-01T10:00:00Z" is day
+    19783). Integers are taken as days already.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.toordinal() - _EPOCH_ORDINAL
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal() - _EPOCH_ORDINAL
+    except ValueError:
+        return None
+
+
+def format_day(day):
+    """
+    ISO date string for a day number
+    """
+    return date.fromordinal(day + _EPOCH_ORDINAL).isoformat()
+
+
+def window_bounds(start=None, end=None):
+    """
+    (start, end) day numbers of a half-open window; None leaves a side open
+    """
+    return (None if start is None else parse_day(start),
+            None if end is None else parse_day(end))
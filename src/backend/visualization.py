@@ -0,0 +1,176 @@
+import numpy as np
+
+from src.backend.csr_graph import NODE_TYPES, UNKNOWN
+from src.backend.temporal import format_day
+
+# Bounds that keep payloads a fixed size whatever the graph size
+DEFAULT_TOP_K = 50
+DEFAULT_MAX_POINTS = 500
+DEFAULT_MAX_COMMUNITIES = 50
+MAX_PAGE_SIZE = 1000
+# Members listed per community supernode
+SUPERNODE_MEMBERS = 5
+
+FREQUENCIES = ('day', 'week', 'month')
+
+
+def ranked_page(scores, page=0, page_size=DEFAULT_TOP_K, node_type=None):
+    """
+    One page of nodes ranked by score, highest first
+
+    Only the first (page + 1) * page_size entries are ever sorted, with an
+    argpartition over the rest, so deep graphs cost one linear pass.
+    node_type is a callable mapping a key to its type, used to label items.
+    """
+    page_size = min(page_size, MAX_PAGE_SIZE)
+    keys = list(scores)
+    values = np.fromiter(scores.values(), dtype=np.float64, count=len(keys))
+    end = min((page + 1) * page_size, len(keys))
+    start = min(page * page_size, end)
+    if end > 0:
+        head = np.argpartition(-values, end - 1)[:end] if end < len(keys) else np.arange(len(keys))
+        # Highest score first, ties in input order
+        head = head[np.lexsort((head, -values[head]))]
+    else:
+        head = np.arange(0)
+
+    items = []
+    for i in head[start:end]:
+        item = {'node': keys[i], 'value': float(values[i])}
+        if node_type is not None:
+            item['type'] = node_type(keys[i])
+        items.append(item)
+    return {
+        'items': items,
+        'page': page,
+        'page_size': page_size,
+        'total': len(keys),
+        'next_page': page + 1 if end < len(keys) else None,
+        # What the page leaves out, so totals stay visible
+        'other': {'count': len(keys) - end, 'value': float(values.sum() - values[head].sum())}
+    }
+
+
+def community_supernodes(graph, communities, max_communities=DEFAULT_MAX_COMMUNITIES):
+    """
+    Community-level graph of a CSRGraph partition
+
+    Each of the max_communities largest communities becomes a supernode with
+    its size, node type counts, internal edge count and highest-degree
+    members; smaller ones are merged into one "other" supernode. Edges
+    between supernodes carry the number of graph edges they aggregate.
+    """
+    num_nodes = graph.number_of_nodes()
+    ordered = sorted(communities, key=len, reverse=True)
+    labels = np.full(num_nodes, -1, dtype=np.int64)
+    for label, members in enumerate(ordered):
+        ids = [graph.node_id(key) for key in members]
+        labels[ids] = min(label, max_communities)
+    num_groups = min(len(ordered), max_communities + 1)
+
+    indptr = np.asarray(graph.indptr)
+    degrees = np.diff(indptr)
+    rows = np.repeat(np.arange(num_nodes), degrees)
+    source, target = labels[rows], labels[np.asarray(graph.indices)]
+    valid = (source >= 0) & (target >= 0)
+    source, target = source[valid], target[valid]
+
+    internal = np.bincount(source[source == target], minlength=num_groups) // 2
+    between = source < target
+    pairs, weights = np.unique(source[between] * num_groups + target[between], return_counts=True)
+
+    node_types = np.asarray(graph.node_types, dtype=np.int64)
+    typed = (labels >= 0) & (node_types != UNKNOWN)
+    type_counts = np.bincount(labels[typed] * len(NODE_TYPES) + node_types[typed],
+                              minlength=num_groups * len(NODE_TYPES)).reshape(num_groups, len(NODE_TYPES))
+    sizes = np.bincount(labels[labels >= 0], minlength=num_groups)
+
+    # Highest-degree members first within each community
+    members = np.flatnonzero(labels >= 0)
+    members = members[np.lexsort((-degrees[members], labels[members]))]
+    starts = np.searchsorted(labels[members], np.arange(num_groups))
+
+    nodes = []
+    for group in range(num_groups):
+        top = members[starts[group]:starts[group] + min(SUPERNODE_MEMBERS, sizes[group])]
+        nodes.append({
+            'id': group if group < max_communities else 'other',
+            'size': int(sizes[group]),
+            'communities': 1 if group < max_communities else len(ordered) - max_communities,
+            'internal_edges': int(internal[group]),
+            'types': {NODE_TYPES[t]: int(n) for t, n in enumerate(type_counts[group]) if n},
+            'top_members': [graph.keys[int(i)] for i in top]
+        })
+    edges = [{'source': nodes[int(p) // num_groups]['id'], 'target': nodes[int(p) % num_groups]['id'],
+              'weight': int(w)} for p, w in zip(pairs, weights)]
+    return {'nodes': nodes, 'edges': edges, 'communities': len(ordered)}
+
+
+def bucket_days(days, freq='day'):
+    """
+    First day of the day, ISO week (Monday) or month bucket of each day
+    """
+    days = np.asarray(days, dtype=np.int64)
+    if freq == 'day':
+        return days
+    if freq == 'week':
+        # 1970-01-01 was a Thursday
+        return days - (days + 3) % 7
+    if freq == 'month':
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    raise ValueError(f"freq must be one of {FREQUENCIES}")
+
+
+def time_series(days, values=None, freq='day', agg='sum'):
+    """
+    (bucket days, aggregated values) for values observed on days
+
+    agg is 'sum', 'count' or 'mean'; values default to 1 per observation.
+    """
+    buckets, inverse = np.unique(bucket_days(days, freq), return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(buckets)).astype(np.float64)
+    if agg == 'count' or values is None:
+        return buckets, counts
+    sums = np.bincount(inverse, weights=np.asarray(values, dtype=np.float64), minlength=len(buckets))
+    if agg == 'sum':
+        return buckets, sums
+    if agg == 'mean':
+        return buckets, sums / counts
+    raise ValueError("agg must be 'sum', 'count' or 'mean'")
+
+
+def lttb(x, y, threshold):
+    """
+    Indices of the points Largest-Triangle-Three-Buckets keeps
+
+    The first and last points are always kept; from each of threshold - 2
+    equal buckets the point forming the largest triangle with the previous
+    kept point and the next bucket's average is chosen, preserving peaks.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for b in range(threshold - 2):
+        start, end = edges[b], edges[b + 1]
+        next_end = edges[b + 2] if b + 2 < len(edges) else n
+        next_x = x[end:next_end].mean() if next_end > end else x[-1]
+        next_y = y[end:next_end].mean() if next_end > end else y[-1]
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[b + 1] = previous
+    return selected
+
+
+def series_points(buckets, values, max_points=DEFAULT_MAX_POINTS):
+    """
+    [{'date', 'value'}] points, downsampled with LTTB beyond max_points
+    """
+    keep = lttb(buckets, values, max_points)
+    return [{'date': format_day(int(buckets[i])), 'value': float(values[i])} for i in keep]
@@ -3,11 +3,20 @@ import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, Responsi
 import { Card, CardHeader, CardTitle, CardContent } from '@/components/ui/card';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 
-const MedGraphViz = ({ data, vizType }) => {
+// `data` is either a raw result array/object or a summary from the backend
+// (`navigator.visualize` / POST /visualize), which is already bucketed,
+// downsampled and paginated so the browser only formats bounded payloads.
+const MedGraphViz = ({ data, vizType, onPageChange }) => {
   const [activeTab, setActiveTab] = useState('graph');
+  const summary = data && !Array.isArray(data) && data.vizType ? data : null;
+  const type = summary ? summary.vizType : vizType;
 
   // Format data for time series visualization
   const formatTimeSeriesData = (data) => {
+    if (summary) {
+      // Bucket start dates arrive as ISO strings; no per-point Date parsing
+      return summary.points;
+    }
     return data.map(item => ({
       date: new Date(item.date).toLocaleDateString(),
       value: item.value,
@@ -17,12 +26,24 @@ const MedGraphViz = ({ data, vizType }) => {
 
   // Format data for distribution visualization
   const formatDistributionData = (data) => {
+    if (summary) {
+      return summary.items.map(item => ({
+        category: item.node,
+        count: item.value
+      }));
+    }
     return Object.entries(data).map(([key, value]) => ({
       category: key,
       count: value
     }));
   };
 
+  // Community supernodes, largest first
+  const formatSupernodeData = (data) => data.nodes.map(node => ({
+    category: node.id === 'other' ? `other (${node.communities})` : `community ${node.id}`,
+    count: node.size
+  }));
+
   const renderTimeSeriesChart = (data) => (
     <div className="w-full h-96">
       <ResponsiveContainer>
@@ -32,27 +53,43 @@ const MedGraphViz = ({ data, vizType }) => {
           <YAxis />
           <Tooltip />
           <Legend />
-          <Line type="monotone" dataKey="value" stroke="#8884d8" />
+          <Line type="monotone" dataKey="value" stroke="#8884d8" isAnimationActive={false} />
         </LineChart>
       </ResponsiveContainer>
     </div>
   );
 
-  const renderDistributionChart = (data) => (
+  const renderBarChart = (rows) => (
     <div className="w-full h-96">
       <ResponsiveContainer>
-        <BarChart data={formatDistributionData(data)}>
+        <BarChart data={rows}>
           <CartesianGrid strokeDasharray="3 3" />
           <XAxis dataKey="category" />
           <YAxis />
           <Tooltip />
           <Legend />
-          <Bar dataKey="count" fill="#82ca9d" />
+          <Bar dataKey="count" fill="#82ca9d" isAnimationActive={false} />
         </BarChart>
       </ResponsiveContainer>
     </div>
   );
 
+  const renderDistributionChart = (data) => renderBarChart(formatDistributionData(data));
+
+  const renderPager = () => summary && summary.page !== undefined && onPageChange && (
+    <div className="flex justify-between items-center mt-2">
+      <button disabled={summary.page === 0} onClick={() => onPageChange(summary.page - 1)}>
+        Previous
+      </button>
+      <span>
+        {summary.page * summary.page_size + 1}–{summary.page * summary.page_size + summary.items.length} of {summary.total}
+      </span>
+      <button disabled={summary.next_page === null} onClick={() => onPageChange(summary.next_page)}>
+        Next
+      </button>
+    </div>
+  );
+
   return (
     <Card className="w-full">
       <CardHeader>
@@ -65,17 +102,19 @@ const MedGraphViz = ({ data, vizType }) => {
             <TabsTrigger value="timeSeries">Time Series</TabsTrigger>
             <TabsTrigger value="distribution">Distribution</TabsTrigger>
           </TabsList>
-          
+
           <TabsContent value="graph">
-            {vizType === 'timeSeries' && renderTimeSeriesChart(data)}
+            {type === 'graph' && renderBarChart(formatSupernodeData(summary))}
+            {type === 'timeSeries' && renderTimeSeriesChart(data)}
           </TabsContent>
-          
+
           <TabsContent value="timeSeries">
-            {vizType === 'timeSeries' && renderTimeSeriesChart(data)}
+            {type === 'timeSeries' && renderTimeSeriesChart(data)}
           </TabsContent>
-          
+
           <TabsContent value="distribution">
-            {vizType === 'distribution' && renderDistributionChart(data)}
+            {type === 'distribution' && renderDistributionChart(data)}
+            {type === 'distribution' && renderPager()}
           </TabsContent>
         </Tabs>
       </CardContent>
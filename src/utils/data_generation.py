@@ -1,11 +1,20 @@
 import json
+import os
 import random
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
 
-def generate_demo_data():
+import numpy as np
+
+def generate_demo_data(num_patients=100, seed=None):
     """
     Generate sample medical data for demonstration purposes
+
+    With a seed the data is reproducible, dates included (they count back
+    from REFERENCE_DATE instead of today).
     """
+    rng = random.Random(seed)
+    today = datetime.now() if seed is None else datetime.combine(REFERENCE_DATE, datetime.min.time())
     patients = []
     conditions = []
     medications = []
@@ -34,30 +43,30 @@ def generate_demo_data():
         "Amoxicillin"
     ]
     
-    # Generate 100 sample patients
-    for i in range(100):
+    # Generate sample patients
+    for i in range(num_patients):
         patient_id = f"P{i+1}"
         patient = {
             "_key": patient_id,
-            "age": random.randint(25, 85),
-            "gender": random.choice(["M", "F"]),
+            "age": rng.randint(25, 85),
+            "gender": rng.choice(["M", "F"]),
             "location": "Slough, UK",
-            "registration_date": (datetime.now() - timedelta(days=random.randint(365, 1825))).strftime("%Y-%m-%d")
+            "registration_date": (today - timedelta(days=rng.randint(365, 1825))).strftime("%Y-%m-%d")
         }
         patients.append(patient)
         
         # Generate conditions and medications for each patient
-        num_conditions = random.randint(2, 5)
+        num_conditions = rng.randint(2, 5)
         for _ in range(num_conditions):
-            condition = random.choice(condition_list)
-            medication = random.choice(medication_list)
+            condition = rng.choice(condition_list)
+            medication = rng.choice(medication_list)
             
             # Create encounter
             encounter_id = f"E{len(encounters)+1}"
             encounters.append({
                 "_key": encounter_id,
                 "patient_id": patient_id,
-                "date": (datetime.now() - timedelta(days=random.randint(1, 365))).strftime("%Y-%m-%d"),
+                "date": (today - timedelta(days=rng.randint(1, 365))).strftime("%Y-%m-%d"),
                 "type": "Diagnosis"
             })
             
@@ -67,7 +76,7 @@ def generate_demo_data():
                 "patient_id": patient_id,
                 "encounter_id": encounter_id,
                 "description": condition,
-                "status": random.choice(["Active", "Managed", "Resolved"])
+                "status": rng.choice(["Active", "Managed", "Resolved"])
             })
             
             # Add medication
@@ -76,7 +85,7 @@ def generate_demo_data():
                 "patient_id": patient_id,
                 "encounter_id": encounter_id,
                 "description": medication,
-                "status": random.choice(["Active", "Discontinued"])
+                "status": rng.choice(["Active", "Discontinued"])
             })
     
     return {
@@ -86,9 +95,243 @@ def generate_demo_data():
         "encounters": encounters
     }
 
+# Vocabularies for scale generation. Frequencies follow a Zipf law over the
+# list order, so the first entries dominate as in real EHR extracts.
+SCALE_CONDITIONS = [
+    "Hypertension", "Hyperlipidemia", "Type 2 Diabetes", "Obesity", "Osteoarthritis",
+    "Anxiety", "Depression", "Asthma", "Chronic Kidney Disease", "Coronary Artery Disease",
+    "COPD", "Atrial Fibrillation", "Hypothyroidism", "Gastroesophageal Reflux Disease",
+    "Migraine", "Chronic Back Pain", "Sleep Apnea", "Heart Failure", "Gout", "Anemia",
+    "Osteoporosis", "Rheumatoid Arthritis", "Psoriasis", "Epilepsy", "Stroke",
+    "Parkinson's Disease", "Alzheimer's Disease", "Multiple Sclerosis", "Hepatitis C",
+    "Lung Cancer"
+]
+
+SCALE_MEDICATIONS = [
+    "Lisinopril", "Atorvastatin", "Metformin", "Amlodipine", "Omeprazole",
+    "Levothyroxine", "Sertraline", "Albuterol", "Ibuprofen", "Metoprolol",
+    "Simvastatin", "Losartan", "Gabapentin", "Hydrochlorothiazide", "Furosemide",
+    "Warfarin", "Apixaban", "Insulin Glargine", "Fluoxetine", "Tiotropium",
+    "Allopurinol", "Prednisone", "Sumatriptan", "Alendronate", "Methotrexate",
+    "Levetiracetam", "Levodopa", "Donepezil", "Amoxicillin", "Paracetamol"
+]
+
+SCALE_PROCEDURES = [
+    "Blood Pressure Measurement", "Lipid Panel", "HbA1c Test", "Electrocardiogram",
+    "Chest X-ray", "Spirometry", "Echocardiogram", "Colonoscopy", "MRI Scan",
+    "Physical Therapy"
+]
+
+# Typical treatments per condition (indexes into SCALE_MEDICATIONS)
+CONDITION_MEDICATIONS = {
+    "Hypertension": [0, 3, 11, 13, 9], "Hyperlipidemia": [1, 10], "Type 2 Diabetes": [2, 17],
+    "Obesity": [2], "Osteoarthritis": [8, 29], "Anxiety": [6, 18], "Depression": [6, 18],
+    "Asthma": [7, 21], "Chronic Kidney Disease": [14, 11], "Coronary Artery Disease": [1, 9, 3],
+    "COPD": [19, 7, 21], "Atrial Fibrillation": [15, 16, 9], "Hypothyroidism": [5],
+    "Gastroesophageal Reflux Disease": [4], "Migraine": [22, 8], "Chronic Back Pain": [12, 8],
+    "Sleep Apnea": [], "Heart Failure": [14, 9, 0], "Gout": [20, 8], "Anemia": [],
+    "Osteoporosis": [23], "Rheumatoid Arthritis": [24, 21], "Psoriasis": [24],
+    "Epilepsy": [25], "Stroke": [16, 1], "Parkinson's Disease": [26],
+    "Alzheimer's Disease": [27], "Multiple Sclerosis": [21], "Hepatitis C": [],
+    "Lung Cancer": [21, 29]
+}
+
+DEFAULT_CHUNK_SIZE = 10000
+OUTPUT_FORMATS = ('ndjson', 'parquet', 'arango')
+GENERATED_COLLECTIONS = ('patients', 'encounters', 'conditions', 'medications', 'procedures')
+
+# Fixed reference date so output does not depend on when it was generated
+REFERENCE_DATE = date(2025, 1, 1)
+
+
+def _zipf_weights(size, exponent=1.1):
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def generate_chunk(chunk_index, chunk_size, num_patients, seed=0):
+    """
+    Records for patients [chunk_index * chunk_size, ...) as a dict of lists
+
+    Each chunk draws from its own generator seeded by (seed, chunk_index), so
+    output is identical whatever the number of workers or the chunk order.
+    Encounters per patient follow a heavy-tailed geometric law, conditions a
+    Zipf law, and each medication is a typical treatment for the encounter's
+    condition most of the time.
+    """
+    rng = np.random.default_rng([seed, chunk_index])
+    first = chunk_index * chunk_size
+    count = max(min(chunk_size, num_patients - first), 0)
+    numbers = np.arange(first + 1, first + count + 1)
+
+    ages = np.clip(rng.normal(52, 18, count).round(), 0, 100).astype(int)
+    genders = rng.choice(np.array(['M', 'F']), count)
+    registered = rng.integers(365, 3650, count)
+    encounter_counts = np.minimum(rng.geometric(0.25, count), 60)
+
+    total = int(encounter_counts.sum())
+    owners = np.repeat(numbers, encounter_counts)
+    visit = np.arange(total) - np.repeat(np.cumsum(encounter_counts) - encounter_counts, encounter_counts)
+    days_ago = rng.integers(1, 3650, total)
+    condition_codes = rng.choice(len(SCALE_CONDITIONS), total, p=_zipf_weights(len(SCALE_CONDITIONS)))
+    fallback_meds = rng.choice(len(SCALE_MEDICATIONS), total, p=_zipf_weights(len(SCALE_MEDICATIONS)))
+    has_medication = rng.random(total) < 0.8
+    typical = rng.random(total) < 0.85
+    pick = rng.random(total)
+    has_procedure = rng.random(total) < 0.3
+    procedure_codes = rng.choice(len(SCALE_PROCEDURES), total, p=_zipf_weights(len(SCALE_PROCEDURES)))
+
+    chunk = {name: [] for name in GENERATED_COLLECTIONS}
+    for i, number in enumerate(numbers.tolist()):
+        chunk['patients'].append({
+            "_key": f"P{number}",
+            "age": int(ages[i]),
+            "gender": str(genders[i]),
+            "location": "Slough, UK",
+            "registration_date": (REFERENCE_DATE - timedelta(days=int(registered[i]))).isoformat()
+        })
+
+    for j in range(total):
+        patient_id = f"P{owners[j]}"
+        suffix = f"{owners[j]}_{visit[j] + 1}"
+        encounter_id = f"E{suffix}"
+        day = (REFERENCE_DATE - timedelta(days=int(days_ago[j]))).isoformat()
+        condition = SCALE_CONDITIONS[condition_codes[j]]
+        chunk['encounters'].append({
+            "_key": encounter_id, "patient_id": patient_id, "date": day, "type": "Diagnosis"
+        })
+        chunk['conditions'].append({
+            "_key": f"C{suffix}", "patient_id": patient_id, "encounter_id": encounter_id,
+            "description": condition, "date": day, "status": "Active"
+        })
+        if has_medication[j]:
+            options = CONDITION_MEDICATIONS[condition]
+            code = (options[int(pick[j] * len(options))]
+                    if options and typical[j] else int(fallback_meds[j]))
+            chunk['medications'].append({
+                "_key": f"M{suffix}", "patient_id": patient_id, "encounter_id": encounter_id,
+                "description": SCALE_MEDICATIONS[code], "date": day, "status": "Active"
+            })
+        if has_procedure[j]:
+            chunk['procedures'].append({
+                "_key": f"PR{suffix}", "patient_id": patient_id, "encounter_id": encounter_id,
+                "description": SCALE_PROCEDURES[procedure_codes[j]], "date": day
+            })
+    return chunk
+
+
+def iter_chunks(num_patients, chunk_size=DEFAULT_CHUNK_SIZE, seed=0):
+    """
+    Stream generated records chunk by chunk in this process
+    """
+    for chunk_index in range(-(-num_patients // chunk_size)):
+        yield generate_chunk(chunk_index, chunk_size, num_patients, seed)
+
+
+def generate_dataset(num_patients, seed=0, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Whole skewed dataset in memory, in the generate_demo_data layout
+    """
+    data = {name: [] for name in GENERATED_COLLECTIONS}
+    for chunk in iter_chunks(num_patients, chunk_size, seed):
+        for name, records in chunk.items():
+            data[name].extend(records)
+    return data
+
+
+def _write_chunk(args):
+    """
+    Generate one chunk and write it as one file per collection (worker task)
+    """
+    chunk_index, chunk_size, num_patients, seed, output_dir, fmt = args
+    chunk = generate_chunk(chunk_index, chunk_size, num_patients, seed)
+    if fmt == 'arango':
+        # Edge collection for graph traversals (patient_history)
+        chunk['patient_encounters'] = [
+            {"_from": f"patients/{e['patient_id']}", "_to": f"encounters/{e['_key']}"}
+            for e in chunk['encounters']]
+
+    counts = {}
+    for name, records in chunk.items():
+        directory = os.path.join(output_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        if fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            pq.write_table(pa.Table.from_pylist(records),
+                           os.path.join(directory, f"part-{chunk_index:05d}.parquet"))
+        else:
+            with open(os.path.join(directory, f"part-{chunk_index:05d}.jsonl"), 'w') as f:
+                for record in records:
+                    f.write(json.dumps(record))
+                    f.write('\n')
+        counts[name] = len(records)
+    return counts
+
+
+def write_dataset(num_patients, output_dir, fmt='ndjson', chunk_size=DEFAULT_CHUNK_SIZE,
+                  workers=None, seed=0):
+    """
+    Generate num_patients in parallel and write them under output_dir
+
+    Worker processes each generate and write whole chunks, so memory stays
+    bounded by chunk_size per worker. fmt is 'ndjson' (one JSON document per
+    line), 'parquet' (needs pyarrow) or 'arango' (JSON lines plus a
+    patient_encounters edge collection and an arangoimport script). Returns
+    record counts per collection.
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown format {fmt}; expected one of {OUTPUT_FORMATS}")
+    if fmt == 'parquet':
+        import pyarrow  # noqa: F401  (fail before starting workers)
+
+    os.makedirs(output_dir, exist_ok=True)
+    num_chunks = -(-num_patients // chunk_size)
+    tasks = [(i, chunk_size, num_patients, seed, output_dir, fmt) for i in range(num_chunks)]
+    totals = {}
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 1 and num_chunks > 1 else None
+    try:
+        for counts in (pool.map if pool else map)(_write_chunk, tasks):
+            for name, n in counts.items():
+                totals[name] = totals.get(name, 0) + n
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if fmt == 'arango':
+        with open(os.path.join(output_dir, 'import.sh'), 'w') as f:
+            f.write("#!/bin/sh\n# Load with: sh import.sh [arangoimport options]\n")
+            for name in totals:
+                edge = ' --create-collection-type edge' if name == 'patient_encounters' else ''
+                f.write(f'for part in "$(dirname "$0")"/{name}/*.jsonl; do\n'
+                        f'  arangoimport --file "$part" --type jsonl --collection {name} '
+                        f'--create-collection true{edge} "$@"\n'
+                        f'done\n')
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump({'num_patients': num_patients, 'seed': seed, 'format': fmt,
+                   'chunk_size': chunk_size, 'records': totals}, f, indent=2)
+    return totals
+
 if __name__ == "__main__":
-    demo_data = generate_demo_data()
-    # Save to file
-    with open("demo_data.json", "w") as f:
-        json.dump(demo_data, f, indent=2)
-    print(f"Generated {len(demo_data['patients'])} patients with conditions and medications")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate synthetic medical data")
+    parser.add_argument('--patients', type=int, help='Scale mode: number of patients to stream')
+    parser.add_argument('--output', default='generated_data', help='Scale mode output directory')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='ndjson')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.patients:
+        totals = write_dataset(args.patients, args.output, args.format, args.chunk_size,
+                               args.workers, args.seed)
+        print(f"Wrote {totals} to {args.output}")
+    else:
+        demo_data = generate_demo_data()
+        # Save to file
+        with open("demo_data.json", "w") as f:
+            json.dump(demo_data, f, indent=2)
+        print(f"Generated {len(demo_data['patients'])} patients with conditions and medications")
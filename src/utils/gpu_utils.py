@@ -1,10 +1,15 @@
-import torch
 import numpy as np
 
+def _torch():
+    # torch takes seconds to import, so load it only when a GPU helper runs
+    import torch
+    return torch
+
 def check_gpu_availability():
     """
     Check if GPU is available and return device info
     """
+    torch = _torch()
     if torch.cuda.is_available():
         device = torch.device("cuda")
         device_props = {
@@ -20,6 +25,7 @@ def optimize_memory_usage():
     """
     Optimize GPU memory usage for graph operations
     """
+    torch = _torch()
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
         torch.cuda.memory.empty_cache()
@@ -30,6 +36,7 @@ def get_performance_metrics():
     """
     Get GPU performance metrics
     """
+    torch = _torch()
     if not torch.cuda.is_available():
         return {"error": "GPU not available"}
     
@@ -44,6 +51,7 @@ def batch_to_gpu(data, batch_size=1000):
     """
     Transfer data to GPU in batches to prevent memory overflow
     """
+    torch = _torch()
     if not torch.cuda.is_available():
         return data
     
@@ -0,0 +1,167 @@
+import itertools
+
+# ArangoDB WAL operation types used by the in-memory log
+WAL_DOCUMENT_UPSERT = 2300
+WAL_DOCUMENT_REMOVE = 2302
+
+
+class InMemoryCollection:
+    """
+    Minimal stand-in for a python-arango collection backed by a list of documents
+    """
+    def __init__(self, name, documents=None, wal=None):
+        self.name = name
+        self._documents = {}
+        self._revision = 0
+        # Initial documents are not written to the log
+        self._wal = None
+        for doc in documents or []:
+            self.insert(doc)
+        self._wal = wal
+
+    def properties(self):
+        return {'name': self.name, 'status': 'loaded'}
+
+    def count(self):
+        return len(self._documents)
+
+    def revision(self):
+        return str(self._revision)
+
+    def all(self):
+        return iter(list(self._documents.values()))
+
+    def get(self, key):
+        doc = self._documents.get(key)
+        return dict(doc) if doc is not None else None
+
+    def insert(self, doc):
+        doc = dict(doc)
+        doc.setdefault('_id', f"{self.name}/{doc['_key']}")
+        self._documents[doc['_key']] = doc
+        self._changed(WAL_DOCUMENT_UPSERT, doc)
+        return {'_key': doc['_key'], '_id': doc['_id']}
+
+    def update(self, doc):
+        current = self._documents[doc['_key']]
+        current.update(doc)
+        self._changed(WAL_DOCUMENT_UPSERT, current)
+        return {'_key': doc['_key'], '_id': current['_id']}
+
+    def delete(self, key):
+        del self._documents[key]
+        self._changed(WAL_DOCUMENT_REMOVE, {'_key': key})
+        return True
+
+    def _changed(self, operation, doc):
+        self._revision += 1
+        if self._wal is not None:
+            self._wal.append(operation, self.name, doc)
+
+
+class InMemoryWAL:
+    """
+    Write-ahead log stand-in exposing python-arango's wal.last_tick/tail
+    """
+    def __init__(self):
+        self._entries = []
+        self._tick = 0
+
+    def append(self, operation, collection, doc):
+        self._tick += 1
+        self._entries.append({
+            'tick': str(self._tick),
+            'type': operation,
+            'cname': collection,
+            'data': dict(doc)
+        })
+
+    def last_tick(self):
+        return {'tick': str(self._tick)}
+
+    def tail(self, lower=None, chunk_size=None, deserialize=False, **kwargs):
+        lower = int(lower or 0)
+        content = [e for e in self._entries if int(e['tick']) > lower]
+        limit = chunk_size or len(content)
+        check_more = len(content) > limit
+        content = content[:limit]
+        return {
+            'content': content,
+            'last_included': content[-1]['tick'] if content else '0',
+            'last_tick': str(self._tick),
+            'check_more': check_more
+        }
+
+
+class InMemoryAQL:
+    """
+    Executes the small set of AQL shapes used by the navigator
+    """
+    def __init__(self, database):
+        self._database = database
+        self._handlers = {}
+
+    def register(self, query, handler):
+        """
+        Register a callable(bind_vars) -> iterable for an exact query text
+        """
+        self._handlers[' '.join(query.split())] = handler
+
+    def execute(self, query, bind_vars=None, batch_size=None, **kwargs):
+        bind_vars = bind_vars or {}
+        handler = self._handlers.get(' '.join(query.split()))
+        if handler is not None:
+            return iter(list(handler(bind_vars)))
+
+        # Projection scans: FOR doc IN @@collection RETURN KEEP(doc, @fields),
+        # optionally with the navigator's shard filter (@shard_field, @shard, @num_shards)
+        if '@collection' in bind_vars:
+            collection = self._database.collection(bind_vars['@collection'])
+            fields = bind_vars.get('fields')
+            docs = collection.all()
+            if 'num_shards' in bind_vars:
+                docs = _shard_scan(docs, bind_vars['shard_field'], bind_vars['shard'], bind_vars['num_shards'])
+            if fields is not None:
+                docs = ({f: doc[f] for f in fields if f in doc} for doc in docs)
+            if batch_size:
+                return itertools.chain.from_iterable(_batched(docs, batch_size))
+            return docs
+
+        raise ValueError(f"Unsupported query for in-memory database: {query}")
+
+
+class InMemoryDatabase:
+    """
+    In-process stand-in for an ArangoDB database, used for tests and benchmarks
+    """
+    def __init__(self, collections=None):
+        self._collections = {}
+        self.aql = InMemoryAQL(self)
+        self.wal = InMemoryWAL()
+        for name, documents in (collections or {}).items():
+            self._collections[name] = InMemoryCollection(name, documents, wal=self.wal)
+
+    def has_collection(self, name):
+        return name in self._collections
+
+    def collection(self, name):
+        if name not in self._collections:
+            self._collections[name] = InMemoryCollection(name, wal=self.wal)
+        return self._collections[name]
+
+
+def _shard_scan(docs, field, shard, num_shards):
+    from src.backend.sharding import shard_of
+
+    # TO_STRING(null) is "" in AQL
+    return (doc for doc in docs
+            if shard_of('' if doc.get(field) is None else doc[field], num_shards) == shard)
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
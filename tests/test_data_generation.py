@@ -0,0 +1,58 @@
+import json
+import os
+from collections import Counter
+
+import pytest
+from src.backend.graph_navigator import MedGraphNavigator
+from src.utils.data_generation import generate_chunk, generate_dataset, write_dataset
+from src.utils.memory_db import InMemoryDatabase
+
+def test_deterministic_chunks():
+    """Test that chunks depend only on the seed and chunk index"""
+    assert generate_chunk(3, 100, 1000, seed=7) == generate_chunk(3, 100, 1000, seed=7)
+    assert generate_chunk(3, 100, 1000, seed=7) != generate_chunk(3, 100, 1000, seed=8)
+
+    # Last chunk is truncated at num_patients
+    last = generate_chunk(2, 100, 250)
+    assert [p["_key"] for p in last["patients"]][-1] == "P250"
+    assert len(last["patients"]) == 50
+
+def test_skewed_distributions():
+    """Test that condition frequencies are heavy-tailed rather than uniform"""
+    data = generate_dataset(2000, seed=1, chunk_size=500)
+    counts = Counter(c["description"] for c in data["conditions"])
+    top, (_, second) = counts.most_common(1)[0][1], counts.most_common(2)[1]
+    assert top > 1.5 * second
+    assert top > 3 * len(data["conditions"]) / len(counts)
+
+    encounters = Counter(e["patient_id"] for e in data["encounters"])
+    assert max(encounters.values()) > 4 * (len(data["encounters"]) / len(data["patients"]))
+
+def test_write_dataset(tmp_path):
+    """Test parallel NDJSON output matches the in-process generator"""
+    totals = write_dataset(300, str(tmp_path), chunk_size=100, workers=2, seed=5)
+    expected = generate_dataset(300, seed=5, chunk_size=100)
+    assert totals == {name: len(records) for name, records in expected.items()}
+
+    with open(tmp_path / "conditions" / "part-00001.jsonl") as f:
+        written = [json.loads(line) for line in f]
+    assert written == generate_chunk(1, 100, 300, seed=5)["conditions"]
+
+    with open(tmp_path / "manifest.json") as f:
+        assert json.load(f)["records"] == totals
+
+def test_arango_import_format(tmp_path):
+    """Test the Arango import layout with its edge collection"""
+    totals = write_dataset(50, str(tmp_path), fmt="arango", chunk_size=25, workers=1)
+    assert totals["patient_encounters"] == totals["encounters"]
+    assert os.path.exists(tmp_path / "import.sh")
+    with pytest.raises(ValueError):
+        write_dataset(10, str(tmp_path), fmt="csv")
+
+def test_generated_data_loads():
+    """Test that generated data loads into the navigator graph"""
+    data = generate_dataset(200, seed=2)
+    nav = MedGraphNavigator(database=InMemoryDatabase(data))
+    assert nav.load_synthea_data()
+    assert nav.graph.number_of_nodes() == sum(len(records) for records in data.values())
+    assert nav.analyzer.analyze_treatment_patterns("Hypertension")
@@ -1,6 +1,14 @@
+import asyncio
+import sys
+import threading
+import time
+
+import networkx as nx
+import numpy as np
 import pytest
 from src.backend.graph_navigator import MedGraphNavigator
 from src.utils.data_generation import generate_demo_data
+from src.utils.memory_db import InMemoryDatabase
 
 @pytest.fixture
 def navigator():
@@ -15,6 +23,711 @@ def test_data_loading(navigator):
     assert len(navigator.graph.nodes) > 0
     assert len(navigator.graph.edges) > 0
 
+@pytest.fixture
+def demo_data():
+    """Generated demo records"""
+    return generate_demo_data(seed=0)
+
+@pytest.fixture
+def loaded_navigator(demo_data):
+    """Navigator loaded from the demo records in an in-memory database"""
+    nav = MedGraphNavigator(database=InMemoryDatabase(demo_data))
+    nav.load_synthea_data()
+    return nav
+
+def test_bulk_loading(demo_data):
+    """Test single-pass bulk loading from an in-memory database"""
+    db = InMemoryDatabase(demo_data)
+    executed = []
+    original_execute = db.aql.execute
+
+    def execute(query, **kwargs):
+        executed.append(kwargs['bind_vars']['@collection'])
+        return original_execute(query, **kwargs)
+
+    db.aql.execute = execute
+
+    nav = MedGraphNavigator(database=db)
+    assert nav.load_synthea_data(batch_size=50)
+
+    # One cursor per collection
+    assert sorted(executed) == sorted(['patients', 'encounters', 'conditions', 'medications', 'procedures'])
+    expected_nodes = sum(len(docs) for docs in demo_data.values())
+    assert nav.graph.number_of_nodes() == expected_nodes
+    assert nav.graph.number_of_edges() == (len(demo_data['encounters']) +
+                                           len(demo_data['conditions']) +
+                                           len(demo_data['medications']))
+
+    encounter = demo_data['encounters'][0]
+    edge = nav.graph.edges["patients/" + encounter['patient_id'], "encounters/" + encounter['_key']]
+    assert edge['type'] == 'HAD_ENCOUNTER'
+    assert edge['date'] == encounter['date']
+    assert nav.graph.nodes["conditions/" + demo_data['conditions'][0]['_key']]['data']['description'] == \
+        demo_data['conditions'][0]['description']
+    assert nav.load_stats['encounters']['records'] == len(demo_data['encounters'])
+    assert nav.load_stats['patients']['records_per_second'] > 0
+
+def test_graph_snapshot(demo_data, tmp_path):
+    """Test snapshot reuse and invalidation on collection changes"""
+    db = InMemoryDatabase(demo_data)
+    snapshot_dir = str(tmp_path / "snapshot")
+
+    first = MedGraphNavigator(database=db)
+    assert first.load_synthea_data(snapshot_path=snapshot_dir)
+
+    # A second start memory-maps the snapshot without querying collections
+    db.aql.execute = None
+    second = MedGraphNavigator(database=db)
+    assert second.load_synthea_data(snapshot_path=snapshot_dir)
+    assert isinstance(second.graph.indptr, np.memmap)
+    assert second.graph.number_of_nodes() == first.graph.number_of_nodes()
+    assert second.graph.number_of_edges() == first.graph.number_of_edges()
+    assert sorted(second.graph.neighbors("patients/P1", direction="out")) == \
+        sorted(first.graph.neighbors("patients/P1", direction="out"))
+    assert second.analyzer.analyze_treatment_patterns("Asthma") == \
+        first.analyzer.analyze_treatment_patterns("Asthma")
+
+    # Changed collections invalidate the snapshot
+    db.collection("patients").insert({"_key": "P_NEW", "age": 40})
+    assert not second.open_graph_snapshot(snapshot_dir)
+
+def test_incremental_sync(demo_data, loaded_navigator):
+    """Test applying inserted, updated and removed documents"""
+    from src.backend.graph_sync import GraphSyncer
+
+    nav = loaded_navigator
+    db = nav.db
+    syncer = GraphSyncer(nav)
+    assert len(nav.analyzer.lsh) == len(demo_data["patients"])
+    assert syncer.sync() == 0
+
+    db.collection("patients").insert({"_key": "P_NEW", "age": 61, "gender": "F"})
+    db.collection("encounters").insert({"_key": "E_NEW", "patient_id": "P_NEW", "date": "2024-01-01"})
+    db.collection("conditions").insert({"_key": "C_NEW", "patient_id": "P_NEW",
+                                        "encounter_id": "E_NEW", "description": "Gout"})
+    db.collection("medications").insert({"_key": "M_NEW", "patient_id": "P_NEW",
+                                         "encounter_id": "E_NEW", "description": "Allopurinol"})
+    assert syncer.lag()["ticks_behind"] == 4
+    assert syncer.sync() == 4
+
+    assert nav.graph.edges["encounters/E_NEW", "conditions/C_NEW"]["type"] == "DIAGNOSED_WITH"
+    assert nav.analyzer.analyze_treatment_patterns("Gout") == {("Allopurinol",): 1}
+    assert "patients/P_NEW" in nav.analyzer.lsh.features
+
+    db.collection("conditions").update({"_key": "C_NEW", "description": "Migraine"})
+    db.collection("medications").delete("M_NEW")
+    syncer.sync()
+    assert nav.analyzer.analyze_treatment_patterns("Gout") == {}
+    assert nav.analyzer.analyze_treatment_patterns("Migraine") == {(): 1}
+    assert not nav.graph.has_node("medications/M_NEW")
+    assert nav.analyzer.lsh.features["patients/P_NEW"] == ({"Migraine"}, set())
+
+    stats = syncer.stats()
+    assert stats["applied"]["conditions"] == {"inserted": 1, "updated": 1, "removed": 0}
+    assert stats["applied"]["medications"]["removed"] == 1
+    assert stats["lag"]["ticks_behind"] == 0
+
+def test_sync_during_queries(loaded_navigator):
+    """Test that queries running during a sync never see a half-applied batch"""
+    from src.backend.graph_sync import GraphSyncer
+
+    nav = loaded_navigator
+    db = nav.db
+    syncer = GraphSyncer(nav)
+    nav.analyzer.lsh
+
+    # A query started halfway through a batch waits for the whole batch
+    apply = syncer._apply
+    seen = []
+
+    def slow_apply(name, entry):
+        affected = apply(name, entry)
+        if entry["data"]["_key"] == "CS_HALF":
+            query = threading.Thread(
+                target=lambda: seen.append(nav.analyzer.analyze_treatment_patterns("Sync Test")))
+            query.start()
+            query.join(0.2)
+        return affected
+
+    syncer._apply = slow_apply
+    db.collection("encounters").insert({"_key": "ES_HALF", "patient_id": "P1", "date": "2024-02-01"})
+    db.collection("conditions").insert({"_key": "CS_HALF", "patient_id": "P1",
+                                        "encounter_id": "ES_HALF", "description": "Sync Test"})
+    db.collection("medications").insert({"_key": "MS_HALF", "patient_id": "P1",
+                                         "encounter_id": "ES_HALF", "description": "Synctamol"})
+    syncer.sync()
+    syncer._apply = apply
+    for _ in range(100):
+        if seen:
+            break
+        time.sleep(0.01)
+    assert seen == [{("Synctamol",): 1}]
+    for key, collection in (("MS_HALF", "medications"), ("CS_HALF", "conditions"),
+                            ("ES_HALF", "encounters")):
+        db.collection(collection).delete(key)
+    syncer.sync()
+
+    # Queries running alongside many syncs
+    done = threading.Event()
+    errors = []
+
+    def write():
+        try:
+            for i in range(40):
+                db.collection("patients").insert({"_key": f"PS{i}", "age": 50, "gender": "M"})
+                db.collection("encounters").insert({"_key": f"ES{i}", "patient_id": f"PS{i}",
+                                                    "date": "2024-02-01"})
+                db.collection("conditions").insert({"_key": f"CS{i}", "patient_id": f"PS{i}",
+                                                    "encounter_id": f"ES{i}", "description": "Sync Test"})
+                db.collection("medications").insert({"_key": f"MS{i}", "patient_id": f"PS{i}",
+                                                     "encounter_id": f"ES{i}", "description": "Synctamol"})
+                if i % 3 == 2:
+                    for key, collection in ((f"MS{i - 1}", "medications"), (f"CS{i - 1}", "conditions"),
+                                            (f"ES{i - 1}", "encounters"), (f"PS{i - 1}", "patients")):
+                        db.collection(collection).delete(key)
+                syncer.sync()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            done.set()
+
+    def read():
+        try:
+            while not done.is_set():
+                patterns = nav.analyzer.analyze_treatment_patterns("Sync Test")
+                assert set(patterns) <= {("Synctamol",)}, patterns
+                nav.analyzer.predict_risk_factors("Sync Test")
+                nav.analyzer.find_similar_patients("patients/P1", approximate=True)
+                nav.analyzer.find_similar_patients("patients/P1")
+                nav.retrieve_context("Which treatments follow Sync Test for patient 1?")
+                nav.visualize("encounters", condition="Sync Test")
+        except Exception as e:
+            errors.append(e)
+
+    # Switch threads often so readers land inside sync batches
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        readers = [threading.Thread(target=read) for _ in range(3)]
+        writer = threading.Thread(target=write)
+        for thread in readers + [writer]:
+            thread.start()
+        for thread in readers + [writer]:
+            thread.join(120)
+    finally:
+        sys.setswitchinterval(interval)
+    assert not errors, errors
+    assert nav.analyzer.analyze_treatment_patterns("Sync Test") == {("Synctamol",): 27}
+
+def test_analytics_cache(demo_data, tmp_path):
+    """Test memoized analytics and invalidation on graph changes"""
+    from src.backend.analytics_cache import AnalyticsCache
+
+    nav = MedGraphNavigator(database=InMemoryDatabase(demo_data),
+                            analytics_cache=AnalyticsCache(max_entries=2, disk_path=str(tmp_path)))
+    nav.load_synthea_data()
+
+    first = nav.run_graph_analytics("pagerank")
+    assert nav.run_graph_analytics("pagerank") is first
+    assert nav.analytics_cache.stats()["hits"] == 1
+
+    # Evicted from memory, still served from disk
+    nav.run_graph_analytics("shortest_path", {"source": "P1", "target": "E1"})
+    nav.run_graph_analytics("shortest_path", {"source": "E1", "target": "P1"})
+    assert nav.run_graph_analytics("pagerank") == first
+    stats = nav.analytics_cache.stats()
+    assert stats["evictions"] >= 1 and stats["disk_hits"] == 1
+
+    nav.changed()
+    nav.run_graph_analytics("pagerank")
+    assert nav.analytics_cache.stats()["misses"] == stats["misses"] + 1
+
+def test_cpu_analytics_backends(loaded_navigator):
+    """Test the SciPy backend against exact NetworkX results"""
+    from src.backend.analytics_backends import NetworkXBackend, SciPyBackend
+
+    nav = loaded_navigator
+    scipy_backend = SciPyBackend(nav.graph)
+    exact = NetworkXBackend(nav.graph)
+
+    pagerank = scipy_backend.pagerank()
+    for node, score in exact.pagerank().items():
+        assert pagerank[node] == pytest.approx(score, abs=1e-6)
+    centrality = scipy_backend.centrality()
+    for node, score in exact.centrality().items():
+        assert centrality[node] == pytest.approx(score, abs=1e-9)
+
+    communities = scipy_backend.community_detection(seed=1, processes=1)
+    assert sum(len(c) for c in communities) == nav.graph.number_of_nodes()
+    assert set().union(*communities) == set(nav.graph.nodes)
+
+    sampled = nav.run_graph_analytics("centrality", {"epsilon": 0.5, "seed": 1})
+    assert isinstance(sampled, dict) and len(sampled) == nav.graph.number_of_nodes()
+
+def test_path_service(loaded_navigator):
+    """Test bidirectional, type-constrained and batched shortest paths"""
+    nav = loaded_navigator
+    paths = nav.path_service()
+
+    # Relations are walked either way
+    graph = nav.graph.to_undirected(as_view=True)
+    nodes = list(graph.nodes)
+    pairs = [(s, t) for s in nodes[:8] for t in nodes[::7]]
+    batch = paths.shortest_paths(pairs)
+    for (source, target), path in zip(pairs, batch):
+        if nx.has_path(graph, source, target):
+            expected = nx.shortest_path_length(graph, source, target)
+            assert len(paths.shortest_path(source, target)) - 1 == expected
+            assert len(path) - 1 == expected and path[0] == source and path[-1] == target
+            assert paths.distance(source, target, approximate=True) >= expected
+        else:
+            assert path is None
+            assert paths.distance(source, target) == float("inf")
+
+    # Medications are off limits, so no path reaches one
+    constrained = ["patient", "encounter", "condition"]
+    medications = nav.index.patient_medications("patients/P1")
+    assert medications
+    for path in paths.shortest_paths([("patients/P1", m) for m in medications], node_types=constrained):
+        assert path is None
+    assert "error" in nav.run_graph_analytics("shortest_path", {"source": "P1", "target": medications[0],
+                                                                "node_types": constrained})
+    condition = nav.index.patient_conditions("patients/P1")[0]
+    assert nav.run_graph_analytics("shortest_path", {"source": "P1", "target": condition,
+                                                     "node_types": constrained})[-1] == condition
+    assert "error" in nav.run_graph_analytics("shortest_path")
+    assert "error" in nav.run_graph_analytics("shortest_path", {"source": "P1", "target": "missing"})
+
+def test_async_query_pool(demo_data):
+    """Test pooled async AQL with bind vars, concurrency limits and timeouts"""
+    from src.backend.graph_navigator import AQL_TEMPLATES
+    from src.backend.query_pool import AsyncQueryPool, QueryTimeout
+
+    db = InMemoryDatabase(demo_data)
+    running = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def patient_history(bind_vars):
+        with lock:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+        time.sleep(0.02)
+        with lock:
+            running["now"] -= 1
+        patient = db.collection("patients").get(bind_vars["patient_id"])
+        encounters = [e for e in demo_data["encounters"] if e["patient_id"] == patient["_key"]]
+        return [{"patient": patient, "encounters": encounters}]
+
+    db.aql.register(AQL_TEMPLATES["patient_history"], patient_history)
+    nav = MedGraphNavigator(database=db)
+    nav._query_pool = AsyncQueryPool(lambda: db, size=2)
+
+    async def run_sessions():
+        return await asyncio.gather(*[
+            nav.aexecute_aql_query("patient_history", {"patient_id": f"P{i}"}) for i in range(1, 9)])
+
+    results = asyncio.run(run_sessions())
+    assert [r[0]["patient"]["_key"] for r in results] == [f"P{i}" for i in range(1, 9)]
+    assert running["peak"] <= 2
+    assert nav.query_pool.stats()["connections"] <= 2
+    assert nav.execute_aql_query("patient_history", {"patient_id": "P3"}) == results[2]
+
+    # Streaming stops early without draining the cursor
+    async def first_docs():
+        docs = []
+        async for doc in nav.query_pool.stream("FOR doc IN @@collection RETURN doc",
+                                               {"@collection": "encounters"}, batch_size=5):
+            docs.append(doc)
+            if len(docs) == 3:
+                break
+        return docs
+
+    assert len(asyncio.run(first_docs())) == 3
+
+    db.aql.register("FOR x IN 1..1 RETURN SLEEP(1)", lambda bind_vars: time.sleep(0.5) or [1])
+    async def slow_query():
+        try:
+            await nav.query_pool.query("FOR x IN 1..1 RETURN SLEEP(1)", timeout=0.1)
+        except QueryTimeout:
+            return True
+        return False
+
+    assert asyncio.run(slow_query())
+    assert nav.query_pool.stats()["timeouts"] == 1
+    assert "error" in asyncio.run(nav.aexecute_aql_query("unknown"))
+
+def test_lazy_import():
+    """Test that importing the navigator defers connections and heavy dependencies"""
+    from benchmarks.bench_import import DEFERRED_MODULES, import_profile
+
+    seconds, loaded = import_profile("src.backend.graph_navigator")
+    assert seconds is not None
+    assert not loaded.intersection(DEFERRED_MODULES)
+    assert MedGraphNavigator()._database is None
+
+def test_benchmark_suite():
+    """Test the offline benchmark harness and regression comparison"""
+    import copy
+    from benchmarks.bench_suite import compare, run_size
+
+    result = run_size((60, "Hypertension", 1, 0, False))
+    assert result["peak_rss_bytes"] > 0
+    for case in ("load_synthea_data", "predict_risk_factors", "analytics.pagerank",
+                 "analytics.shortest_paths"):
+        assert case in result["cases"]
+    assert not any("error" in timing for timing in result["cases"].values())
+
+    baseline = {"results": [copy.deepcopy(result)]}
+    assert compare([result], baseline) == []
+    baseline["results"][0]["cases"]["load_synthea_data"]["best_seconds"] = 0.01
+    result["cases"]["load_synthea_data"]["best_seconds"] = 0.1
+    assert compare([result], baseline)[0].startswith("load_synthea_data")
+
+def test_instrumentation(demo_data):
+    """Test spans, counters, the Prometheus exporter and the sampling profiler"""
+    import urllib.request
+    import uuid
+    from src.backend.instrumentation import langchain_callback_handler, metrics
+
+    # Reset before loading, so the load's counters are recorded
+    metrics.reset()
+    nav = MedGraphNavigator(database=InMemoryDatabase(demo_data))
+    nav.load_synthea_data()
+    nav.analyzer.predict_risk_factors("Hypertension")
+    nav.run_graph_analytics("pagerank")
+    nav.run_graph_analytics("pagerank")
+    tools = {tool.name: tool for tool in nav.setup_agent_tools()}
+    tools["Graph_Analytics"].func("pagerank")
+
+    handler = langchain_callback_handler()
+    run_id = uuid.uuid4()
+    handler.on_llm_start({}, ["prompt"], run_id=run_id)
+    handler.on_llm_end(None, run_id=run_id)
+
+    snapshot = metrics.snapshot()
+    spans = {(s["name"], tuple(sorted(s["labels"].items()))): s["count"] for s in snapshot["spans"]}
+    assert spans[("analytics", (("type", "pagerank"),))] == 3
+    assert spans[("agent.tool", (("tool", "Graph_Analytics"),))] == 1
+    assert spans[("analyzer.predict_risk_factors", ())] == 1
+    assert spans[("agent.llm", ())] == 1
+    counters = {(c["name"], tuple(sorted(c["labels"].items()))): c["value"] for c in snapshot["counters"]}
+    assert counters[("rows_fetched", (("collection", "patients"), ("source", "load")))] == len(demo_data["patients"])
+    assert counters[("analytics_requests", (("cached", True), ("type", "pagerank")))] == 2
+    assert counters[("nodes_touched", (("method", "predict_risk_factors"),))] > 0
+
+    server = metrics.serve(port=0, host="127.0.0.1")
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as response:
+            text = response.read().decode()
+    finally:
+        server.shutdown()
+    assert 'medgraph_span_seconds_count{span="analytics",type="pagerank"} 3' in text
+    assert "# TYPE medgraph_rows_fetched_total counter" in text
+
+    profiler = nav.start_profiling(interval=0.001)
+    deadline = time.perf_counter() + 0.2
+    while time.perf_counter() < deadline:
+        nav.analyzer.analyze_treatment_patterns("Hypertension")
+    profiler.stop()
+    assert profiler.samples > 0 and profiler.report()
+    assert "analyze_treatment_patterns" in profiler.collapsed()
+
+def test_intent_router(demo_data):
+    """Test that recognised queries skip the agent and others reach it"""
+    from langchain_community.llms import FakeListLLM
+
+    llm = FakeListLLM(responses=["Thought: done\nFinal Answer: from the agent"])
+    nav = MedGraphNavigator(database=InMemoryDatabase(demo_data), llm=llm)
+    nav.load_synthea_data()
+    route = nav.router.route
+
+    assert route("Show medical history for patient P12") == ("patient_history", {"patient_id": "P12"})
+    assert route("What are the most common conditions?") == ("condition_frequency", {})
+    assert route("treatment patterns for asthma") == ("treatment_patterns", {"condition": "Asthma"})
+    assert route("Risk factors for Type 2 Diabetes") == ("risk_factors", {"condition": "Type 2 Diabetes"})
+    assert route("Find 3 patients similar to P5") == ("similar_patients", {"patient_id": "P5", "num_similar": 3})
+    assert route("shortest path from P1 to E1") == ("shortest_path", {"source": "P1", "target": "E1"})
+    # Unknown conditions, unsupported constraints and open questions go to the agent
+    assert route("treatment patterns for scurvy") is None
+    assert route("What are the most common conditions diagnosed in patients over 60?") == \
+        ("cohort_condition_frequency", {"min_age": 61})
+    assert route("most common conditions in patients over 60 in 2023") is None
+    assert route("Summarise this cohort") is None
+
+    assert nav.process_query("Risk factors for Asthma") == nav.analyzer.predict_risk_factors("Asthma")
+    assert nav.process_query("Find 2 patients similar to P5") == \
+        nav.analyzer.find_similar_patients("patients/P5", 2)
+    assert nav.process_query("shortest path from E1 to P1") == ["encounters/E1", "patients/P1"]
+    over_60 = [p for p in demo_data["patients"] if p["age"] > 60]
+    top = nav.process_query("What are the most common conditions diagnosed in patients over 60?")
+    assert top[0]["frequency"] == max(
+        sum(any(c["patient_id"] == p["_key"] and c["description"] == name for c in demo_data["conditions"])
+            for p in over_60)
+        for name in {c["description"] for c in demo_data["conditions"]})
+    assert not hasattr(nav, "agent_executor")
+
+    assert nav.process_query("Summarise this cohort") == "from the agent"
+
+def test_response_cache(demo_data):
+    """Test that near-duplicate queries reuse answers until the graph changes"""
+    from langchain_community.llms import FakeListLLM
+    from src.backend.response_cache import SemanticResponseCache
+
+    cache = SemanticResponseCache()
+    cache.put("What are the risk factors for asthma?", "asthma answer", graph_version=1)
+    cache.put("Show medical history for patient P12", "P12 answer", graph_version=1)
+    assert cache.get("what are risk factors for Asthma", graph_version=1) == "asthma answer"
+    assert cache.get("Show medical history for patient P13", graph_version=1) is None
+    assert cache.get("What are the risk factors for asthma?", graph_version=2) is None
+    assert cache.stats()["semantic_hits"] == 1 and cache.stats()["entries"] == 0
+
+    # Negations, sex, age and comparison qualifiers never match each other
+    opposites = [("treatment patterns for patients with Asthma",
+                  "treatment patterns for patients without Asthma"),
+                 ("most common conditions in men", "most common conditions in women"),
+                 ("conditions in male patients", "conditions in female patients"),
+                 ("conditions in patients over sixty", "conditions in patients under sixty"),
+                 ("patients who were treated", "patients who weren't treated")]
+    for cached, asked in opposites:
+        for qualified in (SemanticResponseCache(), SemanticResponseCache(entities=lambda q: frozenset())):
+            qualified.put(cached, "answer")
+            assert qualified.get(asked) is None
+            assert qualified.stats()["semantic_hits"] == 0
+
+    expired = SemanticResponseCache(ttl=-1)
+    expired.put("Summarise this cohort", "summary")
+    assert expired.get("Summarise this cohort") is None
+
+    small = SemanticResponseCache(max_bytes=6000)
+    for i in range(5):
+        small.put(f"question {i}", "x" * 1000)
+    assert small.stats()["evictions"] > 0 and small.stats()["bytes"] <= 6000
+    assert small.get("question 4") is not None and small.get("question 0") is None
+
+    llm = FakeListLLM(responses=["Thought: done\nFinal Answer: first",
+                                 "Thought: done\nFinal Answer: second"])
+    nav = MedGraphNavigator(database=InMemoryDatabase(demo_data), llm=llm)
+    nav.load_synthea_data()
+    assert nav.process_query("Summarise this cohort") == "first"
+    assert nav.process_query("summarise this cohort, please") == "first"
+    # Condition names are entities too, so asthma never answers for copd
+    assert nav._query_entities("risk factors for asthma") == frozenset({"asthma"})
+    nav.changed()
+    assert nav.process_query("Summarise this cohort") == "second"
+
+def test_serving(demo_data, tmp_path):
+    """Test pooled serving on a shared snapshot with backpressure and timeouts"""
+    import json
+    import urllib.error
+    import urllib.request
+    from src.backend.serving import QueryServer, RequestTimeout, ServerBusy, WorkerPool
+
+    nav = MedGraphNavigator(database=InMemoryDatabase(demo_data))
+    assert nav.load_synthea_data(snapshot_path=str(tmp_path))
+    pool = WorkerPool(str(tmp_path), workers=2, max_pending=4, timeout=60)
+    try:
+        assert len(pool.warm()) >= 1
+        assert pool.run("risk_factors", {"condition": "Asthma"}) == nav.analyzer.predict_risk_factors("Asthma")
+
+        # A job cannot cross the process boundary in zero seconds
+        with pytest.raises(RequestTimeout):
+            pool.run("pagerank", timeout=0)
+        # The abandoned job holds a slot until its worker finishes it
+        while pool.stats()["pending"]:
+            time.sleep(0.01)
+        futures = [pool.submit("centrality", {"k": 8, "seed": i})[1] for i in range(pool.max_pending)]
+        with pytest.raises(ServerBusy):
+            pool.submit("pagerank")
+        for future in futures:
+            try:
+                future.result(timeout=60)
+            except Exception:
+                pass
+
+        httpd = QueryServer(nav, pool).serve(port=0, host="127.0.0.1")
+        url = f"http://127.0.0.1:{httpd.server_address[1]}"
+
+        def post(path, payload):
+            request = urllib.request.Request(url + path, data=json.dumps(payload).encode(),
+                                             headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return json.loads(response.read())
+
+        patterns = post("/query", {"query": "treatment patterns for asthma"})["result"]
+        expected = nav.analyzer.analyze_treatment_patterns("Asthma")
+        assert {tuple(k): v for k, v in patterns} == expected
+        history = post("/query", {"query": "Show medical history for patient P1"})["result"]
+        assert history == nav.execute_aql_query("patient_history", {"patient_id": "P1"})
+        assert post("/analyze", {"intent": "shortest_path", "params": {"source": "E1", "target": "P1"}}) == \
+            {"result": ["encounters/E1", "patients/P1"]}
+        with pytest.raises(urllib.error.HTTPError) as error:
+            post("/analyze", {"params": {}})
+        assert error.value.code == 400
+        summary = post("/visualize", {"kind": "pagerank", "page_size": 5})["result"]
+        assert summary["vizType"] == "distribution" and len(summary["items"]) == 5
+        with urllib.request.urlopen(url + "/stats", timeout=10) as response:
+            assert json.loads(response.read())["pool"]["workers"] == 2
+        httpd.shutdown()
+    finally:
+        pool.close()
+
+    # Abandoned running jobs recycle the workers instead of holding them
+    pool = WorkerPool(str(tmp_path), workers=1, recycle_after=1, timeout=60)
+    try:
+        pool.warm()
+        for _ in range(50):
+            with pytest.raises(RequestTimeout):
+                pool.run("centrality", {"k": 8}, timeout=0.001)
+            if pool.stats()["recycled"]:
+                break
+        stats = pool.stats()
+        assert stats["recycled"] == 1 and stats["abandoned"] == 0
+        assert pool.run("risk_factors", {"condition": "Asthma"}) == nav.analyzer.predict_risk_factors("Asthma")
+        # Concurrent reloads swap the executor under the pool lock
+        reloads = [threading.Thread(target=pool.reload) for _ in range(4)]
+        for thread in reloads:
+            thread.start()
+        for thread in reloads:
+            thread.join()
+        assert pool.run("risk_factors", {"condition": "Asthma"}) == nav.analyzer.predict_risk_factors("Asthma")
+    finally:
+        pool.close()
+
+def test_visualization_summaries(demo_data, loaded_navigator):
+    """Test bounded visualization payloads: ranked pages, supernodes and series"""
+    from src.backend.visualization import lttb
+
+    nav = loaded_navigator
+
+    pagerank = nav.run_graph_analytics("pagerank")
+    first = nav.visualize("pagerank", page_size=10)
+    ranked = sorted(pagerank.values(), reverse=True)
+    assert first["vizType"] == "distribution" and first["total"] == len(pagerank)
+    assert [item["value"] for item in first["items"]] == pytest.approx(ranked[:10])
+    second = nav.visualize("pagerank", page=first["next_page"], page_size=10)
+    assert [item["value"] for item in second["items"]] == pytest.approx(ranked[10:20])
+    assert second["other"]["count"] == len(pagerank) - 20
+    assert {item["type"] for item in first["items"]} <= {"patient", "encounter", "condition", "medication"}
+
+    communities = nav.run_graph_analytics("community_detection", {"seed": 0})
+    graph = nav.visualize("community_detection", {"seed": 0}, max_communities=3)
+    assert graph["communities"] == len(communities)
+    assert sum(node["size"] for node in graph["nodes"]) == nav.graph.number_of_nodes()
+    assert len(graph["nodes"]) <= 4
+    internal = sum(node["internal_edges"] for node in graph["nodes"])
+    assert internal + sum(edge["weight"] for edge in graph["edges"]) == nav.graph.number_of_edges()
+
+    series = nav.visualize("encounters", freq="week")
+    assert series["total"] == len(demo_data["encounters"])
+    assert sum(point["value"] for point in series["points"]) == len(demo_data["encounters"])
+    assert len(nav.visualize("encounters", freq="day", max_points=20)["points"]) == 20
+    asthma = nav.visualize("encounters", freq="month", condition="Asthma")
+    assert asthma["total"] == sum(c["description"] == "Asthma" for c in demo_data["conditions"])
+
+    # LTTB keeps the endpoints and the extreme points
+    y = np.zeros(1000)
+    y[500] = 10
+    keep = lttb(np.arange(1000), y, 50)
+    assert len(keep) == 50 and keep[0] == 0 and keep[-1] == 999 and 500 in keep
+
+def test_retrieval_context(loaded_navigator):
+    """Test bounded, ranked and cached ego-subgraph context for the agent"""
+    from src.backend.graph_index import GraphIndex
+    from src.backend.retrieval import ego_subgraph, entity_seeds, estimate_tokens, node_day, query_entities
+
+    nav = loaded_navigator
+    index = nav.index
+    conditions = index.conditions_by_description.keys()
+    assert query_entities("Did patient 1 or E2 have asthma?", nav.resolve_node, conditions) == \
+        ["patients/P1", "encounters/E2", "condition:Asthma"]
+
+    # Hops match BFS distances and every bound holds
+    keys, hops = ego_subgraph(index, ["patients/P1"], hops=2)
+    distances = nx.single_source_shortest_path_length(nav.graph.to_undirected(as_view=True), "patients/P1",
+                                                      cutoff=2)
+    assert all(distances[key] == h for key, h in zip(keys, hops))
+    full = len(ego_subgraph(index, ["patients/P1"], hops=3)[0])
+    assert len(ego_subgraph(index, ["patients/P1"], hops=3, max_nodes=5)[0]) == min(5, full)
+    seeds = entity_seeds(index, "condition:Asthma")
+    assert len(ego_subgraph(index, seeds, hops=2, max_nodes=len(seeds) + 3)[0]) == len(seeds) + 3
+    # Condition seeds are the most recent diagnoses, from the cached order
+    days = [node_day(index, key) for key in index.recent_conditions("Asthma")]
+    assert days == sorted(days, reverse=True) and seeds == index.recent_conditions("Asthma")[:len(seeds)]
+    copy = GraphIndex.from_graph(nav.graph)
+    assert copy.recent_conditions("Asthma", 2) == seeds[:2]
+    copy.remove_node(seeds[0])
+    assert entity_seeds(copy, "condition:Asthma", fanout=1) == seeds[1:2]
+    keys, _ = ego_subgraph(index, ["patients/P1"], hops=2, node_types=["patient", "encounter"])
+    assert {index.node_types[key] for key in keys} == {"patient", "encounter"}
+
+    context = nav.retrieve_context("What happened to patient P1 with Asthma?", token_budget=200)
+    lines = context.splitlines()
+    assert lines[1] == "P1 patient" and lines[-1].endswith("more nodes")
+    assert estimate_tokens(context) <= 200 + 10
+    assert nav.retrieve_context("Nothing to see here") == ""
+    assert nav.retrieval_cache.stats()["misses"] == 2
+    nav.retrieve_context("Tell me about P1")
+    assert nav.retrieval_cache.stats()["hits"] == 1
+    nav.changed()
+    assert nav.retrieval_cache.stats()["entries"] == 0
+    # Context comes from the live index; no CSR is built for it
+    assert nav.retrieve_context("Tell me about P1").startswith("Graph context:")
+    assert nav._paths is None
+
+    # Tools hand the agent bounded text, and the agent gets the context
+    tools = {tool.name: tool for tool in nav.setup_agent_tools()}
+    ranked = tools["Graph_Analytics"].func("pagerank")
+    assert isinstance(ranked, str) and estimate_tokens(ranked) <= nav.token_budget + 10
+    assert ranked.endswith(f"of {nav.graph.number_of_nodes()}")
+    assert tools["Graph_Context"].func("P1").startswith("Graph context:")
+    inputs = []
+
+    class RecordingAgent:
+        def run(self, text, **kwargs):
+            inputs.append(text)
+            return "ok"
+
+    nav.agent_executor = RecordingAgent()
+    assert nav.process_query("Summarise the care of P1") == "ok"
+    assert "HAD_ENCOUNTER P1" in inputs[0]
+
+def test_sharded_analysis(demo_data, loaded_navigator):
+    """Test patient-sharded loading and coordinator merges against one graph"""
+    import functools
+    from src.backend.sharding import ShardCoordinator, crc32c, shard_of
+
+    nav = loaded_navigator
+    analyzer = nav.analyzer
+    factory = functools.partial(InMemoryDatabase, demo_data)
+
+    inline = ShardCoordinator.local(factory, 3, processes=False)
+    stats = inline.stats()
+    assert sum(s["patients"] for s in stats) == len(demo_data["patients"])
+    assert sum(s["nodes"] for s in stats) == nav.graph.number_of_nodes()
+    for shard in inline.shards:
+        patients = shard.navigator.analyzer.index.nodes_of_type("patient")
+        assert all(shard_of(p.split("/")[1], 3) == shard.shard for p in patients)
+    # Shards are selected in the AQL scan: each streams only its own rows
+    for name in ("patients", "encounters", "conditions", "medications"):
+        streamed = [shard.navigator.load_stats[name]["records"] for shard in inline.shards]
+        assert sum(streamed) == len(demo_data[name]) and all(streamed)
+    # Same checksum as AQL's CRC32("123456789")
+    assert crc32c(b"123456789") == 0xE3069283
+
+    for coordinator in (inline, ShardCoordinator.local(factory, 2)):
+        try:
+            assert coordinator.analyze_treatment_patterns("Asthma") == \
+                analyzer.analyze_treatment_patterns("Asthma")
+            merged = coordinator.predict_risk_factors("Asthma")
+            assert merged == pytest.approx(analyzer.predict_risk_factors("Asthma"))
+            # Same scores as the single graph; ties may order differently
+            expected = analyzer.find_similar_patients("patients/P1", 10)
+            top = coordinator.find_similar_patients("patients/P1", 10)
+            assert [score for _, score in top] == [score for _, score in expected]
+            assert "patients/P1" not in dict(top)
+        finally:
+            coordinator.close()
+
 def test_query_processing(navigator):
     """Test natural language query processing"""
     query = "Show medical history for patient P123"
@@ -1,6 +1,9 @@
 import pytest
 from src.backend.medical_analyzer import MedicalAnalyzer
 from src.backend.graph_navigator import MedGraphNavigator
+from src.backend.csr_graph import CSRGraph
+from src.utils.data_generation import generate_demo_data
+from src.utils.memory_db import InMemoryDatabase
 
 @pytest.fixture
 def analyzer():
@@ -26,3 +29,288 @@ def test_risk_factors(analyzer):
     risks = analyzer.predict_risk_factors("Heart Disease")
     assert risks is not None
     assert isinstance(risks, dict)
+
+@pytest.fixture
+def demo_data():
+    """Generated demo records"""
+    return generate_demo_data(seed=0)
+
+@pytest.fixture
+def demo_db(demo_data):
+    """In-memory database with generated demo data"""
+    return InMemoryDatabase(demo_data)
+
+@pytest.fixture
+def loaded_navigator(demo_db):
+    """Navigator loaded from the demo database"""
+    nav = MedGraphNavigator(database=demo_db)
+    nav.load_synthea_data()
+    return nav
+
+def test_compact_graph_matches_networkx(demo_db):
+    """Test that the CSR graph gives the same analysis as the NetworkX graph"""
+    nav = MedGraphNavigator(database=demo_db)
+    nav.load_synthea_data()
+    compact_nav = MedGraphNavigator(database=demo_db)
+    compact_nav.load_synthea_data(compact=True)
+
+    assert isinstance(compact_nav.graph, CSRGraph)
+    assert compact_nav.graph.number_of_nodes() == nav.graph.number_of_nodes()
+    assert compact_nav.graph.number_of_edges() == nav.graph.number_of_edges()
+
+    analyzer = MedicalAnalyzer(nav.graph)
+    compact_analyzer = MedicalAnalyzer(compact_nav.graph)
+    for condition in ("Type 2 Diabetes", "Hypertension"):
+        assert compact_analyzer.analyze_treatment_patterns(condition) == \
+            analyzer.analyze_treatment_patterns(condition)
+        assert compact_analyzer.predict_risk_factors(condition) == \
+            analyzer.predict_risk_factors(condition)
+
+    # Full documents are fetched lazily from the database
+    document = compact_analyzer.get_document("patients/P1")
+    assert document == demo_db.collection("patients").get("P1")
+
+def test_indexed_analysis_matches_records(demo_data, loaded_navigator):
+    """Test two-hop index lookups against the generated records"""
+    nav = loaded_navigator
+
+    encounter_meds = {}
+    for medication in demo_data["medications"]:
+        encounter_meds.setdefault(medication["encounter_id"], []).append(medication["description"])
+    expected = {}
+    for condition in demo_data["conditions"]:
+        if condition["description"] == "Asthma":
+            pattern = tuple(sorted(encounter_meds.get(condition["encounter_id"], [])))
+            expected[pattern] = expected.get(pattern, 0) + 1
+
+    assert nav.analyzer.analyze_treatment_patterns("Asthma") == expected
+    assert nav.analyzer.index is nav.index
+
+    # Risk factors are conditions recorded before each patient's first asthma diagnosis
+    encounter_dates = {e["_key"]: e["date"] for e in demo_data["encounters"]}
+    onsets = {}
+    for c in demo_data["conditions"]:
+        if c["description"] == "Asthma":
+            day = encounter_dates[c["encounter_id"]]
+            onsets[c["patient_id"]] = min(day, onsets.get(c["patient_id"], day))
+    prior = {c["description"] for c in demo_data["conditions"]
+             if c["patient_id"] in onsets and c["description"] != "Asthma"
+             and encounter_dates[c["encounter_id"]] < onsets[c["patient_id"]]}
+    assert set(nav.analyzer.predict_risk_factors("Asthma")) == prior
+
+def test_temporal_index(demo_data, loaded_navigator):
+    """Test encounter timelines and time-windowed analyzer queries"""
+    from src.backend.temporal import parse_day
+
+    nav = loaded_navigator
+    index = nav.index
+    analyzer = nav.analyzer
+
+    encounters = sorted((e["date"], e["_key"]) for e in demo_data["encounters"] if e["patient_id"] == "P1")
+    days, timeline = index.patient_timeline("patients/P1")
+    assert days == sorted(days) and days[0] == parse_day(encounters[0][0])
+    assert set(timeline) == {"encounters/" + key for _, key in encounters}
+
+    middle = encounters[len(encounters) // 2][0]
+    window = analyzer.conditions_in_window("patients/P1", start=middle)
+    assert window and all(day >= middle for day, _ in window)
+    assert [day for day, _ in window] == sorted(day for day, _ in window)
+
+    condition = window[0][1]
+    onset = min(day for day, c in analyzer.conditions_in_window("patients/P1") if c == condition)
+    expected = {c for day, c in analyzer.conditions_in_window("patients/P1", end=onset)} - {condition}
+    assert analyzer.conditions_before("patients/P1", condition) == sorted(expected)
+    assert analyzer.conditions_before("patients/P1", condition, within_days=0) == []
+    assert analyzer.conditions_before("patients/P1", "Not A Condition") == []
+
+    # Windowed risk factors are a subset of the unwindowed ones
+    assert set(analyzer.predict_risk_factors("Asthma", within_days=30)) <= \
+        set(analyzer.predict_risk_factors("Asthma"))
+    patterns = analyzer.analyze_treatment_patterns("Asthma")
+    assert analyzer.analyze_treatment_patterns("Asthma", start="1970-01-01") == patterns
+    assert analyzer.analyze_treatment_patterns("Asthma", end="1970-01-01") == {}
+
+    # Dates survive the compact graph and its snapshot
+    compact = MedGraphNavigator(database=InMemoryDatabase(demo_data))
+    compact.load_synthea_data(compact=True)
+    assert compact.graph.day(timeline[0]) == days[0]
+    assert MedicalAnalyzer(compact.graph).index.patient_timeline("patients/P1") == (days, timeline)
+
+def test_relation_store():
+    """Test directed per-relation adjacency, procedure edges and filtered neighbours"""
+    from src.utils.data_generation import generate_dataset
+
+    data = generate_dataset(200, seed=0)
+    procedure = data["procedures"][0]
+    # A patient whose key is also an encounter key stays a separate node
+    data["patients"].append({"_key": procedure["encounter_id"], "age": 30, "gender": "F"})
+    nav = MedGraphNavigator(database=InMemoryDatabase(data))
+    nav.load_synthea_data()
+    index = nav.index
+    node = "procedures/" + procedure["_key"]
+    encounter = "encounters/" + procedure["encounter_id"]
+    patient = "patients/" + procedure["patient_id"]
+    assert index.node_types["patients/" + procedure["encounter_id"]] == "patient"
+    assert index.node_types[encounter] == "encounter"
+
+    # Procedures are linked to their encounter by PERFORMED
+    assert index.outgoing["PERFORMED"][encounter] >= {node}
+    assert index.procedure_encounters[node] == {encounter}
+    assert node in index.patient_procedures(patient)
+    assert index.patients_of(node) == {patient}
+    assert sum(len(v) for v in index.outgoing["PERFORMED"].values()) == len(data["procedures"])
+
+    # Relations are stored source -> target, in the index and in the graphs
+    assert set(index.neighbors(encounter, ["HAD_ENCOUNTER"], "in")) == {patient}
+    assert list(index.neighbors(encounter, ["HAD_ENCOUNTER"], "out")) == []
+    assert set(index.neighbors(encounter, ["PERFORMED", "PRESCRIBED"])) == \
+        index.encounter_procedures[encounter] | index.encounter_medications[encounter]
+    assert nav.graph.is_directed() and set(nav.graph.predecessors(encounter)) == {patient}
+    rebuilt = MedicalAnalyzer(nav.graph).index
+    assert rebuilt.outgoing["PERFORMED"] == index.outgoing["PERFORMED"]
+    index.remove_node(node)
+    assert node not in index.encounter_procedures.get(encounter, ())
+
+    # CSR and NetworkX neighbours filtered by relation and direction
+    compact = MedGraphNavigator(database=InMemoryDatabase(data))
+    compact.load_synthea_data(compact=True)
+    assert compact.graph.number_of_edges() == nav.graph.number_of_edges()
+    assert set(compact.graph.neighbors(encounter, ["PERFORMED"])) == rebuilt.encounter_procedures[encounter]
+    assert set(compact.graph.neighbors(encounter, direction="in")) == {patient}
+    assert set(compact.graph.neighbors(patient, direction="in")) == set()
+    assert set(MedicalAnalyzer(nav.graph).view.neighbors(encounter, ["HAD_ENCOUNTER"])) == {patient}
+    assert MedicalAnalyzer(compact.graph).index.outgoing["PERFORMED"] == rebuilt.outgoing["PERFORMED"]
+    assert set(compact.graph.to_networkx().edges) == set(nav.graph.edges)
+
+    # The CSR keeps one edge per (source, target, relation)
+    edges = [("a", "b", {"type": "PRESCRIBED"}), ("a", "b", {"type": "PERFORMED"}),
+             ("a", "b", {"type": "PRESCRIBED"}), ("b", "a", {"type": "PRESCRIBED"})]
+    assert CSRGraph.from_elements([], edges).number_of_edges() == 3
+
+def test_cohort_engine(demo_data, loaded_navigator):
+    """Test vectorized cohort counts, group-bys and risk ratios against the records"""
+    nav = loaded_navigator
+    cohort = nav.cohort()
+    patients = {p["_key"]: p for p in demo_data["patients"]}
+    has = {}
+    for c in demo_data["conditions"]:
+        has.setdefault(c["description"], set()).add(c["patient_id"])
+
+    older_women = {k for k, p in patients.items() if p["age"] >= 60 and p["gender"] == "F"}
+    counts = cohort.feature_counts("condition", cohort.mask(min_age=60, gender="F"))
+    assert counts == {name: len(ids & older_women) for name, ids in has.items() if ids & older_women}
+    assert list(counts.values()) == sorted(counts.values(), reverse=True)
+
+    by_gender = cohort.group_by("gender", mask=cohort.mask(condition="Asthma"))
+    for gender, group in by_gender.items():
+        members = {k for k, p in patients.items() if p["gender"] == gender} & has["Asthma"]
+        assert group["Asthma"] == len(members)
+    by_age = cohort.group_by("age", bins=[0, 50, 200])
+    assert sum(group.get("Asthma", 0) for group in by_age.values()) == len(has["Asthma"])
+
+    names, _, matrix = cohort.co_occurrence()
+    i, j = names.index("Asthma"), names.index("Hypertension")
+    assert matrix[i, j] == len(has["Asthma"] & has["Hypertension"])
+    assert matrix[i, i] == len(has["Asthma"])
+
+    # Risk ratios count prior conditions only, exactly as predict_risk_factors
+    for condition in ("Asthma", "Hypertension", "Depression"):
+        ratios = cohort.risk_ratios(condition)
+        assert ratios == pytest.approx(nav.analyzer.predict_risk_factors(condition))
+        assert condition not in ratios
+    assert cohort.risk_ratios("Asthma", within_days=90) == \
+        pytest.approx(nav.analyzer.predict_risk_factors("Asthma", within_days=90))
+    assert cohort.risk_ratios("Not A Condition") == {}
+
+    total = len(patients)
+    ever = (len(has["Asthma"] & has["Hypertension"]) / len(has["Asthma"])) / (len(has["Hypertension"]) / total)
+    _, lift = cohort.lift_matrix()
+    assert lift[i, j] == pytest.approx(ever)
+
+def test_batch_treatment_patterns(tmp_path):
+    """Test batch pattern mining against per-condition calls and brute-force itemsets"""
+    from itertools import combinations
+    from src.backend.pattern_mining import fp_growth
+
+    nav = MedGraphNavigator(database=InMemoryDatabase(generate_demo_data(300, seed=0)))
+    nav.load_synthea_data()
+    analyzer = nav.analyzer
+
+    serial = analyzer.analyze_treatment_patterns_batch(workers=1)
+    parallel = analyzer.analyze_treatment_patterns_batch(workers=2, partition_size=50)
+    for condition in nav.index.conditions_by_description:
+        expected = analyzer.analyze_treatment_patterns(condition)
+        assert serial.patterns(condition) == expected
+        assert list(parallel.patterns(condition).items()) == list(expected.items())
+    subset = analyzer.analyze_treatment_patterns_batch(["Asthma"], workers=1)
+    assert set(subset["condition"]) == {"Asthma"}
+
+    transactions = [(("A", "B", "C"), 3), (("A", "B"), 2), (("A", "C"), 1), (("B",), 4), (("C", "D"), 1)]
+    expected = {}
+    for size in range(1, 5):
+        for itemset in combinations("ABCD", size):
+            support = sum(w for items, w in transactions if set(itemset) <= set(items))
+            if support >= 3:
+                expected[itemset] = support
+    assert fp_growth(transactions, 3) == expected
+    assert fp_growth(transactions, 3, max_size=1) == {k: v for k, v in expected.items() if len(k) == 1}
+
+    mined = analyzer.analyze_treatment_patterns_batch(min_support=0.05, workers=1)
+    itemsets = mined.patterns("Asthma", kind="itemset")
+    asthma_total = sum(analyzer.analyze_treatment_patterns("Asthma").values())
+    assert itemsets and all(count >= 0.05 * asthma_total for count in itemsets.values())
+    mined.write(str(tmp_path / "patterns.csv"))
+    assert (tmp_path / "patterns.csv").read_text().splitlines()[0] == "condition,kind,medications,count,support"
+    assert len(mined.to_pandas()) == len(mined)
+
+def test_similarity_matches_reference(loaded_navigator):
+    """Test vectorized Jaccard top-k against a pairwise reference"""
+    nav = loaded_navigator
+    index = nav.index
+
+    def features(p):
+        return ({index.description(c) for c in index.patient_conditions(p)},
+                {index.description(m) for m in index.patient_medications(p)})
+
+    def jaccard(a, b):
+        return len(a & b) / len(a | b) if a | b else 0.0
+
+    conditions, medications = features("patients/P1")
+    expected = {}
+    for other in index.nodes_of_type("patient"):
+        if other != "patients/P1":
+            other_conditions, other_medications = features(other)
+            expected[other] = (jaccard(conditions, other_conditions) +
+                               jaccard(medications, other_medications)) / 2
+
+    similar = nav.analyzer.find_similar_patients("patients/P1", num_similar=5)
+    top_scores = sorted(expected.values(), reverse=True)[:5]
+    assert [score for _, score in similar] == pytest.approx(top_scores)
+    for patient, score in similar:
+        assert score == pytest.approx(expected[patient])
+
+    batch = nav.analyzer.find_similar_patients_batch(["patients/P1", "patients/P2"], num_similar=5)
+    assert batch["patients/P1"] == similar
+    assert len(batch["patients/P2"]) == 5
+    # Bare document keys resolve to the same patients
+    assert nav.analyzer.find_similar_patients("P1", num_similar=5) == similar
+    assert nav.analyzer.find_similar_patients_batch(["P1"], num_similar=5) == {"P1": similar}
+    assert nav.analyzer.patient_profile("P1") == nav.analyzer.patient_profile("patients/P1")
+
+def test_approximate_similarity(loaded_navigator):
+    """Test MinHash/LSH candidates are re-ranked with exact scores"""
+    nav = loaded_navigator
+    analyzer = MedicalAnalyzer(nav.graph, index=nav.index, lsh_params={"num_perm": 64, "bands": 32})
+
+    exact = dict(analyzer.similarity.top_k(["patients/P1"], 99)["patients/P1"])
+    approximate = analyzer.find_similar_patients("patients/P1", num_similar=5, approximate=True)
+    assert 0 < len(approximate) <= 5
+    for patient, score in approximate:
+        assert score == pytest.approx(exact[patient])
+
+    # Incremental update: an identical patient must become a candidate
+    conditions, medications = analyzer.lsh.features["patients/P1"]
+    analyzer.lsh.update("P_NEW", conditions, medications)
+    assert analyzer.lsh.query("P_NEW", num_similar=1)[0][1] == pytest.approx(1.0)
+    analyzer.lsh.remove("P_NEW")
+    assert "P_NEW" not in analyzer.lsh.candidates("patients/P1")